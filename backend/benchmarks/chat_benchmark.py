@@ -0,0 +1,138 @@
+"""Chat latency: intent routing alone, POST /ai-agent/chat under concurrent load, and
+time to first chunk behind the generation-slot limit with a slow fake provider.
+
+Requests go through the ASGI app in-process (no network), so the numbers cover
+auth, admission, routing, insights and rendering but not socket overhead.
+
+    python -m backend.benchmarks.chat_benchmark
+"""
+import asyncio
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List
+
+import httpx
+import numpy as np
+
+from ..main import ai_agent_service, app, auth_service
+from ..models import RegisterRequest, SwipeAction, SwipeEvent
+from ..services.chat_service import ChatBusyError, ChatService, FakeChatProvider
+from ..services.chat_router import ChatContext
+
+MESSAGES = (
+    "What should I buy next?",
+    "Is my portfolio too risky?",
+    "How do I hedge against a downturn?",
+    "Can you analyze my portfolio",
+    "Should I rebalance?",
+    "Explain my strategy",
+    "hello there",
+)
+SWIPES = 100
+ROUTER_ITERATIONS = 20_000
+REQUESTS = 2_000
+CONCURRENCY = (1, 16, 64)
+# One user per concurrent request, so per-user limits don't reject the load
+USERS = 64
+# Slow provider: SLOW_CHUNKS chunks SLOW_CHUNK_DELAY apart, SLOW_REQUESTS at once
+SLOW_CHUNKS = 20
+SLOW_CHUNK_DELAY = 0.01
+SLOW_REQUESTS = 96
+
+
+def seed_history(user_id: str) -> None:
+    rng = np.random.default_rng(5)
+    sectors = ["Technology", "Healthcare", "Financials", "Energy", "Consumer Staples"]
+    now = datetime.utcnow()
+    ai_agent_service.track_swipes(user_id, [
+        SwipeEvent(
+            symbol=f"S{i}", sector=sectors[rng.integers(len(sectors))], risk=["Low", "Medium", "High"][rng.integers(3)],
+            action=list(SwipeAction)[rng.integers(3)], timestamp=now - timedelta(hours=int(rng.integers(0, 24 * 60))),
+        )
+        for i in range(SWIPES)
+    ])
+
+
+def bench_router(user_id: str) -> None:
+    router = ai_agent_service.chat_router
+    started = time.perf_counter()
+    for i in range(ROUTER_ITERATIONS):
+        router.route(MESSAGES[i % len(MESSAGES)])
+    print(f"route only: {(time.perf_counter() - started) / ROUTER_ITERATIONS * 1e6:.2f}us/message")
+
+    for message in MESSAGES:
+        started = time.perf_counter()
+        for _ in range(ROUTER_ITERATIONS // 10):
+            context = ChatContext(
+                user_id, ai_agent_service.behavior_data.get, ai_agent_service._get_behavior_insights,
+                ai_agent_service.recommendations,
+            )
+            router.respond(message, context)
+        elapsed = (time.perf_counter() - started) / (ROUTER_ITERATIONS // 10)
+        print(f"  respond {router.route(message).name:<10} {elapsed * 1e6:8.1f}us")
+
+
+async def bench_endpoint(tokens: List[str]) -> None:
+    headers = [{"Authorization": f"Bearer {token}"} for token in tokens]
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for concurrency in CONCURRENCY:
+            latencies, statuses = [], Counter()
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def one(i: int) -> None:
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.post(
+                        "/ai-agent/chat", json={"message": MESSAGES[i % len(MESSAGES)]}, headers=headers[i % len(headers)]
+                    )
+                    statuses[response.status_code] += 1
+                    latencies.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(REQUESTS)))
+            wall = time.perf_counter() - started
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+            print(f"concurrency {concurrency:>3}: {REQUESTS / wall:7.0f} req/s  p50 {p50:6.2f}ms  p99 {p99:6.2f}ms  {dict(statuses)}")
+
+
+async def bench_slow_provider() -> None:
+    chat = ChatService(FakeChatProvider(reply=lambda message: "token " * SLOW_CHUNKS, chunk_delay=SLOW_CHUNK_DELAY))
+    first_chunk, busy = [], 0
+
+    async def one(i: int) -> None:
+        nonlocal busy
+        started = time.perf_counter()
+        try:
+            async for _ in chat.stream(f"user-{i}", "hello"):
+                if len(first_chunk) <= i:
+                    first_chunk.append(time.perf_counter() - started)
+        except ChatBusyError:
+            busy += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(SLOW_REQUESTS)))
+    wall = time.perf_counter() - started
+    p50, p99 = np.percentile(first_chunk, [50, 99]) * 1000
+    print(
+        f"slow provider, {SLOW_REQUESTS} streams over {chat.max_concurrent} slots: wall {wall:.2f}s  "
+        f"first chunk p50 {p50:.0f}ms p99 {p99:.0f}ms  busy {busy}"
+    )
+
+
+def main() -> None:
+    tokens = []
+    for i in range(USERS):
+        auth = auth_service.register(
+            RegisterRequest(email=f"chat-bench-{i}@swipr.ai", password="bench", first_name="Chat", last_name=f"Bench {i}")
+        )
+        seed_history(auth.user["id"])
+        tokens.append(auth.access_token)
+    bench_router(auth_service.verify_token(tokens[0])["id"])
+    asyncio.run(bench_endpoint(tokens))
+    asyncio.run(bench_slow_provider())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Recall@k and timing for the swipe recommender on synthetic data.
+
+Users like two of N_CLUSTERS symbol clusters. Their swipes mix in-cluster and
+random symbols, with likes mostly in-cluster and skips mostly outside. One liked
+symbol per user is held out. The model must rank it in the top k among the symbols
+the user hasn't swiped.
+
+    python -m backend.benchmarks.recommender_benchmark
+"""
+import time
+
+import numpy as np
+
+from ..services.recommendation_service import (
+    ALPHA, FACTORS, ITERATIONS, REGULARIZATION, solve_factors, to_csr, top_n, train_als
+)
+from ..services.preference_model import SWIPE_WEIGHTS
+from ..models import SwipeAction
+
+N_USERS = 5_000
+N_ITEMS = 1_000
+N_CLUSTERS = 20
+SWIPES_PER_USER = 60
+IN_CLUSTER_SHARE = 0.5
+INCREMENTAL_SHARE = 0.05
+KS = (5, 10, 20)
+
+
+def synthetic_swipes(rng: np.random.Generator):
+    """COO (user, item, weight) swipes plus one held-out liked item per user (-1 if none)"""
+    item_cluster = rng.integers(0, N_CLUSTERS, N_ITEMS)
+    members = [np.flatnonzero(item_cluster == c) for c in range(N_CLUSTERS)]
+    liked = np.array([SWIPE_WEIGHTS[SwipeAction.WATCHLIST], SWIPE_WEIGHTS[SwipeAction.QUEUE]])
+
+    rows, cols, weights, held_out = [], [], [], np.full(N_USERS, -1)
+    for user in range(N_USERS):
+        favorites = rng.choice(N_CLUSTERS, 2, replace=False)
+        pool = np.concatenate([members[c] for c in favorites])
+        n_in = rng.binomial(SWIPES_PER_USER, IN_CLUSTER_SHARE)
+        items = np.unique(np.concatenate([
+            rng.choice(pool, min(n_in, len(pool)), replace=False),
+            rng.choice(N_ITEMS, SWIPES_PER_USER - n_in, replace=False),
+        ]))
+        in_cluster = np.isin(item_cluster[items], favorites)
+        positive = rng.random(len(items)) < np.where(in_cluster, 0.8, 0.15)
+        user_weights = np.where(positive, rng.choice(liked, len(items)), SWIPE_WEIGHTS[SwipeAction.SKIP])
+
+        positives = np.flatnonzero(positive)
+        if len(positives) >= 2:
+            hold = rng.choice(positives)
+            held_out[user] = items[hold]
+            keep = np.arange(len(items)) != hold
+            items, user_weights = items[keep], user_weights[keep]
+        rows.append(np.full(len(items), user))
+        cols.append(items)
+        weights.append(user_weights)
+
+    return (np.concatenate(rows), np.concatenate(cols), np.concatenate(weights).astype(np.float64)), held_out
+
+
+def recall_at_k(scores_for, seen, held_out, k: int) -> float:
+    users = np.flatnonzero(held_out >= 0)
+    hits = sum(held_out[u] in top_n(scores_for(u), seen[u], k) for u in users)
+    return hits / len(users)
+
+
+def main() -> None:
+    rng = np.random.default_rng(7)
+    interactions, held_out = synthetic_swipes(rng)
+    rows, cols, weights = interactions
+    print(f"{N_USERS} users x {N_ITEMS} symbols, {len(rows)} swipes, "
+          f"factors={FACTORS} iterations={ITERATIONS} reg={REGULARIZATION} alpha={ALPHA}")
+
+    started = time.perf_counter()
+    user_factors, item_factors = train_als(interactions, N_USERS, N_ITEMS)
+    print(f"full training: {time.perf_counter() - started:.2f}s")
+
+    indptr, indices, _, _ = to_csr(rows, cols, weights, N_USERS)
+    seen = [indices[indptr[u]:indptr[u + 1]] for u in range(N_USERS)]
+    popularity = np.bincount(cols[weights > 0], minlength=N_ITEMS).astype(np.float64)
+
+    for k in KS:
+        als = recall_at_k(lambda u: item_factors @ user_factors[u], seen, held_out, k)
+        popular = recall_at_k(lambda u: popularity, seen, held_out, k)
+        print(f"recall@{k}: als {als:.3f}  popularity {popular:.3f}")
+
+    # Incremental run: re-solve a slice of users against fixed item factors
+    changed = rng.choice(N_USERS, int(N_USERS * INCREMENTAL_SHARE), replace=False)
+    mask = np.isin(rows, changed)
+    remap = np.full(N_USERS, -1)
+    remap[changed] = np.arange(len(changed))
+    csr = to_csr(remap[rows[mask]], cols[mask], weights[mask], len(changed))
+    started = time.perf_counter()
+    solved = solve_factors(item_factors, csr)
+    print(f"incremental update of {len(changed)} users: {(time.perf_counter() - started) * 1000:.1f}ms "
+          f"(max factor change {np.abs(solved - user_factors[changed]).max():.2e})")
+
+    started = time.perf_counter()
+    for u in range(1_000):
+        top_n(item_factors @ user_factors[u], seen[u], 10)
+    print(f"serving top-10: {(time.perf_counter() - started) * 1000:.3f}us per request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Query and incremental-update latency of the similar-stocks index on a synthetic catalog.
+
+    python -m backend.benchmarks.similarity_benchmark
+"""
+import time
+
+import numpy as np
+
+from ..models import Returns, RiskLevel, Stock
+from ..services.similarity_service import SimilarityService
+from ..services.stock_service import StockService
+
+N_STOCKS = 10_000
+N_SECTORS = 11
+QUERIES = 2_000
+
+
+def synthetic_catalog(rng: np.random.Generator) -> dict:
+    stocks = {}
+    for i in range(N_STOCKS):
+        symbol = f"S{i:05d}"
+        stocks[symbol] = Stock(
+            symbol=symbol,
+            name=f"Synthetic {i}",
+            price=float(rng.uniform(5, 500)),
+            change=0.0,
+            changePercent=0.0,
+            volume="1.0M",
+            marketCap=f"{rng.uniform(0.1, 900):.1f}{rng.choice(['M', 'B'])}",
+            pe=float(rng.uniform(5, 80)) if rng.random() > 0.1 else None,
+            dividendYield=float(rng.uniform(0, 5)),
+            sector=f"Sector {rng.integers(N_SECTORS)}",
+            isGainer=False,
+            newsSummary="",
+            returns=Returns(oneMonth=rng.normal(0, 5), sixMonth=rng.normal(5, 15), oneYear=rng.normal(10, 25)),
+            risk=list(RiskLevel)[rng.integers(3)],
+        )
+    return stocks
+
+
+def main() -> None:
+    rng = np.random.default_rng(3)
+    stock_service = StockService()
+    stock_service.stocks = synthetic_catalog(rng)
+    similarity = SimilarityService(stock_service)
+
+    started = time.perf_counter()
+    similarity.similar("S00000")
+    print(f"index build over {N_STOCKS} stocks: {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    symbols = rng.choice(list(stock_service.stocks), QUERIES)
+    started = time.perf_counter()
+    for symbol in symbols:
+        similarity.similar(symbol, 10)
+    print(f"top-10 query: {(time.perf_counter() - started) / QUERIES * 1e6:.1f}us")
+
+    started = time.perf_counter()
+    for symbol in symbols[:200]:
+        stock_service.update_fundamentals(symbol, {"pe": float(rng.uniform(5, 80))})
+    print(f"fundamentals update (in-place row): {(time.perf_counter() - started) / 200 * 1e6:.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,16 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Awaitable, Callable
 import uvicorn
 from datetime import datetime, timedelta
 import json
 import logging
+import asyncio
+import os
 
 # Import our modules
 from .models import *
@@ -15,7 +19,17 @@ from .services.stock_service import StockService
 from .services.portfolio_service import PortfolioService
 from .services.queue_service import QueueService
 from .services.auth_service import AuthService
-from .routes.onboarding import router as onboarding_router
+from .services.optimization_job_service import OptimizationJobService, TooManyJobsError
+from .services.rebalancing_service import RebalancingService
+from .services.ledger_service import LedgerService
+from .services.export_service import ExportService
+from .services.swipe_service import SwipeService
+from .services.swipe_ingestion import SwipeIngestionService, IngestionQueueFullError
+from .services.recommendation_service import RecommendationService
+from .services.similarity_service import SimilarityService
+from .services.chat_service import ChatBusyError, ChatLimitError, ChatService, create_chat_provider
+from .services.state_backend import create_state_backend
+from .routes.onboarding import router as onboarding_router, onboarding_service
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -41,15 +55,111 @@ app.add_middleware(
 security = HTTPBearer()
 
 # Service instances
-ai_agent_service = AIAgentService()
-stock_service = StockService()
-portfolio_service = PortfolioService()
-queue_service = QueueService()
-auth_service = AuthService()
+# STATE_BACKEND=redis shares user state across uvicorn workers
+state_backend = create_state_backend(os.getenv("STATE_BACKEND"), os.getenv("REDIS_URL"))
+ai_agent_service = AIAgentService(state_backend)
+stock_service = StockService(state_backend)
+portfolio_service = PortfolioService(stock_service, LedgerService(os.getenv("LEDGER_PATH")), state_backend)
+queue_service = QueueService(stock_service, state_backend)
+auth_service = AuthService(state_backend, os.getenv("ADMIN_EMAILS", "").split(","))
+optimization_job_service = OptimizationJobService(portfolio_service)
+export_service = ExportService(queue_service, stock_service, portfolio_service)
+swipe_service = SwipeService(stock_service, queue_service, ai_agent_service)
+swipe_ingestion = SwipeIngestionService(ai_agent_service)
+recommendation_service = RecommendationService(ai_agent_service, stock_service, queue_service)
+similarity_service = SimilarityService(stock_service)
+# CHAT_PROVIDER=fake swaps in a deterministic echo provider for tests and load runs
+chat_service = ChatService(create_chat_provider(os.getenv("CHAT_PROVIDER"), ai_agent_service))
+ai_agent_service.set_recommendation_provider(
+    lambda user_id, limit: [symbol for symbol, _ in recommendation_service.recommend(user_id, limit)]
+)
+queue_service.set_sector_preference_provider(ai_agent_service.get_sector_preferences)
+rebalancing_service = RebalancingService(portfolio_service, ai_agent_service, onboarding_service)
+ai_agent_service.register_input("queue", queue_service.get_revision, queue_service.get_user_queue)
+ai_agent_service.register_input("drift", rebalancing_service.get_drift_version, rebalancing_service.get_drift)
+ai_agent_service.register_input("holdings", portfolio_service.get_holdings_version, portfolio_service.get_portfolio)
+ai_agent_service.register_input("catalog", lambda user_id: stock_service.catalog_version, lambda user_id: stock_service.get_catalog_snapshot())
 
 # Include routers
 app.include_router(onboarding_router)
 
+REBALANCING_HOUR_UTC = 2
+
+async def run_nightly_rebalancing():
+    """Run the drift engine once a day, off the event loop"""
+    while True:
+        now = datetime.utcnow()
+        next_run = now.replace(hour=REBALANCING_HOUR_UTC, minute=0, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        await asyncio.sleep((next_run - now).total_seconds())
+        try:
+            await run_in_threadpool(rebalancing_service.run)
+        except Exception as e:
+            logger.error(f"Nightly rebalancing error: {str(e)}")
+
+INTERVENTION_SWEEP_SECONDS = 3_600
+
+async def run_intervention_sweeps():
+    """Evaluate intervention rules for all users every hour, off the event loop"""
+    while True:
+        await asyncio.sleep(INTERVENTION_SWEEP_SECONDS)
+        try:
+            await run_in_threadpool(ai_agent_service.run_intervention_sweep)
+        except Exception as e:
+            logger.error(f"Intervention sweep error: {str(e)}")
+
+EXPOSURE_REBUILD_SECONDS = 300
+
+async def run_exposure_rebuilds():
+    """Re-read all portfolios every 5 minutes, off the event loop.
+
+    The exposure index only sees this worker's trades between rebuilds, so with a shared
+    state backend /admin/exposure lags other workers by at most this interval.
+    """
+    while True:
+        await asyncio.sleep(EXPOSURE_REBUILD_SECONDS)
+        try:
+            await run_in_threadpool(portfolio_service.rebuild_exposure)
+        except Exception as e:
+            logger.error(f"Exposure rebuild error: {str(e)}")
+
+RECOMMENDER_TRAIN_SECONDS = 900
+
+async def run_recommender_training():
+    """Retrain the recommender every 15 minutes (incrementally when possible), off the event loop"""
+    while True:
+        try:
+            await run_in_threadpool(recommendation_service.train)
+        except Exception as e:
+            logger.error(f"Recommender training error: {str(e)}")
+        await asyncio.sleep(RECOMMENDER_TRAIN_SECONDS)
+
+@app.on_event("startup")
+async def start_background_tasks():
+    app.state.background_tasks = [
+        asyncio.create_task(run_nightly_rebalancing()),
+        asyncio.create_task(run_intervention_sweeps()),
+        asyncio.create_task(run_recommender_training()),
+        asyncio.create_task(run_exposure_rebuilds()),
+    ]
+    swipe_ingestion.start()
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    await swipe_ingestion.stop()
+    for task in getattr(app.state, "background_tasks", []):
+        task.cancel()
+    optimization_job_service.shutdown()
+    portfolio_service.risk_service.shutdown()
+
+def record_swipe(user_id: str, swipe_data: SwipeEvent) -> None:
+    """Hand a swipe to the AI agent without failing the queue/watchlist change"""
+    try:
+        swipe_ingestion.submit(user_id, swipe_data)
+    except IngestionQueueFullError as e:
+        logger.warning(f"Dropped swipe for user {user_id}: {str(e)}")
+
 # Dependency for authenticated requests
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
@@ -58,6 +168,11 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         raise HTTPException(status_code=401, detail="Invalid authentication token")
     return user
 
+async def get_admin_user(user: dict = Depends(get_current_user)):
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
 @app.get("/")
 async def root():
     return {"message": "Swipr.AI Backend API", "version": "1.0.0"}
@@ -116,8 +231,10 @@ async def track_swipe(
 ):
     """Track user swipe behavior for AI learning"""
     try:
-        ai_agent_service.track_swipe(user["id"], swipe_data)
+        swipe_ingestion.submit(user["id"], swipe_data)
         return {"success": True}
+    except IngestionQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         logger.error(f"Swipe tracking error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -126,13 +243,41 @@ async def track_swipe(
 async def get_interventions(user: dict = Depends(get_current_user)):
     """Get AI interventions for user"""
     try:
-        queue = queue_service.get_user_queue(user["id"])
-        interventions = ai_agent_service.generate_interventions(user["id"], queue)
-        return interventions
+        return ai_agent_service.generate_interventions(user["id"])
     except Exception as e:
         logger.error(f"Interventions error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.get("/ai-agent/interventions/inbox", response_model=List[AIIntervention])
+async def get_pushed_interventions(user: dict = Depends(get_current_user)):
+    """Deliver interventions pushed by the scheduled sweep since the last call"""
+    try:
+        return ai_agent_service.take_pushed_interventions(user["id"])
+    except Exception as e:
+        logger.error(f"Intervention inbox error: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/ai-agent/interventions/{intervention_id}/dismiss")
+async def dismiss_intervention(intervention_id: str, user: dict = Depends(get_current_user)):
+    """Dismiss an AI intervention so it is not shown again"""
+    if not ai_agent_service.dismiss_intervention(user["id"], intervention_id):
+        raise HTTPException(status_code=404, detail="Intervention not found")
+    return {"success": True}
+
+@app.get("/ai-agent/recommendations", response_model=List[StockRecommendation])
+async def get_recommendations(limit: int = Query(10, ge=1, le=50), user: dict = Depends(get_current_user)):
+    """Stocks the user hasn't swiped yet, ranked by the collaborative-filtering model"""
+    try:
+        recommendations = []
+        for symbol, score in recommendation_service.recommend(user["id"], limit):
+            stock = stock_service.get_stock(symbol)
+            if stock:
+                recommendations.append(StockRecommendation(symbol=symbol, score=score, stock=stock))
+        return recommendations
+    except Exception as e:
+        logger.error(f"Recommendations error: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.post("/ai-agent/chat")
 async def ai_chat(
     chat_request: ChatRequest,
@@ -140,12 +285,70 @@ async def ai_chat(
 ):
     """Chat with AI assistant"""
     try:
-        response = ai_agent_service.chat(user["id"], chat_request.message)
+        response = "".join([chunk async for chunk in chat_service.stream(user["id"], chat_request.message)])
         return {"response": response}
+    except ChatLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except ChatBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         logger.error(f"AI chat error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
+class ClosingStreamingResponse(StreamingResponse):
+    """StreamingResponse that runs `on_close` however the response ends.
+
+    Starlette never iterates the body if the client is gone before streaming starts,
+    and leaves it suspended if a send fails, so the body's own finally can't be relied on.
+    """
+
+    def __init__(self, content: Any, on_close: Callable[[], Awaitable[None]], **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.on_close()
+
+@app.post("/ai-agent/chat/stream")
+async def ai_chat_stream(
+    chat_request: ChatRequest,
+    user: dict = Depends(get_current_user)
+):
+    """Chat with AI assistant, streamed as server-sent `chunk` events and a final `done`"""
+    chunks = chat_service.stream(user["id"], chat_request.message)
+    # Wait for the first chunk before answering, so admission failures get a real status code
+    try:
+        first = [await chunks.__anext__()]
+    except StopAsyncIteration:
+        first = []
+    except ChatLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except ChatBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except Exception as e:
+        logger.error(f"AI chat stream error: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def events():
+        try:
+            for chunk in first:
+                yield f"event: chunk\ndata: {json.dumps({'text': chunk})}\n\n"
+            async for chunk in chunks:
+                yield f"event: chunk\ndata: {json.dumps({'text': chunk})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+    # `chunks` holds a generation slot from here on; closing it (a no-op once exhausted) frees the slot
+    try:
+        return ClosingStreamingResponse(events(), chunks.aclose, media_type="text/event-stream")
+    except BaseException:
+        await chunks.aclose()
+        raise
+
 # Stock endpoints
 @app.get("/stocks", response_model=List[Stock])
 async def get_stocks(
@@ -175,6 +378,24 @@ async def get_stock(symbol: str, user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=404, detail="Stock not found")
     return stock
 
+@app.get("/stocks/{symbol}/similar", response_model=List[SimilarStock])
+async def get_similar_stocks(
+    symbol: str,
+    limit: int = Query(5, ge=1, le=50),
+    user: dict = Depends(get_current_user)
+):
+    """Get the most comparable stocks by sector, risk, valuation, returns and size"""
+    if not stock_service.get_stock(symbol):
+        raise HTTPException(status_code=404, detail="Stock not found")
+    try:
+        return [
+            SimilarStock(symbol=similar, similarity=similarity, stock=stock_service.get_stock(similar))
+            for similar, similarity in similarity_service.similar(symbol, limit)
+        ]
+    except Exception as e:
+        logger.error(f"Similar stocks error: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/stocks/{symbol}/news", response_model=List[NewsItem])
 async def get_stock_news(symbol: str, user: dict = Depends(get_current_user)):
     """Get news for specific stock"""
@@ -183,10 +404,21 @@ async def get_stock_news(symbol: str, user: dict = Depends(get_current_user)):
 
 # Queue endpoints
 @app.get("/queue", response_model=List[QueuedStock])
-async def get_queue(user: dict = Depends(get_current_user)):
-    """Get user's stock queue"""
+async def get_queue(
+    order: str = Query("added", pattern="^(added|score)$"),
+    limit: Optional[int] = Query(None, ge=1),
+    user: dict = Depends(get_current_user)
+):
+    """Get user's stock queue in insertion order, or the top items by score"""
+    if order == "score":
+        return queue_service.get_ranked_queue(user["id"], limit)
     queue = queue_service.get_user_queue(user["id"])
-    return queue
+    return queue[:limit] if limit else queue
+
+@app.get("/queue/enriched")
+async def get_enriched_queue(user: dict = Depends(get_current_user)):
+    """Get user's queue joined with live stock data"""
+    return queue_service.get_queue_with_stock_data(user["id"])
 
 @app.post("/queue/add")
 async def add_to_queue(
@@ -207,7 +439,7 @@ async def add_to_queue(
                 sector=stock.sector,
                 risk=stock.risk
             )
-            ai_agent_service.track_swipe(user["id"], swipe_data)
+            record_swipe(user["id"], swipe_data)
 
         return {"success": True, "queue_item": result}
     except Exception as e:
@@ -224,6 +456,16 @@ async def remove_from_queue(symbol: str, user: dict = Depends(get_current_user))
         logger.error(f"Remove from queue error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
+# Swipe sync endpoints
+@app.post("/swipes/batch", response_model=SwipeBatchResponse)
+async def sync_swipes(batch: SwipeBatchRequest, user: dict = Depends(get_current_user)):
+    """Apply an ordered batch of offline skip/queue/watchlist swipes"""
+    try:
+        return swipe_service.apply_batch(user["id"], batch.swipes)
+    except Exception as e:
+        logger.error(f"Swipe batch error: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
 # Portfolio endpoints
 @app.get("/portfolio", response_model=Portfolio)
 async def get_portfolio(user: dict = Depends(get_current_user)):
@@ -234,6 +476,69 @@ async def get_portfolio(user: dict = Depends(get_current_user)):
         return Portfolio(user_id=user["id"], holdings=[], total_value=0.0)
     return portfolio
 
+@app.get("/portfolio/transactions")
+async def get_transactions(
+    limit: int = Query(50, ge=1, le=500),
+    user: dict = Depends(get_current_user)
+):
+    """Get user's buy/sell history from the holdings ledger"""
+    return portfolio_service.get_transactions(user["id"], limit)
+
+@app.get("/portfolio/positions-at")
+async def get_positions_at(at: datetime, user: dict = Depends(get_current_user)):
+    """Reconstruct user's positions at a point in time"""
+    try:
+        return {"at": at, "positions": portfolio_service.get_positions_at(user["id"], at)}
+    except Exception as e:
+        logger.error(f"Point-in-time positions error: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/portfolio/history")
+async def get_portfolio_history(
+    range: str = Query("1M", pattern="^(1D|1W|1M|1Y|ALL)$"),
+    user: dict = Depends(get_current_user)
+):
+    """Get portfolio value history for the performance chart"""
+    try:
+        return {"range": range, "points": portfolio_service.get_value_history(user["id"], range)}
+    except Exception as e:
+        logger.error(f"Portfolio history error: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/portfolio/rebalancing")
+async def get_rebalancing(user: dict = Depends(get_current_user)):
+    """Get drift and suggested trades from the last nightly rebalancing run"""
+    drift = rebalancing_service.get_drift(user["id"])
+    return {
+        "evaluatedAt": rebalancing_service.last_run,
+        "drifted": bool(drift),
+        "result": drift
+    }
+
+@app.get("/portfolio/risk")
+async def get_portfolio_risk(
+    paths: int = Query(20_000, ge=1_000, le=2_000_000),
+    horizon: int = Query(10, ge=1, le=60),
+    seed: Optional[int] = None,
+    user: dict = Depends(get_current_user)
+):
+    """Monte Carlo VaR/CVaR, drawdown distribution and risk score for user's portfolio"""
+    portfolio = portfolio_service.get_portfolio(user["id"])
+    if not portfolio:
+        raise HTTPException(status_code=404, detail="Portfolio not found")
+    try:
+        # Simulation is CPU-bound; keep it off the event loop
+        return await run_in_threadpool(
+            portfolio_service.risk_service.analyze_portfolio,
+            portfolio,
+            paths,
+            horizon,
+            seed
+        )
+    except Exception as e:
+        logger.error(f"Portfolio risk error: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.post("/portfolio/optimize")
 async def optimize_portfolio(
     optimization_request: OptimizationRequest,
@@ -241,12 +546,53 @@ async def optimize_portfolio(
 ):
     """Optimize portfolio allocation"""
     try:
-        result = portfolio_service.optimize_portfolio(user["id"], optimization_request)
-        return result
+        job = await optimization_job_service.submit(user["id"], optimization_request)
+        job = await optimization_job_service.wait(job.id)
+        if job.status == JobStatus.FAILED:
+            raise ValueError(job.error)
+        return job.result
+    except TooManyJobsError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         logger.error(f"Portfolio optimization error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/portfolio/optimize/jobs", response_model=OptimizationJob, status_code=202)
+async def submit_optimization_job(
+    optimization_request: OptimizationRequest,
+    user: dict = Depends(get_current_user)
+):
+    """Submit portfolio optimization as a background job"""
+    try:
+        return await optimization_job_service.submit(user["id"], optimization_request)
+    except TooManyJobsError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        logger.error(f"Optimization job submit error: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/portfolio/optimize/jobs/{job_id}", response_model=OptimizationJob)
+async def get_optimization_job(job_id: str, user: dict = Depends(get_current_user)):
+    """Poll optimization job status"""
+    job = optimization_job_service.get_job(user["id"], job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/portfolio/optimize/jobs/{job_id}/events")
+async def stream_optimization_job(job_id: str, user: dict = Depends(get_current_user)):
+    """Server-sent event emitted when the optimization job completes"""
+    job = optimization_job_service.get_job(user["id"], job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        yield f"event: status\ndata: {job.model_dump_json(include={'id', 'status'})}\n\n"
+        finished = await optimization_job_service.wait(job_id)
+        yield f"event: {finished.status.value}\ndata: {finished.model_dump_json()}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
 # Watchlist endpoints
 @app.get("/watchlist", response_model=List[WatchlistItem])
 async def get_watchlist(user: dict = Depends(get_current_user)):
@@ -272,12 +618,66 @@ async def add_to_watchlist(
                 sector=stock.sector,
                 risk=stock.risk
             )
-            ai_agent_service.track_swipe(user["id"], swipe_data)
+            record_swipe(user["id"], swipe_data)
 
         return {"success": True, "watchlist_item": result}
     except Exception as e:
         logger.error(f"Add to watchlist error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
+# Export endpoints
+def streaming_export(dataset: str, export_format: str, user_id: Optional[str] = None) -> StreamingResponse:
+    try:
+        media_type = export_service.validate_format(export_format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if user_id is None:
+        body = export_service.export_all(dataset, export_format)
+    else:
+        body = export_service.export_user(dataset, user_id, export_format)
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{export_service.filename(dataset, export_format)}"'}
+    )
+
+@app.get("/queue/export")
+async def export_queue(format: str = "ndjson", user: dict = Depends(get_current_user)):
+    """Stream user's queue as NDJSON, CSV or Parquet"""
+    return streaming_export("queue", format, user["id"])
+
+@app.get("/watchlist/export")
+async def export_watchlist(format: str = "ndjson", user: dict = Depends(get_current_user)):
+    """Stream user's watchlist as NDJSON, CSV or Parquet"""
+    return streaming_export("watchlist", format, user["id"])
+
+@app.get("/portfolio/export")
+async def export_portfolio(format: str = "ndjson", user: dict = Depends(get_current_user)):
+    """Stream user's portfolio holdings as NDJSON, CSV or Parquet"""
+    return streaming_export("portfolio", format, user["id"])
+
+# Admin endpoints
+@app.get("/admin/export/{dataset}")
+async def export_all_users(dataset: str, format: str = "ndjson", user: dict = Depends(get_admin_user)):
+    """Stream every user's queue, watchlist or portfolio data in chunks"""
+    if dataset not in ("queue", "watchlist", "portfolio"):
+        raise HTTPException(status_code=404, detail="Unknown dataset")
+    return streaming_export(dataset, format)
+
+@app.get("/admin/exposure")
+async def get_platform_exposure(user: dict = Depends(get_admin_user)):
+    """Aggregate platform exposure per symbol and sector"""
+    return portfolio_service.exposure_index.get_exposure()
+
+@app.get("/admin/swipe-ingestion")
+async def get_swipe_ingestion_metrics(user: dict = Depends(get_admin_user)):
+    """Swipe ingestion queue depth, batching and backpressure metrics"""
+    return swipe_ingestion.get_metrics()
+
+@app.get("/admin/chat")
+async def get_chat_metrics(user: dict = Depends(get_admin_user)):
+    """Chat generation slots, queue and cancellation metrics"""
+    return chat_service.get_metrics()
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, EmailStr
-from typing import List, Optional, Dict, Any, Literal
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, Field, field_validator, model_validator
+from collections import deque
+from typing import Deque, List, Optional, Dict, Any, Literal
+from datetime import date, datetime, timezone
 from enum import Enum
 
 # Enums
@@ -36,6 +37,11 @@ class InterventionType(str, Enum):
     MARKET_UPDATE = "market_update"
     STRATEGY_FOCUS = "strategy_focus"
 
+class JobStatus(str, Enum):
+    PENDING = "pending"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
 # Auth Models
 class LoginRequest(BaseModel):
     email: EmailStr
@@ -82,6 +88,11 @@ class Stock(BaseModel):
     earningsDate: Optional[str] = None
     risk: RiskLevel = RiskLevel.MEDIUM
 
+class SimilarStock(BaseModel):
+    symbol: str
+    similarity: float
+    stock: Stock
+
 class StockFilters(BaseModel):
     sector: str = "All"
     marketCap: str = "All"
@@ -104,6 +115,12 @@ class UserProfile(UserProfileCreate):
     created_at: datetime
     updated_at: datetime
 
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Server-side datetimes are naive UTC; convert offset-aware client values to match"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
 class SwipeEvent(BaseModel):
     symbol: str
     action: SwipeAction
@@ -112,14 +129,75 @@ class SwipeEvent(BaseModel):
     risk: RiskLevel
     timestamp: Optional[datetime] = None
 
+    @field_validator("timestamp")
+    @classmethod
+    def _naive_timestamp(cls, timestamp: Optional[datetime]) -> Optional[datetime]:
+        return to_naive_utc(timestamp)
+
+class SwipeBatchItem(BaseModel):
+    symbol: str
+    action: SwipeAction
+    confidence: Optional[Confidence] = None
+    note: Optional[str] = None
+    priority: Literal["low", "medium", "high"] = "medium"
+    timestamp: Optional[datetime] = None
+
+    @field_validator("timestamp")
+    @classmethod
+    def _naive_timestamp(cls, timestamp: Optional[datetime]) -> Optional[datetime]:
+        return to_naive_utc(timestamp)
+
+class SwipeBatchRequest(BaseModel):
+    swipes: List[SwipeBatchItem] = Field(..., max_length=500)
+
+class SwipeBatchResult(BaseModel):
+    index: int
+    symbol: str
+    action: SwipeAction
+    status: Literal["added", "updated", "duplicate", "recorded", "rejected"]
+    error: Optional[str] = None
+
+class SwipeBatchResponse(BaseModel):
+    applied: int
+    rejected: int
+    results: List[SwipeBatchResult]
+
+SWIPE_HISTORY_SIZE = 100
+
 class BehaviorData(BaseModel):
     user_id: str
-    swipe_history: List[SwipeEvent] = []
-    sector_preferences: Dict[str, float] = {}
-    risk_preferences: Dict[str, float] = {}
+    # Fixed-capacity ring buffer: appends drop the oldest swipe without copying
+    swipe_history: Deque[SwipeEvent] = Field(default_factory=lambda: deque(maxlen=SWIPE_HISTORY_SIZE))
+    # Preference vectors, decayed lazily from preferences_updated_at (see services/preference_model.py).
+    # sector_weights[i] belongs to sector_ids[i]; risk_weights is indexed Low, Medium, High.
+    sector_ids: List[str] = []
+    sector_weights: List[float] = []
+    risk_weights: List[float] = [0.0, 0.0, 0.0]
+    preferences_updated_at: Optional[datetime] = None
+    # Insights maintained on every swipe so reads don't sort. Decay scales all weights
+    # alike, so these rankings hold until the next swipe.
+    top_sector_ids: List[str] = []
+    dominant_risk: Optional[RiskLevel] = None
+    swipe_count: int = 0
+    # Day-activity bitmap: bit i is set if the user swiped on activity_day minus i days;
+    # streak_days is the run of consecutive active days ending on activity_day
+    activity_days: int = 0
+    activity_day: Optional[date] = None
     last_activity: datetime
     streak_days: int = 0
 
+    @field_validator("swipe_history")
+    @classmethod
+    def _as_ring(cls, history: Deque[SwipeEvent]) -> Deque[SwipeEvent]:
+        return deque(history, maxlen=SWIPE_HISTORY_SIZE)
+
+    @model_validator(mode="after")
+    def _backfill_swipe_count(self) -> "BehaviorData":
+        # Records stored before swipe_count existed only know their retained history
+        if self.swipe_count < len(self.swipe_history):
+            self.swipe_count = len(self.swipe_history)
+        return self
+
 class AIIntervention(BaseModel):
     id: str
     type: InterventionType
@@ -135,6 +213,11 @@ class AIIntervention(BaseModel):
 class ChatRequest(BaseModel):
     message: str
 
+class StockRecommendation(BaseModel):
+    symbol: str
+    score: float
+    stock: Stock
+
 # Queue Models
 class QueuedStockCreate(BaseModel):
     symbol: str
@@ -168,6 +251,16 @@ class OptimizationRequest(BaseModel):
     risk_tolerance: Optional[RiskTolerance] = None
     preferred_sectors: Optional[List[str]] = None
 
+class OptimizationJob(BaseModel):
+    id: str
+    user_id: str
+    status: JobStatus
+    cached: bool = False
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
 # Watchlist Models
 class WatchlistItemCreate(BaseModel):
     symbol: str
@@ -1,26 +1,78 @@
 import json
 import uuid
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import Any, Callable, List, Dict, Hashable, Optional, Tuple
 import logging
-from collections import defaultdict, Counter
+from collections import defaultdict
+
+import numpy as np
 
 from ..models import (
     UserProfile, UserProfileCreate, SwipeEvent, BehaviorData, 
-    AIIntervention, QueuedStock, InterventionType, RiskLevel
+    AIIntervention, RiskLevel
+)
+from . import preference_model
+from .chat_router import ChatContext, IntentRouter
+from .intervention_engine import (
+    FEATURE_GROUPS, RULES, CompiledRule, Rule, RuleInputs, compile_rules, extract_features, row
 )
+from .state_backend import InMemoryStateBackend, StateBackend, StateMap
 
 logger = logging.getLogger(__name__)
 
+RecommendationProvider = Callable[[str, int], List[str]]
+
+INTERVENTION_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_DNS, "interventions.swipr.ai")
+MAX_DISMISSED = 200
+MAX_INBOX = 20
+
+
+class _InterventionCache:
+    """Last result of each rule and the input versions it was computed from"""
+
+    __slots__ = ("versions", "results")
+
+    def __init__(self):
+        self.versions: Dict[str, Tuple] = {}
+        self.results: Dict[str, Optional[AIIntervention]] = {}
+
+
 class AIAgentService:
     """
     AI Agent service that learns from user behavior and provides intelligent interventions
     """
     
-    def __init__(self):
-        # In production, this would be a database
-        self.user_profiles: Dict[str, UserProfile] = {}
-        self.behavior_data: Dict[str, BehaviorData] = {}
+    def __init__(self, state_backend: Optional[StateBackend] = None):
+        state_backend = state_backend or InMemoryStateBackend()
+        self.user_profiles: StateMap = StateMap(state_backend, "user_profiles", UserProfile)
+        # Behavior is mutated in place by tracking and written back once per call
+        self.behavior_data: StateMap = StateMap(state_backend, "behavior_data", BehaviorData)
+        self.dismissed_interventions: StateMap = StateMap(state_backend, "dismissed_interventions", List[str])
+        
+        # Interventions pushed by the scheduled sweep, waiting for delivery, and the
+        # ids pushed that are still firing (so each is pushed once while it holds)
+        self.intervention_inbox: StateMap = StateMap(state_backend, "intervention_inbox", List[AIIntervention])
+        self.pushed_interventions: StateMap = StateMap(state_backend, "pushed_interventions", List[str])
+        self.last_sweep: Optional[datetime] = None
+        
+        # Rules are declared in intervention_engine; each is re-run for a user only when
+        # one of its inputs' versions moves. profile, behavior and clock are tracked here;
+        # other inputs come from register_input.
+        self.rules: List[CompiledRule] = compile_rules(RULES)
+        self._versions: Dict[str, Callable[[str], Hashable]] = {
+            "profile": self.user_profiles.revision,
+            "behavior": self.behavior_data.revision,
+            # Decayed preferences and inactivity move with time, at most once per read step
+            "clock": lambda user_id: int(datetime.utcnow().timestamp() // preference_model.READ_STEP_SECONDS),
+        }
+        self._loaders: Dict[str, Callable[[str], Any]] = {
+            "profile": self.get_profile,
+            "behavior": self.behavior_data.get,
+        }
+        # Process-local, validated against input versions on every read
+        self.intervention_cache: Dict[str, _InterventionCache] = {}
+        self.recommendations: Optional[RecommendationProvider] = None
+        self.chat_router = IntentRouter()
         
     def setup_profile(self, user_id: str, profile_create: UserProfileCreate) -> UserProfile:
         """Setup user's AI agent profile"""
@@ -55,94 +107,83 @@ class AIAgentService:
     def track_swipe(self, user_id: str, swipe_data: SwipeEvent) -> None:
         """Track user swipe behavior for learning"""
         try:
-            if user_id not in self.behavior_data:
-                self.behavior_data[user_id] = BehaviorData(
-                    user_id=user_id,
-                    last_activity=datetime.utcnow()
-                )
-            
-            behavior = self.behavior_data[user_id]
-            
             # Add timestamp if not provided
             if not swipe_data.timestamp:
                 swipe_data.timestamp = datetime.utcnow()
             
-            # Add to swipe history
-            behavior.swipe_history.append(swipe_data)
-            behavior.last_activity = datetime.utcnow()
-            
-            # Update preferences
-            self._update_sector_preferences(behavior, swipe_data)
-            self._update_risk_preferences(behavior, swipe_data)
-            
-            # Keep only last 100 swipes for performance
-            if len(behavior.swipe_history) > 100:
-                behavior.swipe_history = behavior.swipe_history[-100:]
+            def track(behavior: Optional[BehaviorData]) -> BehaviorData:
+                behavior = behavior or BehaviorData(
+                    user_id=user_id,
+                    last_activity=datetime.utcnow()
+                )
+                
+                # Add to swipe history (ring buffer keeps the last SWIPE_HISTORY_SIZE)
+                behavior.swipe_history.append(swipe_data)
+                behavior.last_activity = datetime.utcnow()
+                
+                # Update decayed sector/risk preferences, their rankings and the activity streak
+                preference_model.apply_swipes(behavior, [swipe_data], behavior.last_activity)
+                preference_model.record_activity(behavior, [swipe_data], behavior.last_activity.date())
+                return behavior
             
-            logger.info(f"Tracked swipe for user {user_id}: {swipe_data.symbol} -> {swipe_data.action}")
+            self.behavior_data.update(user_id, track)
+            logger.debug(f"Tracked swipe for user {user_id}: {swipe_data.symbol} -> {swipe_data.action}")
             
         except Exception as e:
             logger.error(f"Error tracking swipe: {str(e)}")
             raise
     
-    def _update_sector_preferences(self, behavior: BehaviorData, swipe: SwipeEvent) -> None:
-        """Update sector preferences based on swipe action"""
-        sector = swipe.sector
-        
-        # Weight: skip = -1, watchlist = +2, queue = +3
-        weight = {
-            "skip": -1,
-            "watchlist": 2, 
-            "queue": 3
-        }.get(swipe.action.value, 0)
-        
-        behavior.sector_preferences[sector] = behavior.sector_preferences.get(sector, 0) + weight
+    def track_swipes(self, user_id: str, swipes: List[SwipeEvent]) -> None:
+        """Track a batch of swipes, in order, with a single write-back"""
+        if not swipes:
+            return
+        try:
+            now = datetime.utcnow()
+            for swipe in swipes:
+                if not swipe.timestamp:
+                    swipe.timestamp = now
+
+            def track(behavior: Optional[BehaviorData]) -> BehaviorData:
+                behavior = behavior or BehaviorData(user_id=user_id, last_activity=now)
+                preference_model.apply_swipes(behavior, swipes, now)
+                preference_model.record_activity(behavior, swipes, now.date())
+                behavior.swipe_history.extend(swipes)
+                behavior.last_activity = now
+                return behavior
+
+            self.behavior_data.update(user_id, track)
+
+            logger.debug(f"Tracked {len(swipes)} swipes for user {user_id}")
+
+        except Exception as e:
+            logger.error(f"Error tracking swipes: {str(e)}")
+            raise
+
+    def get_sector_preferences(self, user_id: str) -> Dict[str, float]:
+        """Get user's time-decayed sector preference weights"""
+        behavior = self.behavior_data.get(user_id)
+        return preference_model.sector_preferences(behavior, datetime.utcnow()) if behavior else {}
     
-    def _update_risk_preferences(self, behavior: BehaviorData, swipe: SwipeEvent) -> None:
-        """Update risk preferences based on swipe action"""
-        risk_level = swipe.risk.value
-        
-        weight = {
-            "skip": -1,
-            "watchlist": 2,
-            "queue": 3
-        }.get(swipe.action.value, 0)
-        
-        behavior.risk_preferences[risk_level] = behavior.risk_preferences.get(risk_level, 0) + weight
+    def set_recommendation_provider(self, provider: RecommendationProvider) -> None:
+        """Set the callable returning a user's top recommended symbols for chat"""
+        self.recommendations = provider
     
-    def generate_interventions(self, user_id: str, queue: List[QueuedStock]) -> List[AIIntervention]:
-        """Generate AI interventions based on user behavior and portfolio"""
+    def register_input(self, name: str, version: Callable[[str], Hashable], load: Optional[Callable[[str], Any]] = None) -> None:
+        """Register an external rule input (queue, prices, drift...) as version(user_id) and load(user_id)"""
+        self._versions[name] = version
+        if load:
+            self._loaders[name] = load
+    
+    def generate_interventions(self, user_id: str) -> List[AIIntervention]:
+        """Get the user's top interventions, re-running only rules whose inputs changed"""
         try:
-            profile = self.get_profile(user_id)
-            if not profile:
-                return []
-            
-            behavior = self.behavior_data.get(user_id)
-            if not behavior:
-                return []
-            
-            interventions = []
             now = datetime.utcnow()
+            results = self._evaluate_rules(user_id, now)
+            if not results:
+                return []
             
-            # Check sector concentration
-            sector_intervention = self._check_sector_concentration(profile, queue, now)
-            if sector_intervention:
-                interventions.append(sector_intervention)
-            
-            # Check risk alignment
-            risk_intervention = self._check_risk_alignment(profile, behavior, queue, now)
-            if risk_intervention:
-                interventions.append(risk_intervention)
-            
-            # Check for investment themes
-            theme_intervention = self._detect_investment_theme(behavior, now)
-            if theme_intervention:
-                interventions.append(theme_intervention)
-            
-            # Check rebalancing needs
-            rebalance_intervention = self._check_rebalancing_needs(behavior, queue, now)
-            if rebalance_intervention:
-                interventions.append(rebalance_intervention)
+            dismissed = set(self.dismissed_interventions.get(user_id, []))
+            interventions = [i for i in results.values() if i and i.id not in dismissed]
             
             # Limit to top 2 interventions by priority
             interventions.sort(key=lambda x: {"high": 3, "medium": 2, "low": 1}[x.priority], reverse=True)
@@ -152,263 +193,172 @@ class AIAgentService:
             logger.error(f"Error generating interventions: {str(e)}")
             return []
     
-    def _check_sector_concentration(self, profile: UserProfile, queue: List[QueuedStock], now: datetime) -> Optional[AIIntervention]:
-        """Check if portfolio is too concentrated in one sector"""
-        if not queue:
-            return None
-        
-        # Mock sector analysis - in production, would get actual stock sector data
-        sector_counts = defaultdict(int)
-        total_stocks = len(queue)
-        
-        # For demo purposes, assume some distribution
-        for stock in queue:
-            sector_counts["Technology"] += 1  # Mock - would get real sector
-        
-        max_concentration = max(sector_counts.values()) / total_stocks * 100 if total_stocks > 0 else 0
-        
-        if max_concentration > profile.maxSectorConcentration:
-            dominant_sector = max(sector_counts.keys(), key=lambda k: sector_counts[k])
+    def dismiss_intervention(self, user_id: str, intervention_id: str) -> bool:
+        """Dismiss one of the user's current interventions so it is not shown again"""
+        try:
+            results = self._evaluate_rules(user_id, datetime.utcnow())
+            if not any(i and i.id == intervention_id for i in results.values()):
+                return False
             
-            return AIIntervention(
-                id=str(uuid.uuid4()),
-                type=InterventionType.DIVERSIFICATION,
-                title="Too much in one sector?",
-                message=f"You have {max_concentration:.0f}% in {dominant_sector}. Want to diversify?",
-                actionText="View suggestions",
-                actionType="view_suggestions",
-                priority="medium",
-                triggerReason=f"Sector concentration above {profile.maxSectorConcentration}%",
-                createdAt=now
-            )
-        
-        return None
-    
-    def _check_risk_alignment(self, profile: UserProfile, behavior: BehaviorData, queue: List[QueuedStock], now: datetime) -> Optional[AIIntervention]:
-        """Check if current portfolio aligns with risk tolerance"""
-        if not behavior.risk_preferences:
-            return None
-        
-        # Calculate average risk based on preferences
-        risk_weights = {"Low": 1, "Medium": 2, "High": 3}
-        weighted_risk = sum(
-            risk_weights[risk] * weight 
-            for risk, weight in behavior.risk_preferences.items()
-        )
-        total_weight = sum(behavior.risk_preferences.values())
-        avg_risk = weighted_risk / total_weight if total_weight > 0 else 2
-        
-        # Target risk based on tolerance
-        target_risk = {"conservative": 1.5, "moderate": 2, "aggressive": 2.5}[profile.riskTolerance.value]
-        
-        if avg_risk > target_risk + 0.5:
-            return AIIntervention(
-                id=str(uuid.uuid4()),
-                type=InterventionType.RISK_CHECK,
-                title="Off-track from your goal?",
-                message="You're trending riskier than planned. Want to adjust?",
-                actionText="Adjust strategy",
-                actionType="adjust_strategy",
-                priority="high",
-                triggerReason=f"Average risk {avg_risk:.1f} exceeds target {target_risk}",
-                createdAt=now
-            )
-        elif avg_risk < target_risk - 0.5:
-            return AIIntervention(
-                id=str(uuid.uuid4()),
-                type=InterventionType.RISK_CHECK,
-                title="Too conservative?",
-                message="Your portfolio is more conservative than your goals. Want to add growth?",
-                actionText="View suggestions",
-                actionType="view_suggestions",
-                priority="medium",
-                triggerReason=f"Average risk {avg_risk:.1f} below target {target_risk}",
-                createdAt=now
-            )
-        
-        return None
+            def dismiss(dismissed: Optional[List[str]]) -> List[str]:
+                dismissed = [i for i in dismissed or [] if i != intervention_id]
+                dismissed.append(intervention_id)
+                return dismissed[-MAX_DISMISSED:]
+            
+            self.dismissed_interventions.update(user_id, dismiss)
+            logger.info(f"Dismissed intervention {intervention_id} for user {user_id}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error dismissing intervention: {str(e)}")
+            raise
     
-    def _detect_investment_theme(self, behavior: BehaviorData, now: datetime) -> Optional[AIIntervention]:
-        """Detect if user is focusing on a particular investment theme"""
-        recent_swipes = [
-            swipe for swipe in behavior.swipe_history[-10:]
-            if swipe.action.value != "skip"
-        ]
+    def _evaluate_rules(self, user_id: str, now: datetime) -> Dict[str, Optional[AIIntervention]]:
+        """Per-rule results, cached per user against the versions of each rule's inputs"""
+        inputs = RuleInputs(user_id, now, self._loaders)
+        if inputs["profile"] is None or inputs["behavior"] is None:
+            return {}
         
-        if len(recent_swipes) < 3:
-            return None
+        cache = self.intervention_cache.get(user_id)
+        if cache is None:
+            cache = self.intervention_cache[user_id] = _InterventionCache()
         
-        # Count sectors in recent positive swipes
-        sector_counts = Counter(swipe.sector for swipe in recent_swipes)
-        total_swipes = len(recent_swipes)
+        versions: Dict[str, Hashable] = {}
+        dirty: List[Tuple[CompiledRule, Tuple]] = []
+        for compiled in self.rules:
+            for name in compiled.inputs:
+                if name not in versions:
+                    versions[name] = self._versions[name](user_id) if name in self._versions else 0
+            seen = tuple(versions[name] for name in compiled.inputs)
+            if cache.versions.get(compiled.rule.name) != seen:
+                dirty.append((compiled, seen))
+        if not dirty:
+            return cache.results
         
-        for sector, count in sector_counts.items():
-            if count >= 3 and (count / total_swipes) >= 0.4:
-                return AIIntervention(
-                    id=str(uuid.uuid4()),
-                    type=InterventionType.STRATEGY_FOCUS,
-                    title="High-conviction theme detected?",
-                    message=f"You're showing interest in {sector}. Want to bundle these into a focused strategy?",
-                    actionText="Create theme",
-                    actionType="view_suggestions",
-                    priority="low",
-                    triggerReason=f"Multiple stocks in {sector} theme",
-                    createdAt=now
-                )
+        # Extract only the feature groups the dirty rules read, as a one-user batch
+        groups = list(dict.fromkeys(group for compiled, _ in dirty for group in compiled.groups))
+        features = extract_features(groups, [inputs])
+        for compiled, seen in dirty:
+            name = compiled.rule.name
+            intervention = None
+            if compiled.evaluate(features)[0]:
+                intervention = self._build_intervention(user_id, compiled.rule, row(features, 0), now)
+                previous = cache.results.get(name)
+                if previous and previous.id == intervention.id:
+                    intervention.createdAt = previous.createdAt
+            cache.results[name] = intervention
+            cache.versions[name] = seen
         
-        return None
+        return cache.results
     
-    def _check_rebalancing_needs(self, behavior: BehaviorData, queue: List[QueuedStock], now: datetime) -> Optional[AIIntervention]:
-        """Check if portfolio needs rebalancing"""
-        days_since_activity = (now - behavior.last_activity).days
-        
-        if days_since_activity > 7 and len(queue) > 3:
-            return AIIntervention(
-                id=str(uuid.uuid4()),
-                type=InterventionType.REBALANCING,
-                title="You've drifted from plan",
-                message="No rebalancing in a while. Want to review your strategy?",
-                actionText="Rebalance",
-                actionType="rebalance",
-                priority="medium",
-                triggerReason=f"No activity for {days_since_activity} days",
-                createdAt=now
-            )
-        
-        return None
+    @staticmethod
+    def _build_intervention(user_id: str, rule: Rule, features: Dict, now: datetime) -> AIIntervention:
+        fields = rule.render(features)
+        # Rules render a dedupe key as id; the stable id is that key scoped to the user
+        fields["id"] = str(uuid.uuid5(INTERVENTION_NAMESPACE, f"{user_id}:{fields['id']}"))
+        return AIIntervention(type=rule.type, createdAt=now, **fields)
     
-    def chat(self, user_id: str, message: str) -> str:
-        """Chat with AI assistant"""
+    def run_intervention_sweep(self) -> Dict:
+        """Evaluate every rule for all profiled users at once and queue new interventions for push delivery"""
         try:
-            profile = self.get_profile(user_id)
-            behavior = self.behavior_data.get(user_id)
+            now = datetime.utcnow()
+            profiles = self.user_profiles.items()
+            user_ids = [user_id for user_id, _ in profiles]
+            behaviors = self.behavior_data.get_many(user_ids)
+            batch = [
+                RuleInputs(user_id, now, self._loaders, {"profile": profile, "behavior": behavior})
+                for (user_id, profile), behavior in zip(profiles, behaviors)
+                if behavior is not None
+            ]
             
-            # Generate contextual response based on user profile and behavior
-            response = self._generate_ai_response(message, profile, behavior)
+            features = extract_features(FEATURE_GROUPS, batch)
+            triggered: Dict[int, List[AIIntervention]] = defaultdict(list)
+            for compiled in self.rules:
+                for index in np.flatnonzero(compiled.evaluate(features)):
+                    triggered[int(index)].append(
+                        self._build_intervention(batch[index].user_id, compiled.rule, row(features, int(index)), now)
+                    )
             
-            logger.info(f"AI chat for user {user_id}: {message[:50]}...")
-            return response
+            pushed = self._push_interventions([inputs.user_id for inputs in batch], triggered)
+            self.last_sweep = now
+            total = sum(len(interventions) for interventions in triggered.values())
+            logger.info(f"Intervention sweep: {len(batch)} users, {total} triggered, {pushed} pushed")
+            return {"users": len(batch), "triggered": total, "pushed": pushed, "ranAt": now}
             
         except Exception as e:
-            logger.error(f"Error in AI chat: {str(e)}")
-            return "I'm experiencing some technical difficulties. Please try again in a moment."
+            logger.error(f"Error running intervention sweep: {str(e)}")
+            raise
     
-    def _generate_ai_response(self, message: str, profile: Optional[UserProfile], behavior: Optional[BehaviorData]) -> str:
-        """Generate contextual AI response"""
-        message_lower = message.lower()
+    def _push_interventions(self, user_ids: List[str], triggered: Dict[int, List[AIIntervention]]) -> int:
+        """Queue triggered interventions not already pushed or dismissed; forget pushed ids that stopped firing"""
+        pushed_before = self.pushed_interventions.get_many(user_ids)
+        dismissed_lists = self.dismissed_interventions.get_many(user_ids)
+        inboxes: Dict[str, List[AIIntervention]] = {}
+        pushed_updates: Dict[str, List[str]] = {}
+        count = 0
         
-        # Get user insights
-        insights = self._get_behavior_insights(behavior) if behavior else {}
+        for index, user_id in enumerate(user_ids):
+            firing = triggered.get(index, [])
+            previous = pushed_before[index] or []
+            dismissed = set(dismissed_lists[index] or [])
+            new = [i for i in firing if i.id not in previous and i.id not in dismissed]
+            still_pushed = [i.id for i in firing if i.id in previous] + [i.id for i in new]
+            if still_pushed != previous:
+                pushed_updates[user_id] = still_pushed
+            if new:
+                inboxes[user_id] = new
+                count += len(new)
         
-        if "what should i buy" in message_lower or "recommend" in message_lower:
-            top_sectors = insights.get("top_sectors", ["Technology"])
-            risk_pref = insights.get("risk_preference", "Medium")
+        if pushed_updates:
+            self.pushed_interventions.put_many(pushed_updates)
+        # Inboxes are drained by take_pushed_interventions on any worker, so appends
+        # are conditional per user rather than one blind batch write
+        for user_id, new in inboxes.items():
+            self.intervention_inbox.update(user_id, lambda inbox, new=new: ((inbox or []) + new)[-MAX_INBOX:])
+        return count
+    
+    def take_pushed_interventions(self, user_id: str) -> List[AIIntervention]:
+        """Deliver and clear the user's pushed interventions"""
+        try:
+            # Swap in an empty inbox conditionally so a concurrent sweep append is never lost
+            inbox: List[AIIntervention] = []
             
-            return f"""Based on your preferences for {', '.join(top_sectors[:2])} and {risk_pref} risk stocks, I'd recommend:
-
-• Looking for undervalued stocks in {top_sectors[0] if top_sectors else 'Technology'}
-• Consider diversifying into Consumer Staples for stability
-• Check out dividend-paying stocks for income
-
-Would you like specific stock suggestions?"""
-        
-        elif "risky" in message_lower or "risk" in message_lower:
-            risk_pref = insights.get("risk_preference", "Medium")
-            top_sectors = insights.get("top_sectors", ["Technology"])
-            total_swipes = insights.get("total_swipes", 0)
+            def take(stored: Optional[List[AIIntervention]]) -> Optional[List[AIIntervention]]:
+                inbox[:] = stored or []
+                return [] if stored else None
             
-            return f"""Your risk profile shows:
-
-• Preference for {risk_pref} risk stocks
-• Heavy focus on {' and '.join(top_sectors[:2])}
-• {total_swipes} total investment decisions
-
-You're currently {'aggressive' if risk_pref == 'High' else 'conservative' if risk_pref == 'Low' else 'moderate'} in your approach. Want to adjust?"""
-        
-        elif "hedge" in message_lower or "protect" in message_lower:
-            return """To hedge your current portfolio:
-
-• Consider defensive sectors like Utilities or Consumer Staples
-• Look into bonds or treasury funds
-• Add some inverse ETFs for downside protection
-• Diversify across market caps (small, mid, large)
-
-What specific risks are you most concerned about?"""
-        
-        elif "portfolio" in message_lower or "analyze" in message_lower:
-            top_sectors = insights.get("top_sectors", ["Technology"])
-            risk_pref = insights.get("risk_preference", "Medium")
-            total_swipes = insights.get("total_swipes", 0)
-            streak_days = insights.get("streak_days", 0)
+            self.intervention_inbox.update(user_id, take)
+            if not inbox:
+                return []
+            dismissed = set(self.dismissed_interventions.get(user_id, []))
+            return [i for i in inbox if i.id not in dismissed]
             
-            return f"""Portfolio Analysis:
-
-• Sector Focus: {', '.join(top_sectors)}
-• Risk Level: {risk_pref}
-• Activity: {total_swipes} decisions made
-• Streak: {streak_days} days
-
-Strengths: Clear sector preferences
-Opportunities: Consider more diversification
-
-Want detailed recommendations?"""
-        
-        elif "rebalance" in message_lower or "balance" in message_lower:
-            top_sector = insights.get("top_sectors", ["Technology"])[0] if insights.get("top_sectors") else "Technology"
+        except Exception as e:
+            logger.error(f"Error delivering pushed interventions: {str(e)}")
+            raise
+    
+    def chat(self, user_id: str, message: str) -> str:
+        """Chat with AI assistant"""
+        try:
+            # Behavior is loaded and summarized only if the matched intent's template needs it
+            context = ChatContext(user_id, self.behavior_data.get, self._get_behavior_insights, self.recommendations)
+            response = self.chat_router.respond(message, context)
             
-            return f"""Rebalancing suggestions:
-
-• Your {top_sector} allocation might be high
-• Consider adding exposure to Healthcare or Financials
-• Review positions older than 6 months
-• Take profits on winners, add to underweight sectors
-
-Shall I create a rebalancing plan for you?"""
-        
-        elif "strategy" in message_lower:
-            top_sector = insights.get("top_sectors", ["Technology"])[0] if insights.get("top_sectors") else "Technology"
-            risk_pref = insights.get("risk_preference", "Medium")
-            total_swipes = insights.get("total_swipes", 0)
+            logger.info(f"AI chat for user {user_id}: {message[:50]}...")
+            return response
             
-            return f"""Your investment strategy appears to be:
-
-• Growth-focused with {top_sector} emphasis
-• {risk_pref} risk tolerance
-• Active decision making ({total_swipes} swipes)
-
-This aligns with a {'aggressive growth' if risk_pref == 'High' else 'balanced growth'} approach. Want to refine it further?"""
-        
-        return """I'd be happy to help! You can ask me about:
-
-• Investment recommendations
-• Risk analysis
-• Portfolio review
-• Hedging strategies
-• Rebalancing advice
-
-What specific area interests you most?"""
+        except Exception as e:
+            logger.error(f"Error in AI chat: {str(e)}")
+            return "I'm experiencing some technical difficulties. Please try again in a moment."
     
     def _get_behavior_insights(self, behavior: Optional[BehaviorData]) -> Dict:
-        """Get insights from user behavior"""
+        """Get insights from user behavior (all maintained by track_swipe, so no sorting here)"""
         if not behavior:
             return {}
         
-        # Top sectors by preference
-        top_sectors = sorted(
-            behavior.sector_preferences.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )[:3]
-        top_sectors = [sector for sector, _ in top_sectors]
-        
-        # Risk preference
-        risk_preference = "Medium"
-        if behavior.risk_preferences:
-            risk_preference = max(behavior.risk_preferences.keys(), key=lambda k: behavior.risk_preferences[k])
-        
         return {
-            "top_sectors": top_sectors,
-            "risk_preference": risk_preference,
-            "total_swipes": len(behavior.swipe_history),
-            "streak_days": behavior.streak_days
+            "top_sectors": preference_model.top_sectors(behavior),
+            "risk_preference": preference_model.risk_preference(behavior),
+            "total_swipes": behavior.swipe_count,
+            "streak_days": preference_model.current_streak(behavior, datetime.utcnow().date())
         }
@@ -1,31 +1,37 @@
 import jwt
 import uuid
 from datetime import datetime, timedelta
-from typing import Dict, Optional
+from typing import Any, Dict, Iterable, Optional
 import hashlib
 import logging
 
 from ..models import RegisterRequest, AuthResponse
+from .state_backend import InMemoryStateBackend, StateBackend, StateMap
 
 logger = logging.getLogger(__name__)
 
 class AuthService:
     """Service for user authentication and authorization"""
     
-    def __init__(self):
+    def __init__(self, state_backend: Optional[StateBackend] = None, admin_emails: Iterable[str] = ()):
         # In production, use proper secret management
         self.jwt_secret = "your-secret-key-change-in-production"
         self.algorithm = "HS256"
         self.token_expiry_hours = 24
         
-        # In production, this would be a database
-        self.users: Dict[str, Dict] = {}
+        # Users keyed by email, shared across workers when the backend is Redis
+        self.users: StateMap = StateMap(state_backend or InMemoryStateBackend(), "users", Dict[str, Any])
+        # Admins are provisioned by configuration only; the stored role is never trusted for it
+        self.admin_emails = {email.strip().lower() for email in admin_emails if email.strip()}
         
         # Create demo user
         self._create_demo_user()
     
     def _create_demo_user(self):
         """Create a demo user for development"""
+        if "demo@swipr.ai" in self.users:
+            # Another worker already created it; a new id would invalidate its tokens
+            return
         demo_user = {
             "id": str(uuid.uuid4()),
             "email": "demo@swipr.ai",
@@ -33,11 +39,18 @@ class AuthService:
             "first_name": "Demo",
             "last_name": "User",
             "created_at": datetime.utcnow(),
-            "is_active": True
+            "is_active": True,
+            "role": "user"
         }
         self.users[demo_user["email"]] = demo_user
         logger.info("Created demo user: demo@swipr.ai / demo123")
     
+    def _public(self, user: Dict) -> Dict:
+        """User data without the password hash, with the role resolved from the admin list"""
+        data = {k: v for k, v in user.items() if k != "password_hash"}
+        data["role"] = "admin" if user["email"].lower() in self.admin_emails else "user"
+        return data
+    
     def _hash_password(self, password: str) -> str:
         """Hash password using SHA-256 (use bcrypt in production)"""
         return hashlib.sha256(password.encode()).hexdigest()
@@ -60,7 +73,7 @@ class AuthService:
     def register(self, request: RegisterRequest) -> AuthResponse:
         """Register new user"""
         try:
-            # Check if user already exists
+            # Check if user already exists (cheap early exit; the write below re-checks)
             if request.email in self.users:
                 raise ValueError("User with this email already exists")
             
@@ -72,16 +85,23 @@ class AuthService:
                 "first_name": request.first_name,
                 "last_name": request.last_name,
                 "created_at": datetime.utcnow(),
-                "is_active": True
+                "is_active": True,
+                "role": "user"
             }
             
-            self.users[request.email] = user
+            def create(existing: Optional[Dict]) -> Dict:
+                if existing is not None:
+                    raise ValueError("User with this email already exists")
+                return user
+            
+            # Conditional on the email still being free, so two concurrent registrations can't both win
+            self.users.update(request.email, create)
             
             # Generate token
             token = self._generate_token(user)
             
             # Return response (don't include password hash)
-            user_data = {k: v for k, v in user.items() if k != "password_hash"}
+            user_data = self._public(user)
             
             logger.info(f"Registered new user: {request.email}")
             
@@ -114,7 +134,7 @@ class AuthService:
             token = self._generate_token(user)
             
             # Return response (don't include password hash)
-            user_data = {k: v for k, v in user.items() if k != "password_hash"}
+            user_data = self._public(user)
             
             logger.info(f"Authenticated user: {email}")
             
@@ -150,7 +170,7 @@ class AuthService:
                 return None
             
             # Return user data (without password hash)
-            return {k: v for k, v in user.items() if k != "password_hash"}
+            return self._public(user)
             
         except jwt.ExpiredSignatureError:
             logger.warning("Token has expired")
@@ -185,7 +205,7 @@ class AuthService:
         try:
             for user in self.users.values():
                 if user["id"] == user_id:
-                    return {k: v for k, v in user.items() if k != "password_hash"}
+                    return self._public(user)
             return None
             
         except Exception as e:
@@ -207,31 +227,39 @@ class AuthService:
             if not user:
                 return None
             
+            new_email = updates.get("email", user_email)
+            if new_email != user_email and new_email in self.users:
+                raise ValueError("Email already exists")
+            
             # Update allowed fields
             allowed_fields = ["first_name", "last_name", "is_active"]
-            for field, value in updates.items():
-                if field in allowed_fields:
-                    user[field] = value
+            changes = {field: value for field, value in updates.items() if field in allowed_fields}
             
             # Handle password update separately
             if "password" in updates:
-                user["password_hash"] = self._hash_password(updates["password"])
+                changes["password_hash"] = self._hash_password(updates["password"])
+            
+            def apply(stored: Optional[Dict]) -> Optional[Dict]:
+                return {**stored, **changes} if stored is not None and stored["id"] == user_id else None
+            
+            user = self.users.update(user_email, apply)
+            if not user:
+                return None
             
-            # Handle email update (requires re-keying the dict)
-            if "email" in updates and updates["email"] != user_email:
-                new_email = updates["email"]
-                if new_email in self.users:
-                    raise ValueError("Email already exists")
+            # Handle email update (requires re-keying: claim the new key, then drop the old one)
+            if new_email != user_email:
+                def claim(existing: Optional[Dict]) -> Dict:
+                    if existing is not None:
+                        raise ValueError("Email already exists")
+                    return {**user, "email": new_email}
                 
-                # Remove old email key and add new one
+                user = self.users.update(new_email, claim)
                 del self.users[user_email]
-                user["email"] = new_email
-                self.users[new_email] = user
             
             logger.info(f"Updated user: {user['email']}")
             
             # Return user data without password hash
-            return {k: v for k, v in user.items() if k != "password_hash"}
+            return self._public(user)
             
         except Exception as e:
             logger.error(f"Update user error: {str(e)}")
@@ -0,0 +1,42 @@
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from ..models import RiskLevel, Stock
+
+RISK_LEVELS: List[RiskLevel] = [RiskLevel.LOW, RiskLevel.MEDIUM, RiskLevel.HIGH]
+RISK_INDEX: Dict[RiskLevel, int] = {risk: i for i, risk in enumerate(RISK_LEVELS)}
+
+
+class CatalogSnapshot:
+    """Immutable, columnar view of the stock catalog at one catalog version"""
+
+    def __init__(self, stocks: List[Stock], version: int):
+        self.version = version
+        self.stocks: Dict[str, Stock] = {s.symbol: s.model_copy() for s in stocks}
+        self.symbols: List[str] = list(self.stocks)
+        self.index: Dict[str, int] = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+        self.sectors: List[str] = sorted({s.sector for s in stocks})
+        self.sector_index: Dict[str, int] = {sector: i for i, sector in enumerate(self.sectors)}
+
+        rows = list(self.stocks.values())
+        self.price = np.array([s.price for s in rows], dtype=np.float64)
+        self.change = np.array([s.change for s in rows], dtype=np.float64)
+        self.change_percent = np.array([s.changePercent for s in rows], dtype=np.float64)
+        self.dividend_yield = np.array([s.dividendYield or 0.0 for s in rows], dtype=np.float64)
+        self.sector_id = np.array([self.sector_index[s.sector] for s in rows], dtype=np.int32)
+        self.risk_id = np.array([RISK_INDEX[s.risk] for s in rows], dtype=np.int8)
+
+        for column in (self.price, self.change, self.change_percent, self.dividend_yield, self.sector_id, self.risk_id):
+            column.flags.writeable = False
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol.upper() in self.index
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def lookup(self, symbols: Iterable[str]) -> np.ndarray:
+        """Map symbols to row indices, -1 for symbols not in the catalog"""
+        return np.array([self.index.get(s.upper(), -1) for s in symbols], dtype=np.int64)
@@ -0,0 +1,186 @@
+import re
+import string
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from ..models import BehaviorData
+
+DEFAULT_SECTOR = "Technology"
+DEFAULT_RISK = "Medium"
+
+
+@dataclass(frozen=True)
+class Intent:
+    """Chat intent: keyword scores and the response template it renders"""
+    name: str
+    keywords: Dict[str, float]
+    template: str
+
+
+class Template:
+    """Response text split once into (literal, field) pairs, so rendering is a join"""
+
+    __slots__ = ("parts", "fields")
+
+    def __init__(self, text: str):
+        self.parts: List[Tuple[str, Optional[str]]] = []
+        for literal, name, spec, conversion in string.Formatter().parse(text):
+            if spec or conversion:
+                raise ValueError(f"Unsupported format spec in chat template field {name!r}")
+            self.parts.append((literal, name))
+        self.fields = frozenset(name for _, name in self.parts if name)
+
+    def render(self, values: Dict[str, Any]) -> str:
+        return "".join(literal + (str(values[name]) if name else "") for literal, name in self.parts)
+
+
+class ChatContext:
+    """Per-message inputs, each loaded on first use so intents that don't need them skip the work"""
+
+    def __init__(
+        self, user_id: str, load_behavior: Callable[[str], Optional[BehaviorData]],
+        insights: Callable[[BehaviorData], Dict], recommendations: Optional[Callable[[str, int], List[str]]] = None
+    ):
+        self.user_id = user_id
+        self._load_behavior = load_behavior
+        self._insights = insights
+        self._recommendations = recommendations
+
+    @cached_property
+    def insights(self) -> Dict:
+        behavior = self._load_behavior(self.user_id)
+        return self._insights(behavior) if behavior else {}
+
+    @cached_property
+    def top_sectors(self) -> List[str]:
+        return self.insights.get("top_sectors") or [DEFAULT_SECTOR]
+
+    @cached_property
+    def risk_preference(self) -> str:
+        return self.insights.get("risk_preference", DEFAULT_RISK)
+
+    @cached_property
+    def picks(self) -> List[str]:
+        return self._recommendations(self.user_id, 3) if self._recommendations else []
+
+
+# Template field -> value; only the fields a template references are computed
+FIELDS: Dict[str, Callable[[ChatContext], Any]] = {
+    "top_sector": lambda ctx: ctx.top_sectors[0],
+    "top_two_sectors": lambda ctx: ", ".join(ctx.top_sectors[:2]),
+    "top_two_sectors_and": lambda ctx: " and ".join(ctx.top_sectors[:2]),
+    "all_sectors": lambda ctx: ", ".join(ctx.top_sectors),
+    "risk_preference": lambda ctx: ctx.risk_preference,
+    "risk_stance": lambda ctx: {"High": "aggressive", "Low": "conservative"}.get(ctx.risk_preference, "moderate"),
+    "strategy_style": lambda ctx: "aggressive growth" if ctx.risk_preference == "High" else "balanced growth",
+    "total_swipes": lambda ctx: ctx.insights.get("total_swipes", 0),
+    "streak_days": lambda ctx: ctx.insights.get("streak_days", 0),
+    "picks_line": lambda ctx: f"• Investors with similar swipes are adding {', '.join(ctx.picks)}\n" if ctx.picks else "",
+}
+
+# Scores double up the declaration order, so one keyword of an intent outweighs
+# everything a later intent can score: mixed messages ("analyze my portfolio risk")
+# route as the old if/elif chain did (recommend > risk > hedge > portfolio > ...)
+INTENTS: Sequence[Intent] = (
+    Intent("recommend", {"what should i buy": 16.0, "recommend": 16.0}, """Based on your preferences for {top_two_sectors} and {risk_preference} risk stocks, I'd recommend:
+
+{picks_line}• Looking for undervalued stocks in {top_sector}
+• Consider diversifying into Consumer Staples for stability
+• Check out dividend-paying stocks for income
+
+Would you like specific stock suggestions?"""),
+    Intent("risk", {"risky": 8.0, "risk": 8.0}, """Your risk profile shows:
+
+• Preference for {risk_preference} risk stocks
+• Heavy focus on {top_two_sectors_and}
+• {total_swipes} total investment decisions
+
+You're currently {risk_stance} in your approach. Want to adjust?"""),
+    Intent("hedge", {"hedge": 4.0, "protect": 4.0}, """To hedge your current portfolio:
+
+• Consider defensive sectors like Utilities or Consumer Staples
+• Look into bonds or treasury funds
+• Add some inverse ETFs for downside protection
+• Diversify across market caps (small, mid, large)
+
+What specific risks are you most concerned about?"""),
+    Intent("portfolio", {"portfolio": 2.0, "analyze": 2.0}, """Portfolio Analysis:
+
+• Sector Focus: {all_sectors}
+• Risk Level: {risk_preference}
+• Activity: {total_swipes} decisions made
+• Streak: {streak_days} days
+
+Strengths: Clear sector preferences
+Opportunities: Consider more diversification
+
+Want detailed recommendations?"""),
+    Intent("rebalance", {"rebalance": 1.0, "balance": 1.0}, """Rebalancing suggestions:
+
+• Your {top_sector} allocation might be high
+• Consider adding exposure to Healthcare or Financials
+• Review positions older than 6 months
+• Take profits on winners, add to underweight sectors
+
+Shall I create a rebalancing plan for you?"""),
+    Intent("strategy", {"strategy": 1.0}, """Your investment strategy appears to be:
+
+• Growth-focused with {top_sector} emphasis
+• {risk_preference} risk tolerance
+• Active decision making ({total_swipes} swipes)
+
+This aligns with a {strategy_style} approach. Want to refine it further?"""),
+)
+
+FALLBACK = Intent("help", {}, """I'd be happy to help! You can ask me about:
+
+• Investment recommendations
+• Risk analysis
+• Portfolio review
+• Hedging strategies
+• Rebalancing advice
+
+What specific area interests you most?""")
+
+
+class IntentRouter:
+    """Scores every intent in one regex pass over the message.
+
+    All keywords are compiled into a single alternation (longest first, matched anywhere
+    in a word, so "unbalanced" counts "balance"). Each distinct keyword found adds its
+    score to its intent once, so repeating a word can't outvote a higher-scored one;
+    the highest total wins and ties go to the intent declared first.
+    """
+
+    def __init__(self, intents: Sequence[Intent] = INTENTS, fallback: Intent = FALLBACK):
+        self.intents = list(intents)
+        self.fallback = fallback
+        self.keywords: Dict[str, Tuple[int, float]] = {}
+        for i, intent in enumerate(self.intents):
+            for keyword, score in intent.keywords.items():
+                if keyword in self.keywords:
+                    raise ValueError(f"Chat keyword {keyword!r} is declared by more than one intent")
+                self.keywords[keyword] = (i, score)
+        alternation = "|".join(re.escape(k) for k in sorted(self.keywords, key=len, reverse=True))
+        self.pattern = re.compile(alternation) if self.keywords else None
+
+        self.templates = {intent.name: Template(intent.template) for intent in [*self.intents, fallback]}
+        for name, template in self.templates.items():
+            unknown = template.fields - FIELDS.keys()
+            if unknown:
+                raise ValueError(f"Chat template {name!r} uses unknown fields {sorted(unknown)}")
+
+    def route(self, message: str) -> Intent:
+        if self.pattern is None:
+            return self.fallback
+        scores = [0.0] * len(self.intents)
+        for keyword in {match.group() for match in self.pattern.finditer(message.lower())}:
+            i, score = self.keywords[keyword]
+            scores[i] += score
+        best = max(range(len(scores)), key=scores.__getitem__)
+        return self.intents[best] if scores[best] > 0 else self.fallback
+
+    def respond(self, message: str, context: ChatContext) -> str:
+        template = self.templates[self.route(message).name]
+        return template.render({name: FIELDS[name](context) for name in template.fields})
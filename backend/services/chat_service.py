@@ -0,0 +1,165 @@
+import asyncio
+import re
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Dict, Optional
+import logging
+
+from .ai_agent_service import AIAgentService
+
+logger = logging.getLogger(__name__)
+
+# Generations running at once across the process, and per user (queued + running)
+MAX_CONCURRENT = 32
+MAX_PER_USER = 2
+# Requests waiting for a slot beyond this are turned away instead of queued
+MAX_WAITING = 128
+QUEUE_TIMEOUT = 5.0
+
+CHUNK_PATTERN = re.compile(r"\s*\S+")
+
+
+class ChatLimitError(Exception):
+    """Raised when a user already has the maximum number of chats in flight"""
+
+
+class ChatBusyError(Exception):
+    """Raised when no generation slot frees up in time or the wait queue is full"""
+
+
+class ChatProvider(ABC):
+    """Source of chat responses, streamed as text chunks.
+
+    Consumers close the stream early (aclose) when the client goes away, so
+    providers should release upstream work in a finally block.
+    """
+
+    @abstractmethod
+    def stream(self, user_id: str, message: str) -> AsyncIterator[str]:
+        """Async generator of response chunks for one message"""
+
+
+class TemplateChatProvider(ChatProvider):
+    """The AI agent's intent-routed template answers, streamed word by word"""
+
+    def __init__(self, ai_agent_service: AIAgentService):
+        self.ai_agent_service = ai_agent_service
+
+    async def stream(self, user_id: str, message: str) -> AsyncIterator[str]:
+        response = self.ai_agent_service.chat(user_id, message)
+        for chunk in CHUNK_PATTERN.findall(response):
+            yield chunk
+
+
+class FakeChatProvider(ChatProvider):
+    """Deterministic local provider for tests and load runs: echoes the message,
+    optionally pausing between chunks to stand in for a slow model"""
+
+    def __init__(self, reply: Optional[Callable[[str], str]] = None, chunk_delay: float = 0.0):
+        self.reply = reply or (lambda message: f"You said: {message}")
+        self.chunk_delay = chunk_delay
+
+    async def stream(self, user_id: str, message: str) -> AsyncIterator[str]:
+        for chunk in CHUNK_PATTERN.findall(self.reply(message)):
+            if self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            yield chunk
+
+
+def create_chat_provider(kind: Optional[str], ai_agent_service: AIAgentService) -> ChatProvider:
+    """Build the provider selected by CHAT_PROVIDER (template or fake)"""
+    if (kind or "template") == "template":
+        return TemplateChatProvider(ai_agent_service)
+    if kind == "fake":
+        return FakeChatProvider()
+    raise ValueError(f"Unknown chat provider {kind}; expected template or fake")
+
+
+class ChatService:
+    """Admission control in front of a ChatProvider.
+
+    Each user may have MAX_PER_USER chats queued or running; beyond that requests
+    fail fast. Admitted requests wait up to QUEUE_TIMEOUT for one of MAX_CONCURRENT
+    generation slots. A slot is held only while the provider is producing chunks and
+    is released as soon as the stream finishes, fails or is closed by a disconnect.
+    """
+
+    def __init__(
+        self, provider: ChatProvider, max_concurrent: int = MAX_CONCURRENT, max_per_user: int = MAX_PER_USER,
+        max_waiting: int = MAX_WAITING, queue_timeout: float = QUEUE_TIMEOUT
+    ):
+        self.provider = provider
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.max_waiting = max_waiting
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._in_flight: Dict[str, int] = defaultdict(int)
+
+        self.waiting = 0
+        self.generating = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+        self.rejected_user = 0
+        self.rejected_busy = 0
+        self.timed_out = 0
+
+    async def stream(self, user_id: str, message: str) -> AsyncIterator[str]:
+        """Response chunks for one message; raises ChatLimitError or ChatBusyError before the first chunk"""
+        if self._in_flight.get(user_id, 0) >= self.max_per_user:
+            self.rejected_user += 1
+            raise ChatLimitError(f"At most {self.max_per_user} chats can run at once")
+        if self.waiting >= self.max_waiting:
+            self.rejected_busy += 1
+            raise ChatBusyError("Chat is at capacity, try again shortly")
+
+        self._in_flight[user_id] += 1
+        try:
+            await self._acquire_slot()
+            self.generating += 1
+            try:
+                async with aclosing(self.provider.stream(user_id, message)) as chunks:
+                    async for chunk in chunks:
+                        yield chunk
+                self.completed += 1
+            except (asyncio.CancelledError, GeneratorExit):
+                self.cancelled += 1
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Error streaming chat for user {user_id}: {str(e)}")
+                raise
+            finally:
+                self.generating -= 1
+                self._slots.release()
+        finally:
+            self._in_flight[user_id] -= 1
+            if not self._in_flight[user_id]:
+                del self._in_flight[user_id]
+
+    async def _acquire_slot(self) -> None:
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise ChatBusyError(f"No chat slot freed up within {self.queue_timeout:g}s, try again shortly")
+        finally:
+            self.waiting -= 1
+
+    def get_metrics(self) -> Dict:
+        return {
+            "maxConcurrent": self.max_concurrent,
+            "maxPerUser": self.max_per_user,
+            "generating": self.generating,
+            "waiting": self.waiting,
+            "usersInFlight": len(self._in_flight),
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+            "rejectedPerUser": self.rejected_user,
+            "rejectedBusy": self.rejected_busy,
+            "timedOut": self.timed_out,
+        }
@@ -0,0 +1,271 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional
+import logging
+
+from ..models import PortfolioHolding, QueuedStock, Stock, WatchlistItem
+from .queue_service import QueueService
+from .stock_service import StockService
+from .portfolio_service import PortfolioService
+from .state_backend import StateMap
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+CHUNK_ROWS = 500
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Column name -> Parquet type for each dataset; CSV uses the same column order
+DATASET_FIELDS = {
+    "queue": {
+        "user_id": "string", "symbol": "string", "confidence": "string", "addedAt": "string",
+        "name": "string", "price": "float64", "change": "float64", "changePercent": "float64",
+        "sector": "string", "marketCap": "string", "risk": "string",
+    },
+    "watchlist": {
+        "user_id": "string", "symbol": "string", "note": "string", "priority": "string",
+        "added_at": "string", "name": "string", "price": "float64", "changePercent": "float64",
+        "sector": "string",
+    },
+    "portfolio": {
+        "user_id": "string", "symbol": "string", "shares": "float64", "avgCost": "float64",
+        "currentPrice": "float64", "totalValue": "float64", "gainLoss": "float64",
+        "gainLossPercent": "float64", "sector": "string",
+    },
+}
+
+
+class _DrainableSink:
+    """Write-only file object whose buffered bytes can be drained between row groups"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        # Parquet footers record absolute offsets, so report bytes written, not buffered
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ExportService:
+    """Streaming NDJSON/CSV/Parquet exports of queues, watchlists and portfolios"""
+
+    def __init__(self, queue_service: QueueService, stock_service: StockService, portfolio_service: PortfolioService):
+        self.queue_service = queue_service
+        self.stock_service = stock_service
+        self.portfolio_service = portfolio_service
+
+    def validate_format(self, export_format: str) -> str:
+        """Return the media type for a format, or raise if it can't be served"""
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format {export_format}; expected one of {', '.join(EXPORT_FORMATS)}")
+        if export_format == "parquet" and pa is None:
+            raise ValueError("Parquet export requires pyarrow")
+        return EXPORT_FORMATS[export_format]
+
+    def export_user(self, dataset: str, user_id: str, export_format: str) -> AsyncIterator[bytes]:
+        """Stream one user's dataset"""
+        return self._encode(dataset, self._rows(dataset, [user_id]), export_format)
+
+    def export_all(self, dataset: str, export_format: str) -> AsyncIterator[bytes]:
+        """Stream every user's dataset without materializing it"""
+        if dataset not in DATASET_FIELDS:
+            raise ValueError(f"Unknown export dataset {dataset}")
+        return self._encode(dataset, self._bulk_rows(dataset), export_format)
+
+    def _source(self, dataset: str) -> StateMap:
+        return {
+            "queue": self.queue_service.queues,
+            "watchlist": self.stock_service.watchlists,
+            "portfolio": self.portfolio_service.portfolios,
+        }[dataset]
+
+    def _rows(self, dataset: str, user_ids: Iterable[str]) -> Iterator[Dict]:
+        if dataset not in DATASET_FIELDS:
+            raise ValueError(f"Unknown export dataset {dataset}")
+        for user_id in user_ids:
+            if dataset == "queue":
+                yield from self._queue_rows(user_id)
+            elif dataset == "watchlist":
+                yield from self._watchlist_rows(user_id)
+            else:
+                yield from self._portfolio_rows(user_id)
+
+    def _queue_rows(self, user_id: str) -> Iterator[Dict]:
+        # Reuse the cached enriched projection; items whose stock left the catalog are skipped
+        for item in self.queue_service.get_queue_with_stock_data(user_id):
+            stock = item["stock"]
+            yield {
+                "user_id": user_id,
+                "symbol": item["symbol"],
+                "confidence": item["confidence"],
+                "addedAt": item["addedAt"],
+                "name": stock["name"],
+                "price": stock["price"],
+                "change": stock["change"],
+                "changePercent": stock["changePercent"],
+                "sector": stock["sector"],
+                "marketCap": stock["marketCap"],
+                "risk": stock["risk"],
+            }
+
+    def _bulk_rows(self, dataset: str) -> Iterator[Dict]:
+        """Every user's rows, read CHUNK_ROWS users at a time against one catalog snapshot.
+
+        For queues this bypasses get_queue_with_stock_data, so an export doesn't leave an
+        enriched view (and its price-patch subscriptions) cached for every user.
+        """
+        source = self._source(dataset)
+        # Copy the keys only, so users added mid-export can't break iteration
+        user_ids = list(source.keys())
+        snapshot = self.stock_service.get_catalog_snapshot()
+        for start in range(0, len(user_ids), CHUNK_ROWS):
+            batch = user_ids[start:start + CHUNK_ROWS]
+            for user_id, value in zip(batch, source.get_many(batch)):
+                if not value:
+                    continue
+                if dataset == "queue":
+                    for item in value.values():
+                        stock = snapshot.stocks.get(item.symbol)
+                        if stock:
+                            yield self._queue_row(user_id, item, stock)
+                elif dataset == "watchlist":
+                    for item in value:
+                        yield self._watchlist_row(user_id, item, snapshot.stocks.get(item.symbol))
+                else:
+                    for holding in value.holdings:
+                        yield self._portfolio_row(user_id, holding, snapshot.stocks.get(holding.symbol))
+
+    @staticmethod
+    def _queue_row(user_id: str, item: QueuedStock, stock: Stock) -> Dict:
+        return {
+            "user_id": user_id,
+            "symbol": item.symbol,
+            "confidence": item.confidence.value,
+            "addedAt": item.addedAt.isoformat(),
+            "name": stock.name,
+            "price": stock.price,
+            "change": stock.change,
+            "changePercent": stock.changePercent,
+            "sector": stock.sector,
+            "marketCap": stock.marketCap,
+            "risk": stock.risk.value,
+        }
+
+    def _watchlist_rows(self, user_id: str) -> Iterator[Dict]:
+        for item in self.stock_service.get_watchlist(user_id):
+            yield self._watchlist_row(user_id, item, self.stock_service.get_stock(item.symbol))
+
+    @staticmethod
+    def _watchlist_row(user_id: str, item: WatchlistItem, stock: Optional[Stock]) -> Dict:
+        return {
+            "user_id": user_id,
+            "symbol": item.symbol,
+            "note": item.note,
+            "priority": item.priority,
+            "added_at": item.added_at.isoformat(),
+            "name": stock.name if stock else None,
+            "price": stock.price if stock else None,
+            "changePercent": stock.changePercent if stock else None,
+            "sector": stock.sector if stock else None,
+        }
+
+    def _portfolio_rows(self, user_id: str) -> Iterator[Dict]:
+        portfolio = self.portfolio_service.get_portfolio(user_id)
+        for holding in (portfolio.holdings if portfolio else []):
+            yield self._portfolio_row(user_id, holding, self.stock_service.get_stock(holding.symbol))
+
+    @staticmethod
+    def _portfolio_row(user_id: str, holding: PortfolioHolding, stock: Optional[Stock]) -> Dict:
+        return {
+            "user_id": user_id,
+            **holding.model_dump(),
+            "sector": stock.sector if stock else None,
+        }
+
+    async def _encode(self, dataset: str, rows: Iterator[Dict], export_format: str) -> AsyncIterator[bytes]:
+        """Encode rows chunk by chunk, yielding to the event loop between chunks"""
+        self.validate_format(export_format)
+        fields = list(DATASET_FIELDS[dataset])
+        writer: Optional[object] = None
+        sink = _DrainableSink()
+        schema = None
+        if export_format == "parquet":
+            schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in DATASET_FIELDS[dataset].items()])
+        exported = 0
+
+        for chunk in self._chunks(rows):
+            if export_format == "ndjson":
+                yield "".join(json.dumps(row, default=str) + "\n" for row in chunk).encode()
+            elif export_format == "csv":
+                buffer = io.StringIO()
+                csv_writer = csv.DictWriter(buffer, fieldnames=fields)
+                if not exported:
+                    csv_writer.writeheader()
+                csv_writer.writerows(chunk)
+                yield buffer.getvalue().encode()
+            else:
+                table = pa.Table.from_pylist(chunk, schema=schema)
+                if writer is None:
+                    writer = pq.ParquetWriter(sink, schema)
+                writer.write_table(table)
+                yield sink.drain()
+
+            exported += len(chunk)
+            await asyncio.sleep(0)
+
+        if export_format == "csv" and not exported:
+            yield (",".join(fields) + "\r\n").encode()
+        elif export_format == "parquet":
+            if writer is None:
+                writer = pq.ParquetWriter(sink, schema)
+            writer.close()
+            yield sink.drain()
+
+        logger.info(f"Streamed {exported} {dataset} rows as {export_format}")
+
+    def _chunks(self, rows: Iterator[Dict]) -> Iterator[List[Dict]]:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= CHUNK_ROWS:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def filename(dataset: str, export_format: str) -> str:
+        return f"{dataset}-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.{export_format}"
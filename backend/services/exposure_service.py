@@ -0,0 +1,91 @@
+from collections import defaultdict
+from typing import Dict, Iterable
+import logging
+
+from ..models import Portfolio, Stock
+from .stock_service import StockService
+
+logger = logging.getLogger(__name__)
+
+
+class ExposureIndex:
+    """Platform-wide shares and market value per symbol and sector, maintained incrementally"""
+
+    def __init__(self, stock_service: StockService):
+        self.stock_service = stock_service
+        self.symbol_shares: Dict[str, float] = defaultdict(float)
+        self.symbol_value: Dict[str, float] = defaultdict(float)
+        self.sector_shares: Dict[str, float] = defaultdict(float)
+        self.sector_value: Dict[str, float] = defaultdict(float)
+        stock_service.subscribe_prices(self.on_price_change)
+        stock_service.subscribe_fundamentals(self.on_fundamentals_change)
+
+    def apply_trade(self, symbol: str, delta_shares: float) -> None:
+        """Apply a position change of delta_shares (negative for sells)"""
+        stock = self.stock_service.get_stock(symbol)
+        if not stock or not delta_shares:
+            return
+        self.symbol_shares[stock.symbol] += delta_shares
+        self.symbol_value[stock.symbol] += delta_shares * stock.price
+        self.sector_shares[stock.sector] += delta_shares
+        self.sector_value[stock.sector] += delta_shares * stock.price
+
+    def on_price_change(self, stock: Stock, old_price: float) -> None:
+        """Revalue one symbol and its sector in O(1)"""
+        shares = self.symbol_shares.get(stock.symbol)
+        if not shares:
+            return
+        delta = shares * (stock.price - old_price)
+        self.symbol_value[stock.symbol] += delta
+        self.sector_value[stock.sector] += delta
+
+    def on_fundamentals_change(self, stock: Stock, old: Stock) -> None:
+        """Move a symbol's shares and value to its new sector"""
+        shares = self.symbol_shares.get(stock.symbol)
+        if not shares or stock.sector == old.sector:
+            return
+        value = self.symbol_value[stock.symbol]
+        self.sector_shares[old.sector] -= shares
+        self.sector_value[old.sector] -= value
+        self.sector_shares[stock.sector] += shares
+        self.sector_value[stock.sector] += value
+
+    def rebuild(self, portfolios: Iterable[Portfolio]) -> None:
+        """Recompute from scratch, e.g. after a restore, to shed float drift, or to pick up
+        trades made by other workers (the aggregates are process-local)
+
+        The new aggregates are built off to the side and swapped in, so readers never see
+        a half-built index. A local trade racing the rebuild can be off until the next one.
+        """
+        snapshot = self.stock_service.get_catalog_snapshot()
+        symbol_shares: Dict[str, float] = defaultdict(float)
+        symbol_value: Dict[str, float] = defaultdict(float)
+        sector_shares: Dict[str, float] = defaultdict(float)
+        sector_value: Dict[str, float] = defaultdict(float)
+        for portfolio in portfolios:
+            for holding in portfolio.holdings:
+                stock = snapshot.stocks.get(holding.symbol)
+                if not stock or not holding.shares:
+                    continue
+                symbol_shares[stock.symbol] += holding.shares
+                symbol_value[stock.symbol] += holding.shares * stock.price
+                sector_shares[stock.sector] += holding.shares
+                sector_value[stock.sector] += holding.shares * stock.price
+        self.symbol_shares, self.symbol_value = symbol_shares, symbol_value
+        self.sector_shares, self.sector_value = sector_shares, sector_value
+
+    def get_exposure(self) -> Dict:
+        """Read the aggregates in O(#symbols)"""
+        return {
+            "symbols": {
+                symbol: {"shares": round(shares, 4), "marketValue": round(self.symbol_value[symbol], 2)}
+                for symbol, shares in self.symbol_shares.items()
+                if abs(shares) > 1e-9
+            },
+            "sectors": {
+                sector: {"shares": round(shares, 4), "marketValue": round(self.sector_value[sector], 2)}
+                for sector, shares in self.sector_shares.items()
+                if abs(shares) > 1e-9
+            },
+            "totalMarketValue": round(sum(self.symbol_value.values()), 2)
+        }
@@ -0,0 +1,153 @@
+import bisect
+import math
+import time
+from array import array
+from typing import Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_CHART_POINTS = 500
+COMPACT_EVERY = 1_000
+
+# (bucket seconds, retention seconds or None to keep forever). Each tier keeps the
+# last (close) value per bucket, so a chart range is answered from the finest tier
+# that covers it in at most MAX_CHART_POINTS points.
+TIERS = [
+    (0, 86_400),                # raw samples, last day
+    (300, 2 * 86_400),          # 5 min, 1D chart
+    (1_800, 8 * 86_400),        # 30 min, 1W chart
+    (14_400, 35 * 86_400),      # 4 hours, 1M chart
+    (86_400, None),             # daily, 1Y chart
+    (604_800, None),            # weekly, ALL chart
+]
+
+CHART_RANGES = {
+    "1D": 86_400,
+    "1W": 7 * 86_400,
+    "1M": 30 * 86_400,
+    "1Y": 365 * 86_400,
+    "ALL": None,
+}
+
+
+class _Series:
+    """Append-only (ts, total_value, cost_basis) columns stored as typed arrays"""
+
+    __slots__ = ("bucket", "retention", "ts", "value", "cost")
+
+    def __init__(self, bucket: int, retention: Optional[int]):
+        self.bucket = bucket
+        self.retention = retention
+        self.ts = array("d")
+        self.value = array("d")
+        self.cost = array("d")
+
+    def append(self, ts: float, value: float, cost: float) -> None:
+        if self.bucket:
+            ts = ts - ts % self.bucket
+            if self.ts and self.ts[-1] == ts:
+                # Same bucket: keep the latest sample as the bucket close
+                self.value[-1] = value
+                self.cost[-1] = cost
+                return
+        self.ts.append(ts)
+        self.value.append(value)
+        self.cost.append(cost)
+
+    def compact(self, now: float) -> None:
+        """Drop samples older than the tier's retention window"""
+        if self.retention is None or not self.ts:
+            return
+        cut = bisect.bisect_left(self.ts, now - self.retention)
+        if cut:
+            self.ts = self.ts[cut:]
+            self.value = self.value[cut:]
+            self.cost = self.cost[cut:]
+
+    def covers(self, start: float, now: float) -> bool:
+        return self.retention is None or now - self.retention <= start
+
+
+class _UserHistory:
+    __slots__ = ("tiers", "appends")
+
+    def __init__(self):
+        self.tiers = [_Series(bucket, retention) for bucket, retention in TIERS]
+        self.appends = 0
+
+
+class PortfolioHistoryService:
+    """Per-user portfolio value time series with precomputed downsampling tiers"""
+
+    def __init__(self):
+        self.histories: Dict[str, _UserHistory] = {}
+
+    def record(self, user_id: str, total_value: float, cost_basis: float, ts: Optional[float] = None) -> None:
+        """Append a portfolio value sample"""
+        history = self.histories.get(user_id)
+        if history is None:
+            history = self.histories[user_id] = _UserHistory()
+
+        raw = history.tiers[0]
+        ts = time.time() if ts is None else ts
+        if raw.ts and ts < raw.ts[-1]:
+            # Series is append-only; clamp late samples onto the last timestamp
+            ts = raw.ts[-1]
+
+        for tier in history.tiers:
+            tier.append(ts, total_value, cost_basis)
+
+        history.appends += 1
+        if history.appends % COMPACT_EVERY == 0:
+            self._compact(history, ts)
+
+    def last_sampled(self, user_id: str) -> Optional[float]:
+        """Timestamp of the user's latest sample, if any"""
+        history = self.histories.get(user_id)
+        return history.tiers[0].ts[-1] if history is not None and history.tiers[0].ts else None
+
+    def compact(self, now: Optional[float] = None) -> None:
+        """Apply retention to every user's tiers"""
+        now = time.time() if now is None else now
+        for history in self.histories.values():
+            self._compact(history, now)
+
+    def _compact(self, history: _UserHistory, now: float) -> None:
+        for tier in history.tiers:
+            tier.compact(now)
+
+    def get_history(self, user_id: str, chart_range: str = "1M", now: Optional[float] = None) -> List[Dict]:
+        """Get at most MAX_CHART_POINTS samples for a chart range (1D/1W/1M/1Y/ALL)"""
+        if chart_range not in CHART_RANGES:
+            raise ValueError(f"Unsupported range {chart_range}; expected one of {', '.join(CHART_RANGES)}")
+
+        history = self.histories.get(user_id)
+        if history is None or not history.tiers[0].ts:
+            return []
+
+        now = time.time() if now is None else now
+        span = CHART_RANGES[chart_range]
+        start = now - span if span is not None else history.tiers[-1].ts[0]
+
+        tier = history.tiers[-1]
+        for candidate in history.tiers:
+            if not candidate.covers(start, now):
+                continue
+            expected = span / candidate.bucket if candidate.bucket and span else math.inf
+            lo = bisect.bisect_left(candidate.ts, start)
+            if expected <= MAX_CHART_POINTS or len(candidate.ts) - lo <= MAX_CHART_POINTS:
+                tier = candidate
+                break
+
+        lo = bisect.bisect_left(tier.ts, start)
+        indices = range(lo, len(tier.ts))
+        if len(indices) > MAX_CHART_POINTS:
+            # Only the unbounded ALL range can get here; stride it, keeping the latest point
+            step = math.ceil(len(indices) / MAX_CHART_POINTS)
+            indices = range(len(tier.ts) - 1, lo - 1, -step)[::-1]
+
+        return [
+            {"ts": tier.ts[i], "value": round(tier.value[i], 2), "costBasis": round(tier.cost[i], 2)}
+            for i in indices
+        ]
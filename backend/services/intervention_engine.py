@@ -0,0 +1,368 @@
+import operator
+from collections import Counter
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from ..models import InterventionType, Portfolio, QueuedStock
+from . import preference_model
+from .catalog import CatalogSnapshot, RISK_LEVELS
+
+RECENT_SWIPES = 10
+TARGET_RISK = {"conservative": 1.5, "moderate": 2.0, "aggressive": 2.5}
+
+
+class RuleInputs:
+    """Rule inputs for one user, each loaded on first use"""
+
+    def __init__(self, user_id: str, now: datetime, loaders: Dict[str, Callable[[str], Any]],
+                 preloaded: Optional[Dict[str, Any]] = None):
+        self.user_id = user_id
+        self.now = now
+        self._loaders = loaders
+        self._values: Dict[str, Any] = dict(preloaded or {})
+
+    def __getitem__(self, name: str) -> Any:
+        if name not in self._values:
+            loader = self._loaders.get(name)
+            self._values[name] = loader(self.user_id) if loader else None
+        return self._values[name]
+
+
+Features = Dict[str, np.ndarray]
+
+
+class FeatureGroup(NamedTuple):
+    """Feature columns extracted together for a batch of users from the same inputs"""
+    name: str
+    inputs: Tuple[str, ...]
+    features: Tuple[str, ...]
+    extract: Callable[[List[RuleInputs]], Features]
+
+
+# A condition compares a feature column with a constant or another feature column
+Condition = Tuple[str, str, Union[float, str]]
+
+OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+}
+
+
+class Rule(NamedTuple):
+    """Intervention fired for every user matching all conditions.
+
+    render(row) returns the AIIntervention fields for one triggered user, with
+    id set to a dedupe key (type plus subject) that the caller makes stable.
+    `uses` lists features read only by render.
+    """
+    name: str
+    type: InterventionType
+    when: Tuple[Condition, ...]
+    render: Callable[[Dict[str, Any]], Dict[str, Any]]
+    uses: Tuple[str, ...] = ()
+
+
+def exposure_matrix(
+    snapshot: CatalogSnapshot, positions: Sequence[Tuple[List[QueuedStock], Optional[Portfolio]]]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-user sector and risk weights (fractions) of holdings plus queue, one bincount each.
+
+    Holdings weigh their market value. Queued stocks not yet held count as planned
+    buys of the user's average position size, or 1 each when there are no holdings.
+    """
+    n_users, n_sectors, n_risks = len(positions), len(snapshot.sectors), len(RISK_LEVELS)
+    user_rows: List[np.ndarray] = []
+    catalog_rows: List[np.ndarray] = []
+    weights: List[np.ndarray] = []
+    for user_row, (queue, portfolio) in enumerate(positions):
+        holdings = portfolio.holdings if portfolio else []
+        held_rows = snapshot.lookup(h.symbol for h in holdings)
+        held = held_rows >= 0
+        values = np.array([h.shares for h in holdings], dtype=np.float64)[held] * snapshot.price[held_rows[held]]
+
+        held_symbols = {h.symbol for h in holdings}
+        queued_rows = snapshot.lookup(item.symbol for item in queue if item.symbol not in held_symbols)
+        queued_rows = queued_rows[queued_rows >= 0]
+        planned = values.mean() if len(values) else 1.0
+
+        rows = np.concatenate([held_rows[held], queued_rows])
+        user_rows.append(np.full(len(rows), user_row, dtype=np.int64))
+        catalog_rows.append(rows)
+        weights.append(np.concatenate([values, np.full(len(queued_rows), planned)]))
+
+    if not n_users:
+        return np.zeros((0, n_sectors)), np.zeros((0, n_risks))
+    users = np.concatenate(user_rows)
+    rows = np.concatenate(catalog_rows)
+    values = np.concatenate(weights)
+
+    sector_values = np.bincount(
+        users * n_sectors + snapshot.sector_id[rows], weights=values, minlength=n_users * n_sectors
+    ).reshape(n_users, n_sectors)
+    risk_values = np.bincount(
+        users * n_risks + snapshot.risk_id[rows], weights=values, minlength=n_users * n_risks
+    ).reshape(n_users, n_risks)
+    totals = sector_values.sum(axis=1, keepdims=True)
+    safe_totals = np.where(totals > 0, totals, 1.0)
+    return sector_values / safe_totals, risk_values / safe_totals
+
+
+def _profile_features(batch: List[RuleInputs]) -> Features:
+    return {
+        "max_concentration": np.array([i["profile"].maxSectorConcentration for i in batch], dtype=np.float64),
+        "target_risk": np.array([TARGET_RISK[i["profile"].riskTolerance.value] for i in batch]),
+    }
+
+
+def _exposure_features(batch: List[RuleInputs]) -> Features:
+    snapshot: Optional[CatalogSnapshot] = batch[0]["catalog"] if batch else None
+    if snapshot is None or not len(snapshot):
+        return {"concentration": np.zeros(len(batch)), "dominant_sector": np.full(len(batch), "", dtype=object)}
+    sector_weights, _ = exposure_matrix(snapshot, [(i["queue"] or [], i["holdings"]) for i in batch])
+    dominant = sector_weights.argmax(axis=1)
+    return {
+        "concentration": sector_weights[np.arange(len(batch)), dominant] * 100,
+        "dominant_sector": np.array(snapshot.sectors, dtype=object)[dominant],
+    }
+
+
+def _risk_features(batch: List[RuleInputs]) -> Features:
+    """Average decayed risk preference on the 1-3 scale and its gap to the profile target"""
+    if not batch:
+        return {"has_risk": np.zeros(0), "avg_risk": np.zeros(0), "risk_gap": np.zeros(0)}
+    risks = np.array([preference_model.decayed_vectors(i["behavior"], i.now)[1] for i in batch])
+    totals = risks.sum(axis=1)
+    avg_risk = np.where(totals > 0, risks @ preference_model.RISK_SCALE / np.where(totals > 0, totals, 1.0), 2.0)
+    target = np.array([TARGET_RISK[i["profile"].riskTolerance.value] for i in batch])
+    return {
+        "has_risk": np.array([i["behavior"].preferences_updated_at is not None for i in batch], dtype=np.float64),
+        "avg_risk": avg_risk,
+        "risk_gap": avg_risk - target,
+    }
+
+
+def _theme_features(batch: List[RuleInputs]) -> Features:
+    """Dominant sector among the last RECENT_SWIPES positive swipes"""
+    positive, counts, sectors = [], [], []
+    for inputs in batch:
+        recent = [
+            swipe.sector for swipe in islice(reversed(list(inputs["behavior"].swipe_history)), RECENT_SWIPES)
+            if swipe.action.value != "skip"
+        ]
+        sector, count = Counter(recent).most_common(1)[0] if recent else ("", 0)
+        positive.append(len(recent))
+        counts.append(count)
+        sectors.append(sector)
+    positive = np.array(positive, dtype=np.float64)
+    counts = np.array(counts, dtype=np.float64)
+    return {
+        "recent_positive": positive,
+        "theme_count": counts,
+        "theme_share": counts / np.where(positive > 0, positive, 1.0),
+        "theme_sector": np.array(sectors, dtype=object),
+    }
+
+
+def _activity_features(batch: List[RuleInputs]) -> Features:
+    return {"inactive_days": np.array([(i.now - i["behavior"].last_activity).days for i in batch], dtype=np.float64)}
+
+
+def _queue_features(batch: List[RuleInputs]) -> Features:
+    return {"queue_size": np.array([len(i["queue"] or []) for i in batch], dtype=np.float64)}
+
+
+def _drift_features(batch: List[RuleInputs]) -> Features:
+    """Stored drift from the last rebalancing run, reduced to the largest sector gap"""
+    drifted, over, max_drift, trades, sectors, weights, targets = [], [], [], [], [], [], []
+    for inputs in batch:
+        drift = inputs["drift"] or {}
+        gaps = {
+            sector: weight - drift["sectorTargets"].get(sector, 0)
+            for sector, weight in drift.get("sectorWeights", {}).items()
+        }
+        sector = max(gaps, key=lambda k: abs(gaps[k])) if gaps else ""
+        drifted.append(bool(drift.get("drifted")))
+        over.append(bool(drift.get("overConcentrated")))
+        max_drift.append(drift.get("maxSectorDrift", 0.0))
+        trades.append(len(drift.get("trades", [])))
+        sectors.append(sector)
+        weights.append(drift["sectorWeights"][sector] if sector else 0.0)
+        targets.append(drift["sectorTargets"].get(sector, 0.0) if sector else 0.0)
+    return {
+        "drifted": np.array(drifted, dtype=np.float64),
+        "over_concentrated": np.array(over, dtype=np.float64),
+        "max_drift": np.array(max_drift, dtype=np.float64),
+        "trade_count": np.array(trades, dtype=np.float64),
+        "drift_sector": np.array(sectors, dtype=object),
+        "drift_sector_weight": np.array(weights, dtype=np.float64),
+        "drift_sector_target": np.array(targets, dtype=np.float64),
+    }
+
+
+FEATURE_GROUPS: List[FeatureGroup] = [
+    FeatureGroup("profile", ("profile",), ("max_concentration", "target_risk"), _profile_features),
+    FeatureGroup("exposure", ("queue", "holdings", "catalog"), ("concentration", "dominant_sector"), _exposure_features),
+    FeatureGroup("risk", ("profile", "behavior", "clock"), ("has_risk", "avg_risk", "risk_gap"), _risk_features),
+    FeatureGroup("theme", ("behavior",), ("recent_positive", "theme_count", "theme_share", "theme_sector"), _theme_features),
+    FeatureGroup("activity", ("behavior", "clock"), ("inactive_days",), _activity_features),
+    FeatureGroup("queue", ("queue",), ("queue_size",), _queue_features),
+    FeatureGroup("drift", ("drift",), (
+        "drifted", "over_concentrated", "max_drift", "trade_count",
+        "drift_sector", "drift_sector_weight", "drift_sector_target"
+    ), _drift_features),
+]
+
+
+def _render_diversification(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": f"diversification:{row['dominant_sector']}",
+        "title": "Too much in one sector?",
+        "message": f"You have {row['concentration']:.0f}% in {row['dominant_sector']}. Want to diversify?",
+        "actionText": "View suggestions",
+        "actionType": "view_suggestions",
+        "priority": "medium",
+        "triggerReason": f"Sector concentration above {row['max_concentration']}%",
+    }
+
+
+def _render_risk_above(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": "risk_check:above",
+        "title": "Off-track from your goal?",
+        "message": "You're trending riskier than planned. Want to adjust?",
+        "actionText": "Adjust strategy",
+        "actionType": "adjust_strategy",
+        "priority": "high",
+        "triggerReason": f"Average risk {row['avg_risk']:.1f} exceeds target {row['target_risk']:g}",
+    }
+
+
+def _render_risk_below(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": "risk_check:below",
+        "title": "Too conservative?",
+        "message": "Your portfolio is more conservative than your goals. Want to add growth?",
+        "actionText": "View suggestions",
+        "actionType": "view_suggestions",
+        "priority": "medium",
+        "triggerReason": f"Average risk {row['avg_risk']:.1f} below target {row['target_risk']:g}",
+    }
+
+
+def _render_theme(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": f"strategy_focus:{row['theme_sector']}",
+        "title": "High-conviction theme detected?",
+        "message": f"You're showing interest in {row['theme_sector']}. Want to bundle these into a focused strategy?",
+        "actionText": "Create theme",
+        "actionType": "view_suggestions",
+        "priority": "low",
+        "triggerReason": f"Multiple stocks in {row['theme_sector']} theme",
+    }
+
+
+def _render_drift(row: Dict[str, Any]) -> Dict[str, Any]:
+    sector = row["drift_sector"]
+    message = (
+        f"{sector} is {row['drift_sector_weight']:.0f}% of your portfolio vs a "
+        f"{row['drift_sector_target']:.0f}% target. Want to rebalance?"
+        if sector else "Your holdings have drifted from your target allocation. Want to rebalance?"
+    )
+    return {
+        "id": f"rebalancing:drift:{sector}",
+        "title": "You've drifted from plan",
+        "message": message,
+        "actionText": "Rebalance",
+        "actionType": "rebalance",
+        "priority": "high" if row["over_concentrated"] else "medium",
+        "triggerReason": f"Allocation drift of {row['max_drift']:g}% ({row['trade_count']:.0f} suggested trades)",
+    }
+
+
+def _render_inactivity(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": "rebalancing:inactive",
+        "title": "You've drifted from plan",
+        "message": "No rebalancing in a while. Want to review your strategy?",
+        "actionText": "Rebalance",
+        "actionType": "rebalance",
+        "priority": "medium",
+        "triggerReason": f"No activity for {row['inactive_days']:.0f} days",
+    }
+
+
+RULES: List[Rule] = [
+    Rule("sector_concentration", InterventionType.DIVERSIFICATION,
+         (("concentration", ">", "max_concentration"),), _render_diversification, ("dominant_sector",)),
+    Rule("risk_above_target", InterventionType.RISK_CHECK,
+         (("has_risk", "==", 1), ("risk_gap", ">", 0.5)), _render_risk_above, ("avg_risk", "target_risk")),
+    Rule("risk_below_target", InterventionType.RISK_CHECK,
+         (("has_risk", "==", 1), ("risk_gap", "<", -0.5)), _render_risk_below, ("avg_risk", "target_risk")),
+    Rule("investment_theme", InterventionType.STRATEGY_FOCUS,
+         (("recent_positive", ">=", 3), ("theme_count", ">=", 3), ("theme_share", ">=", 0.4)), _render_theme,
+         ("theme_sector",)),
+    Rule("allocation_drift", InterventionType.REBALANCING,
+         (("drifted", "==", 1),), _render_drift),
+    Rule("inactivity", InterventionType.REBALANCING,
+         (("drifted", "==", 0), ("inactive_days", ">", 7), ("queue_size", ">", 3)), _render_inactivity),
+]
+
+
+class CompiledRule(NamedTuple):
+    rule: Rule
+    groups: Tuple[FeatureGroup, ...]
+    inputs: Tuple[str, ...]
+    evaluate: Callable[[Features], np.ndarray]
+
+
+def compile_rules(rules: List[Rule], groups: List[FeatureGroup] = FEATURE_GROUPS) -> List[CompiledRule]:
+    """Resolve each rule's features to their groups and inputs, and its conditions to one mask function"""
+    by_feature = {feature: group for group in groups for feature in group.features}
+    compiled = []
+    for rule in rules:
+        names = list(rule.uses)
+        for feature, op, value in rule.when:
+            if op not in OPERATORS:
+                raise ValueError(f"Rule {rule.name}: unknown operator {op}")
+            names.extend((feature, value) if isinstance(value, str) else (feature,))
+        used: List[FeatureGroup] = []
+        for name in names:
+            if name not in by_feature:
+                raise ValueError(f"Rule {rule.name}: unknown feature {name}")
+            if by_feature[name] not in used:
+                used.append(by_feature[name])
+        inputs = tuple(dict.fromkeys(name for group in used for name in group.inputs))
+        compiled.append(CompiledRule(rule, tuple(used), inputs, _mask_function(rule.when)))
+    return compiled
+
+
+def _mask_function(conditions: Tuple[Condition, ...]) -> Callable[[Features], np.ndarray]:
+    checks = [(feature, OPERATORS[op], value) for feature, op, value in conditions]
+
+    def evaluate(features: Features) -> np.ndarray:
+        mask = None
+        for feature, compare, value in checks:
+            result = compare(features[feature], features[value] if isinstance(value, str) else value)
+            mask = result if mask is None else mask & result
+        return mask
+
+    return evaluate
+
+
+def extract_features(groups: Sequence[FeatureGroup], batch: List[RuleInputs]) -> Features:
+    """Feature columns for a batch of users, one vectorized extraction per group"""
+    features: Features = {}
+    for group in groups:
+        features.update(group.extract(batch))
+    return features
+
+
+def row(features: Features, index: int) -> Dict[str, Any]:
+    """One user's features as plain Python scalars"""
+    return {name: column[index].item() if hasattr(column[index], "item") else column[index] for name, column in features.items()}
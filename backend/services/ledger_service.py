@@ -0,0 +1,224 @@
+import bisect
+import json
+import os
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_EVERY = 100
+
+BUY = 1
+SELL = 2
+SIDES = {BUY: "buy", SELL: "sell"}
+
+# Fixed-width records: event n lives at byte n * itemsize, so the sequence number
+# doubles as the file offset and the whole log loads with a single np.fromfile
+EVENT_DTYPE = np.dtype([
+    ("ts", "<f8"),
+    ("user", "S36"),
+    ("symbol", "S8"),
+    ("side", "u1"),
+    ("shares", "<f8"),
+    ("price", "<f8"),
+])
+
+Positions = Dict[str, List[float]]  # symbol -> [shares, avg_cost]
+Trade = Tuple[str, int, float, float]  # (symbol, side, shares, price)
+
+
+class _MemoryLog:
+    """Event log kept in a bytearray (development / tests)"""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def append(self, record: bytes) -> None:
+        self.data += record
+
+    def read(self, seq: int) -> np.void:
+        start = seq * EVENT_DTYPE.itemsize
+        return np.frombuffer(bytes(self.data[start:start + EVENT_DTYPE.itemsize]), dtype=EVENT_DTYPE)[0]
+
+    def read_all(self) -> np.ndarray:
+        return np.frombuffer(bytes(self.data), dtype=EVENT_DTYPE)
+
+
+class _FileLog:
+    """Append-only event log on disk"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "a+b")
+        # A crash mid-append can leave a partial trailing record; drop it so the next
+        # append starts on a record boundary and seq * itemsize stays a valid offset
+        size = os.path.getsize(path)
+        usable = size // EVENT_DTYPE.itemsize * EVENT_DTYPE.itemsize
+        if usable != size:
+            logger.warning(f"Truncating {size - usable} bytes of a partial record from ledger {path}")
+            self.file.truncate(usable)
+
+    def append(self, record: bytes) -> None:
+        self.file.write(record)
+        self.file.flush()
+
+    def read(self, seq: int) -> np.void:
+        self.file.seek(seq * EVENT_DTYPE.itemsize)
+        return np.frombuffer(self.file.read(EVENT_DTYPE.itemsize), dtype=EVENT_DTYPE)[0]
+
+    def read_all(self) -> np.ndarray:
+        self.file.flush()
+        usable = os.path.getsize(self.path) // EVENT_DTYPE.itemsize
+        return np.fromfile(self.path, dtype=EVENT_DTYPE, count=usable)
+
+
+class LedgerService:
+    """Append-only ledger of position events with per-user snapshots"""
+
+    def __init__(self, path: Optional[str] = None, snapshot_every: int = SNAPSHOT_EVERY):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self._log = _FileLog(path) if path else _MemoryLog()
+        self._snapshot_file = open(f"{path}.snap", "a+", encoding="utf-8") if path else None
+
+        self.next_seq = 0
+        self._last_ts = 0.0
+        self._user_events: Dict[str, array] = {}
+        self._snapshots: Dict[str, List[Tuple[int, float, Positions]]] = {}
+        self.positions: Dict[str, Positions] = {}
+
+        if path:
+            self._load()
+
+    def record(self, user_id: str, symbol: str, side: int, shares: float, price: float, ts: Optional[float] = None) -> int:
+        """Append a buy/sell event and apply it to the user's current positions"""
+        return self.record_many(user_id, [(symbol, side, shares, price)], ts)[0]
+
+    def record_many(self, user_id: str, trades: List[Trade], ts: Optional[float] = None) -> List[int]:
+        """Append a user's (symbol, side, shares, price) events in one write; all are validated first"""
+        return self.append(user_id, self.encode(user_id, trades), ts)
+
+    def encode(self, user_id: str, trades: List[Trade]) -> np.ndarray:
+        """Validate and encode events without writing them, so callers can fail before their own writes"""
+        user_bytes = user_id.encode()
+        rows = []
+        for symbol, side, shares, price in trades:
+            if side not in SIDES:
+                raise ValueError(f"Unknown ledger side {side}")
+            symbol_bytes = symbol.upper().encode()
+            if len(user_bytes) > EVENT_DTYPE["user"].itemsize or len(symbol_bytes) > EVENT_DTYPE["symbol"].itemsize:
+                raise ValueError(f"User id or symbol too long for ledger: {user_id}/{symbol}")
+            rows.append((0.0, user_bytes, symbol_bytes, side, shares, price))
+        return np.array(rows, dtype=EVENT_DTYPE)
+
+    def append(self, user_id: str, records: np.ndarray, ts: Optional[float] = None) -> List[int]:
+        """Timestamp and append records from encode() in one write"""
+        if not len(records):
+            return []
+
+        # Keep the log time-ordered so point-in-time reads can stop at the first later event
+        ts = max(time.time() if ts is None else ts, self._last_ts)
+        records["ts"] = ts
+        self._log.append(records.tobytes())
+
+        first = self.next_seq
+        self.next_seq += len(records)
+        self._last_ts = ts
+        user_events = self._user_events.setdefault(user_id, array("Q"))
+        positions = self.positions.setdefault(user_id, {})
+        for seq, record in enumerate(records, start=first):
+            user_events.append(seq)
+            self._apply(positions, record)
+            if len(user_events) % self.snapshot_every == 0:
+                self._snapshot(user_id, seq, ts)
+        return list(range(first, self.next_seq))
+
+    def get_events(self, user_id: str, limit: int = 50) -> List[Dict]:
+        """Most recent events for a user, newest first"""
+        seqs = self._user_events.get(user_id, array("Q"))
+        return [self._event_dict(seq, self._log.read(seq)) for seq in reversed(seqs[-limit:])]
+
+    def positions_at(self, user_id: str, ts: float) -> Positions:
+        """Reconstruct a user's positions at a point in time from the nearest snapshot"""
+        snapshots = self._snapshots.get(user_id, [])
+        i = bisect.bisect_right([snap[1] for snap in snapshots], ts)
+        if i:
+            start_seq, _, state = snapshots[i - 1]
+            positions = {symbol: list(position) for symbol, position in state.items()}
+        else:
+            start_seq, positions = -1, {}
+
+        seqs = self._user_events.get(user_id, array("Q"))
+        for k in range(bisect.bisect_right(seqs, start_seq), len(seqs)):
+            event = self._log.read(seqs[k])
+            if event["ts"] > ts:
+                break
+            self._apply(positions, event)
+        return positions
+
+    def _apply(self, positions: Positions, event: np.void) -> None:
+        symbol = event["symbol"].decode()
+        shares, price = float(event["shares"]), float(event["price"])
+        held, avg_cost = positions.get(symbol, (0.0, 0.0))
+
+        if event["side"] == BUY:
+            total = held + shares
+            positions[symbol] = [total, (held * avg_cost + shares * price) / total if total else 0.0]
+        elif shares >= held:
+            positions.pop(symbol, None)
+        else:
+            positions[symbol] = [held - shares, avg_cost]
+
+    def _snapshot(self, user_id: str, seq: int, ts: float) -> None:
+        state = {symbol: list(position) for symbol, position in self.positions[user_id].items()}
+        self._snapshots.setdefault(user_id, []).append((seq, ts, state))
+        if self._snapshot_file:
+            self._snapshot_file.write(json.dumps({"user_id": user_id, "seq": seq, "ts": ts, "positions": state}) + "\n")
+            self._snapshot_file.flush()
+
+    def _load(self) -> None:
+        """Rebuild indexes from disk: latest snapshot per user plus a replay of the tail"""
+        self._snapshot_file.seek(0)
+        for line in self._snapshot_file:
+            if line.strip():
+                snap = json.loads(line)
+                self._snapshots.setdefault(snap["user_id"], []).append((snap["seq"], snap["ts"], snap["positions"]))
+
+        events = self._log.read_all()
+        self.next_seq = len(events)
+        if not len(events):
+            return
+        self._last_ts = float(events["ts"][-1])
+
+        # Group event sequence numbers per user without a Python pass over every record
+        users, inverse = np.unique(events["user"], return_inverse=True)
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.searchsorted(inverse[order], np.arange(len(users) + 1))
+
+        for i, user in enumerate(users):
+            user_id = user.decode()
+            seqs = order[bounds[i]:bounds[i + 1]]
+            self._user_events[user_id] = array("Q", seqs.tolist())
+
+            snapshots = self._snapshots.get(user_id)
+            start_seq, state = (snapshots[-1][0], snapshots[-1][2]) if snapshots else (-1, {})
+            positions = {symbol: list(position) for symbol, position in state.items()}
+            for seq in seqs[seqs > start_seq]:
+                self._apply(positions, events[seq])
+            self.positions[user_id] = positions
+
+        logger.info(f"Loaded ledger: {len(events)} events for {len(users)} users")
+
+    def _event_dict(self, seq: int, event: np.void) -> Dict:
+        return {
+            "seq": seq,
+            "ts": float(event["ts"]),
+            "symbol": event["symbol"].decode(),
+            "side": SIDES[int(event["side"])],
+            "shares": float(event["shares"]),
+            "price": float(event["price"])
+        }
@@ -0,0 +1,163 @@
+import asyncio
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+import logging
+
+from ..models import OptimizationJob, OptimizationRequest, JobStatus, RiskTolerance
+from .portfolio_service import PortfolioService
+
+logger = logging.getLogger(__name__)
+
+MAX_JOBS_PER_USER = 2
+RESULT_CACHE_SIZE = 1024
+JOB_RETENTION = timedelta(hours=1)
+
+
+class TooManyJobsError(Exception):
+    """Raised when a user already has the maximum number of pending jobs"""
+
+
+class OptimizationJobService:
+    """Runs portfolio optimizations as jobs on a process pool, caching results"""
+
+    def __init__(
+        self,
+        portfolio_service: PortfolioService,
+        max_workers: Optional[int] = None,
+        max_jobs_per_user: int = MAX_JOBS_PER_USER,
+        executor: Optional[Executor] = None
+    ):
+        self.portfolio_service = portfolio_service
+        self.max_workers = max_workers
+        self.max_jobs_per_user = max_jobs_per_user
+        self._executor = executor
+
+        self.jobs: Dict[str, OptimizationJob] = {}
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._inflight: Dict[Tuple, str] = {}
+        self._cache: "OrderedDict[Tuple, Dict]" = OrderedDict()
+
+    @property
+    def executor(self) -> Executor:
+        # Created lazily so importing the app never forks worker processes
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def shutdown(self) -> None:
+        """Stop the worker pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _cache_key(self, user_id: str, request: OptimizationRequest) -> Tuple:
+        """Key results by normalized request, catalog version and holdings version"""
+        normalized = (
+            round(request.investment_amount, 2),
+            (request.risk_tolerance or RiskTolerance.MODERATE).value,
+            tuple(sorted(set(request.preferred_sectors or ())))
+        )
+        return (
+            user_id,
+            normalized,
+            self.portfolio_service.stock_service.catalog_version,
+            self.portfolio_service.get_holdings_version(user_id)
+        )
+
+    async def submit(self, user_id: str, request: OptimizationRequest) -> OptimizationJob:
+        """Submit an optimization job, answering from cache or an identical in-flight job"""
+        self._prune()
+        key = self._cache_key(user_id, request)
+        now = datetime.utcnow()
+
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            job = OptimizationJob(
+                id=str(uuid.uuid4()),
+                user_id=user_id,
+                status=JobStatus.COMPLETED,
+                cached=True,
+                created_at=now,
+                completed_at=now,
+                result=cached
+            )
+            self.jobs[job.id] = job
+            return job
+
+        inflight_id = self._inflight.get(key)
+        if inflight_id is not None:
+            return self.jobs[inflight_id]
+
+        pending = sum(
+            1 for job in self.jobs.values()
+            if job.user_id == user_id and job.status == JobStatus.PENDING
+        )
+        if pending >= self.max_jobs_per_user:
+            raise TooManyJobsError(f"At most {self.max_jobs_per_user} optimizations can run at once")
+
+        job = OptimizationJob(
+            id=str(uuid.uuid4()),
+            user_id=user_id,
+            status=JobStatus.PENDING,
+            created_at=now
+        )
+        self.jobs[job.id] = job
+        self._inflight[key] = job.id
+
+        args = self.portfolio_service.prepare_optimization(user_id, request)
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, PortfolioService.compute_optimization, *args)
+        future.add_done_callback(lambda f: self._complete(job, key, f))
+        self._futures[job.id] = future
+
+        logger.info(f"Submitted optimization job {job.id} for user {user_id}")
+        return job
+
+    def _complete(self, job: OptimizationJob, key: Tuple, future: asyncio.Future) -> None:
+        """Record the outcome of a finished job and cache successful results"""
+        self._inflight.pop(key, None)
+        self._futures.pop(job.id, None)
+        job.completed_at = datetime.utcnow()
+
+        if future.cancelled():
+            job.status = JobStatus.FAILED
+            job.error = "Job cancelled"
+        elif future.exception() is not None:
+            job.status = JobStatus.FAILED
+            job.error = str(future.exception())
+            logger.error(f"Optimization job {job.id} failed: {job.error}")
+        else:
+            job.status = JobStatus.COMPLETED
+            job.result = future.result()
+            self._cache[key] = job.result
+            while len(self._cache) > RESULT_CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def get_job(self, user_id: str, job_id: str) -> Optional[OptimizationJob]:
+        """Get a job, only if it belongs to the user"""
+        job = self.jobs.get(job_id)
+        if not job or job.user_id != user_id:
+            return None
+        return job
+
+    async def wait(self, job_id: str, timeout: Optional[float] = None) -> OptimizationJob:
+        """Wait for a job to finish without blocking the event loop"""
+        future = self._futures.get(job_id)
+        if future is not None:
+            # asyncio.wait never cancels the shared job on timeout or disconnect
+            await asyncio.wait({future}, timeout=timeout)
+        return self.jobs[job_id]
+
+    def _prune(self) -> None:
+        """Drop finished jobs past the retention window"""
+        cutoff = datetime.utcnow() - JOB_RETENTION
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.status != JobStatus.PENDING and job.completed_at and job.completed_at < cutoff
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
@@ -1,31 +1,112 @@
+import time
 import uuid
-from datetime import datetime
-from typing import List, Dict, Optional
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Set, Tuple
 import logging
 import random
 
+import numpy as np
+
 from ..models import (
     Portfolio, PortfolioHolding, OptimizationRequest, 
-    QueuedStock, RiskTolerance
+    QueuedStock, RiskTolerance, Stock
 )
 from .stock_service import StockService
+from .risk_service import RiskService
+from .history_service import PortfolioHistoryService
+from .ledger_service import LedgerService, BUY, SELL
+from .exposure_service import ExposureIndex
+from .state_backend import InMemoryStateBackend, StateBackend, StateMap
 
 logger = logging.getLogger(__name__)
 
+# Minimum gap between price-driven history samples for one user; trades always sample
+HISTORY_SAMPLE_SECONDS = 60
+
 class PortfolioService:
     """Service for managing user portfolios and optimization"""
     
-    def __init__(self):
-        self.portfolios: Dict[str, Portfolio] = {}
-        self.stock_service = StockService()
+    def __init__(self, stock_service: Optional[StockService] = None, ledger_service: Optional[LedgerService] = None,
+                 state_backend: Optional[StateBackend] = None):
+        # Written back only when holdings change, so the stored revision is the holdings version
+        self.portfolios: StateMap = StateMap(state_backend or InMemoryStateBackend(), "portfolios", Portfolio)
+        # user_id -> ((holdings_version, catalog_version), analytics)
+        self._analytics_cache: Dict[str, Tuple[Tuple[int, int], Dict]] = {}
+        self.stock_service = stock_service or StockService()
+        self.risk_service = RiskService(self.stock_service)
+        self.history_service = PortfolioHistoryService()
+        # symbol -> users holding it, and user -> symbols held, as of their last history sample
+        self._history_holders: Dict[str, Set[str]] = defaultdict(set)
+        self._held: Dict[str, Set[str]] = {}
+        self.ledger_service = ledger_service or LedgerService()
+        self.exposure_index = ExposureIndex(self.stock_service)
+        self._restore_from_ledger()
+        self.rebuild_exposure()
+        self.stock_service.subscribe_prices(self._on_price_change)
+    
+    def rebuild_exposure(self) -> None:
+        """Recompute the exposure index from the stored portfolios, including other workers' trades"""
+        self.exposure_index.rebuild(self.portfolios.values())
     
     def get_portfolio(self, user_id: str) -> Optional[Portfolio]:
         """Get user's portfolio"""
         return self.portfolios.get(user_id)
     
+    def _restore_from_ledger(self) -> None:
+        """Rebuild portfolios from ledger positions (after a restart)"""
+        snapshot = self.stock_service.get_catalog_snapshot()
+        restored = {}
+        for user_id, positions in self.ledger_service.positions.items():
+            if not positions:
+                continue
+            portfolio = restored[user_id] = Portfolio(
+                user_id=user_id, holdings=[], total_value=0.0, last_updated=datetime.utcnow()
+            )
+            for symbol, (shares, avg_cost) in positions.items():
+                row = snapshot.index.get(symbol)
+                price = float(snapshot.price[row]) if row is not None else avg_cost
+                portfolio.holdings.append(PortfolioHolding(
+                    symbol=symbol,
+                    shares=shares,
+                    avgCost=avg_cost,
+                    currentPrice=price,
+                    totalValue=shares * price,
+                    gainLoss=(price - avg_cost) * shares,
+                    gainLossPercent=((price - avg_cost) / avg_cost) * 100 if avg_cost else 0.0
+                ))
+            self._update_portfolio_totals(portfolio)
+            self._record_history(portfolio)
+        self.portfolios.put_many(restored)
+    
+    def get_transactions(self, user_id: str, limit: int = 50) -> List[Dict]:
+        """Get the user's most recent buys and sells from the ledger"""
+        return self.ledger_service.get_events(user_id, limit)
+    
+    def get_positions_at(self, user_id: str, at: datetime) -> List[Dict]:
+        """Reconstruct the user's positions at a point in time"""
+        if at.tzinfo is None:
+            at = at.replace(tzinfo=timezone.utc)
+        positions = self.ledger_service.positions_at(user_id, at.timestamp())
+        return [
+            {"symbol": symbol, "shares": shares, "avgCost": round(avg_cost, 4)}
+            for symbol, (shares, avg_cost) in positions.items()
+        ]
+    
+    def get_holdings_version(self, user_id: str) -> int:
+        """Get counter that changes whenever the user's positions change"""
+        return self.portfolios.revision(user_id)
+    
     def create_portfolio(self, user_id: str) -> Portfolio:
         """Create empty portfolio for user"""
-        portfolio = Portfolio(
+        portfolio = self._new_portfolio(user_id)
+        self.portfolios[user_id] = portfolio
+        logger.info(f"Created portfolio for user {user_id}")
+        return portfolio
+    
+    @staticmethod
+    def _new_portfolio(user_id: str) -> Portfolio:
+        return Portfolio(
             user_id=user_id,
             holdings=[],
             total_value=0.0,
@@ -33,10 +114,6 @@ class PortfolioService:
             total_gain_loss_percent=0.0,
             last_updated=datetime.utcnow()
         )
-        
-        self.portfolios[user_id] = portfolio
-        logger.info(f"Created portfolio for user {user_id}")
-        return portfolio
     
     def add_holding(self, user_id: str, symbol: str, shares: float, purchase_price: float) -> PortfolioHolding:
         """Add holding to portfolio"""
@@ -44,36 +121,44 @@ class PortfolioService:
             stock = self.stock_service.get_stock(symbol)
             if not stock:
                 raise ValueError(f"Stock {symbol} not found")
-            
-            portfolio = self.get_portfolio(user_id)
-            if not portfolio:
-                portfolio = self.create_portfolio(user_id)
-            
-            # Check if holding already exists
-            existing_holding = next((h for h in portfolio.holdings if h.symbol == symbol), None)
-            
-            if existing_holding:
-                # Update existing holding (average cost)
-                total_cost = (existing_holding.shares * existing_holding.avgCost) + (shares * purchase_price)
-                total_shares = existing_holding.shares + shares
-                existing_holding.shares = total_shares
-                existing_holding.avgCost = total_cost / total_shares
-                holding = existing_holding
-            else:
-                # Create new holding
-                holding = PortfolioHolding(
-                    symbol=symbol,
-                    shares=shares,
-                    avgCost=purchase_price,
-                    currentPrice=stock.price,
-                    totalValue=shares * stock.price,
-                    gainLoss=(stock.price - purchase_price) * shares,
-                    gainLossPercent=((stock.price - purchase_price) / purchase_price) * 100
-                )
-                portfolio.holdings.append(holding)
-            
-            # Update portfolio totals
-            self._update_portfolio_totals(portfolio)
+            # Encode the ledger row first so nothing left after the holdings write can be rejected
+            records = self.ledger_service.encode(user_id, [(symbol, BUY, shares, purchase_price)])
+            
+            def buy(portfolio: Optional[Portfolio]) -> Portfolio:
+                portfolio = portfolio or self._new_portfolio(user_id)
+                
+                # Check if holding already exists
+                existing_holding = next((h for h in portfolio.holdings if h.symbol == symbol), None)
+                
+                if existing_holding:
+                    # Update existing holding (average cost)
+                    total_cost = (existing_holding.shares * existing_holding.avgCost) + (shares * purchase_price)
+                    total_shares = existing_holding.shares + shares
+                    existing_holding.shares = total_shares
+                    existing_holding.avgCost = total_cost / total_shares
+                else:
+                    # Create new holding
+                    portfolio.holdings.append(PortfolioHolding(
+                        symbol=symbol,
+                        shares=shares,
+                        avgCost=purchase_price,
+                        currentPrice=stock.price,
+                        totalValue=shares * stock.price,
+                        gainLoss=(stock.price - purchase_price) * shares,
+                        gainLossPercent=((stock.price - purchase_price) / purchase_price) * 100
+                    ))
+                
+                # Update portfolio totals
+                self._update_portfolio_totals(portfolio)
+                return portfolio
+            
+            portfolio = self.portfolios.update(user_id, buy)
+            holding = next(h for h in portfolio.holdings if h.symbol == symbol)
+            
+            # Side effects only once the conditional write has landed
+            self.ledger_service.append(user_id, records)
+            self.exposure_index.apply_trade(symbol, shares)
+            self._record_history(portfolio)
             
             logger.info(f"Added holding {symbol} to portfolio for user {user_id}")
             return holding
@@ -85,25 +170,38 @@ class PortfolioService:
     def remove_holding(self, user_id: str, symbol: str, shares: Optional[float] = None) -> bool:
         """Remove holding from portfolio (partial or full)"""
         try:
-            portfolio = self.get_portfolio(user_id)
-            if not portfolio:
-                return False
-            
-            holding = next((h for h in portfolio.holdings if h.symbol == symbol), None)
-            if not holding:
+            stock = self.stock_service.get_stock(symbol)
+            sale: Dict[str, float] = {}
+            # Encoded up front like add_holding; shares and price are filled in once the sale is known
+            records = self.ledger_service.encode(user_id, [(symbol, SELL, 0.0, 0.0)])
+            
+            def sell(portfolio: Optional[Portfolio]) -> Optional[Portfolio]:
+                holding = next((h for h in portfolio.holdings if h.symbol == symbol), None) if portfolio else None
+                if not holding:
+                    return None
+                
+                sale["price"] = stock.price if stock else holding.currentPrice
+                sale["shares"] = holding.shares if shares is None else min(shares, holding.shares)
+                if shares is None or shares >= holding.shares:
+                    # Remove entire holding
+                    portfolio.holdings = [h for h in portfolio.holdings if h.symbol != symbol]
+                else:
+                    # Partial sale
+                    holding.shares -= shares
+                
+                # Update portfolio totals
+                self._update_portfolio_totals(portfolio)
+                return portfolio
+            
+            portfolio = self.portfolios.update(user_id, sell)
+            if portfolio is None:
                 return False
             
-            if shares is None or shares >= holding.shares:
-                # Remove entire holding
-                portfolio.holdings = [h for h in portfolio.holdings if h.symbol != symbol]
-                logger.info(f"Removed all {symbol} shares for user {user_id}")
-            else:
-                # Partial sale
-                holding.shares -= shares
-                logger.info(f"Removed {shares} {symbol} shares for user {user_id}")
-            
-            # Update portfolio totals
-            self._update_portfolio_totals(portfolio)
+            records["shares"], records["price"] = sale["shares"], sale["price"]
+            self.ledger_service.append(user_id, records)
+            self.exposure_index.apply_trade(symbol, -sale["shares"])
+            self._record_history(portfolio)
+            logger.info(f"Removed {sale['shares']} {symbol} shares for user {user_id}")
             return True
             
         except Exception as e:
@@ -126,6 +224,7 @@ class PortfolioService:
                     holding.gainLossPercent = ((stock.price - holding.avgCost) / holding.avgCost) * 100
             
             self._update_portfolio_totals(portfolio)
+            self._record_history(portfolio)
             portfolio.last_updated = datetime.utcnow()
             
             logger.info(f"Updated portfolio prices for user {user_id}")
@@ -137,56 +236,93 @@ class PortfolioService:
     
     def _update_portfolio_totals(self, portfolio: Portfolio) -> None:
         """Update portfolio total values"""
-        if not portfolio.holdings:
-            portfolio.total_value = 0.0
-            portfolio.total_gain_loss = 0.0
-            portfolio.total_gain_loss_percent = 0.0
-            return
-        
+        total_cost = sum(h.shares * h.avgCost for h in portfolio.holdings)
         portfolio.total_value = sum(h.totalValue for h in portfolio.holdings)
         portfolio.total_gain_loss = sum(h.gainLoss for h in portfolio.holdings)
         
-        total_cost = sum(h.shares * h.avgCost for h in portfolio.holdings)
         if total_cost > 0:
             portfolio.total_gain_loss_percent = (portfolio.total_gain_loss / total_cost) * 100
         else:
             portfolio.total_gain_loss_percent = 0.0
     
+    def _record_history(self, portfolio: Portfolio) -> None:
+        """Sample the portfolio's current value and cost basis into its history"""
+        total_cost = sum(h.shares * h.avgCost for h in portfolio.holdings)
+        self.history_service.record(portfolio.user_id, portfolio.total_value, total_cost)
+        
+        held = {h.symbol for h in portfolio.holdings}
+        previous = self._held.get(portfolio.user_id, set())
+        for symbol in previous - held:
+            self._history_holders[symbol].discard(portfolio.user_id)
+        for symbol in held - previous:
+            self._history_holders[symbol].add(portfolio.user_id)
+        self._held[portfolio.user_id] = held
+    
+    def _on_price_change(self, stock: Stock, old_price: float) -> None:
+        # Value moves with the market between trades, so holders of the symbol are
+        # resampled at current prices, at most once per HISTORY_SAMPLE_SECONDS each
+        now = time.time()
+        for user_id in list(self._history_holders.get(stock.symbol, ())):
+            if now - (self.history_service.last_sampled(user_id) or 0.0) < HISTORY_SAMPLE_SECONDS:
+                continue
+            portfolio = self.get_portfolio(user_id)
+            if not portfolio:
+                continue
+            total_value = total_cost = 0.0
+            for holding in portfolio.holdings:
+                current = self.stock_service.get_stock(holding.symbol)
+                total_value += holding.shares * (current.price if current else holding.currentPrice)
+                total_cost += holding.shares * holding.avgCost
+            self.history_service.record(user_id, total_value, total_cost, now)
+    
+    def get_value_history(self, user_id: str, chart_range: str = "1M") -> List[Dict]:
+        """Get downsampled portfolio value history for a chart range"""
+        return self.history_service.get_history(user_id, chart_range)
+    
     def optimize_portfolio(self, user_id: str, request: OptimizationRequest) -> Dict:
         """Optimize portfolio allocation based on AI recommendations"""
         try:
-            portfolio = self.get_portfolio(user_id)
-            if not portfolio:
-                portfolio = self.create_portfolio(user_id)
-            
-            # Get available stocks
-            all_stocks = self.stock_service.get_all_stocks()
-            
-            # Filter by preferred sectors if provided
-            if request.preferred_sectors:
-                available_stocks = [s for s in all_stocks if s.sector in request.preferred_sectors]
-            else:
-                available_stocks = all_stocks
-            
-            # Risk-based allocation
-            risk_allocation = self._get_risk_allocation(request.risk_tolerance or RiskTolerance.MODERATE)
-            
-            # Generate optimized allocation
-            optimization_result = self._generate_optimization(
-                available_stocks,
-                request.investment_amount,
-                risk_allocation,
-                portfolio
-            )
+            result = self.compute_optimization(*self.prepare_optimization(user_id, request))
             
             logger.info(f"Generated portfolio optimization for user {user_id}")
-            return optimization_result
+            return result
             
         except Exception as e:
             logger.error(f"Error optimizing portfolio: {str(e)}")
             raise
     
-    def _get_risk_allocation(self, risk_tolerance: RiskTolerance) -> Dict[str, float]:
+    def prepare_optimization(self, user_id: str, request: OptimizationRequest) -> Tuple[List[Stock], OptimizationRequest, Portfolio]:
+        """Snapshot the inputs of an optimization so it can run outside the request"""
+        portfolio = self.get_portfolio(user_id)
+        if not portfolio:
+            portfolio = self.create_portfolio(user_id)
+        
+        # Copies, so a worker process never sees a half-applied update
+        stocks = [s.model_copy() for s in self.stock_service.get_all_stocks()]
+        return stocks, request, portfolio.model_copy(deep=True)
+    
+    @staticmethod
+    def compute_optimization(stocks: List[Stock], request: OptimizationRequest, portfolio: Portfolio) -> Dict:
+        """Pure optimization step; safe to run in a worker process"""
+        # Filter by preferred sectors if provided
+        if request.preferred_sectors:
+            available_stocks = [s for s in stocks if s.sector in request.preferred_sectors]
+        else:
+            available_stocks = stocks
+        
+        # Risk-based allocation
+        risk_allocation = PortfolioService._get_risk_allocation(request.risk_tolerance or RiskTolerance.MODERATE)
+        
+        # Generate optimized allocation
+        return PortfolioService._generate_optimization(
+            available_stocks,
+            request.investment_amount,
+            risk_allocation,
+            portfolio
+        )
+    
+    @staticmethod
+    def _get_risk_allocation(risk_tolerance: RiskTolerance) -> Dict[str, float]:
         """Get asset allocation based on risk tolerance"""
         allocations = {
             RiskTolerance.CONSERVATIVE: {
@@ -208,7 +344,8 @@ class PortfolioService:
         
         return allocations.get(risk_tolerance, allocations[RiskTolerance.MODERATE])
     
-    def _generate_optimization(self, stocks: List, amount: float, allocation: Dict, current_portfolio: Portfolio) -> Dict:
+    @staticmethod
+    def _generate_optimization(stocks: List, amount: float, allocation: Dict, current_portfolio: Portfolio) -> Dict:
         """Generate optimized portfolio allocation"""
         stock_amount = amount * allocation["stocks"]
         
@@ -273,21 +410,13 @@ class PortfolioService:
     def execute_optimization(self, user_id: str, optimization: Dict) -> Portfolio:
         """Execute the optimized portfolio allocation"""
         try:
-            portfolio = self.get_portfolio(user_id)
-            if not portfolio:
-                portfolio = self.create_portfolio(user_id)
-            
-            # Add recommended holdings
-            for stock_rec in optimization["recommendedStocks"]:
-                self.add_holding(
-                    user_id,
-                    stock_rec["symbol"],
-                    stock_rec["recommendedShares"],
-                    stock_rec["currentPrice"]
-                )
-            
-            # Update portfolio
-            self.update_portfolio_prices(user_id)
+            portfolio = self.apply_positions(
+                user_id,
+                [
+                    (rec["symbol"], rec["recommendedShares"], rec["currentPrice"])
+                    for rec in optimization["recommendedStocks"]
+                ]
+            )
             
             logger.info(f"Executed portfolio optimization for user {user_id}")
             return portfolio
@@ -296,6 +425,75 @@ class PortfolioService:
             logger.error(f"Error executing optimization: {str(e)}")
             raise
     
+    def apply_positions(self, user_id: str, positions: List[Tuple[str, float, float]]) -> Portfolio:
+        """Apply (symbol, shares, purchase_price) buys all-or-nothing in a single pass"""
+        try:
+            snapshot = self.stock_service.get_catalog_snapshot()
+            
+            # Validate the whole batch before touching the portfolio
+            for symbol, shares, purchase_price in positions:
+                if symbol.upper() not in snapshot:
+                    raise ValueError(f"Stock {symbol} not found")
+                if shares <= 0 or purchase_price <= 0:
+                    raise ValueError(f"Invalid position for {symbol}: {shares} @ {purchase_price}")
+            
+            records = self.ledger_service.encode(
+                user_id, [(symbol, BUY, shares, purchase_price) for symbol, shares, purchase_price in positions]
+            )
+            
+            def buy(portfolio: Optional[Portfolio]) -> Portfolio:
+                portfolio = portfolio or Portfolio(user_id=user_id, holdings=[], total_value=0.0)
+                
+                # Work on copies so a failure never leaves a half-applied portfolio
+                holdings = {h.symbol: h.model_copy() for h in portfolio.holdings}
+                for symbol, shares, purchase_price in positions:
+                    symbol = symbol.upper()
+                    holding = holdings.get(symbol)
+                    if holding:
+                        total_shares = holding.shares + shares
+                        holding.avgCost = ((holding.shares * holding.avgCost) + (shares * purchase_price)) / total_shares
+                        holding.shares = total_shares
+                    else:
+                        holdings[symbol] = PortfolioHolding(
+                            symbol=symbol,
+                            shares=shares,
+                            avgCost=purchase_price,
+                            currentPrice=0.0,
+                            totalValue=0.0,
+                            gainLoss=0.0,
+                            gainLossPercent=0.0
+                        )
+                
+                for holding in holdings.values():
+                    row = snapshot.index.get(holding.symbol)
+                    if row is None:
+                        continue
+                    price = float(snapshot.price[row])
+                    holding.currentPrice = price
+                    holding.totalValue = holding.shares * price
+                    holding.gainLoss = (price - holding.avgCost) * holding.shares
+                    holding.gainLossPercent = ((price - holding.avgCost) / holding.avgCost) * 100
+                
+                portfolio.holdings = list(holdings.values())
+                self._update_portfolio_totals(portfolio)
+                portfolio.last_updated = datetime.utcnow()
+                return portfolio
+            
+            portfolio = self.portfolios.update(user_id, buy)
+            
+            # Commit the side effects once the conditional write has landed
+            self.ledger_service.append(user_id, records)
+            for symbol, shares, _ in positions:
+                self.exposure_index.apply_trade(symbol, shares)
+            self._record_history(portfolio)
+            
+            logger.info(f"Applied {len(positions)} positions for user {user_id}")
+            return portfolio
+            
+        except Exception as e:
+            logger.error(f"Error applying positions: {str(e)}")
+            raise
+    
     def get_portfolio_analytics(self, user_id: str) -> Dict:
         """Get portfolio analytics and insights"""
         try:
@@ -310,49 +508,51 @@ class PortfolioService:
                     "dividendYield": 0
                 }
             
-            # Calculate sector allocation
+            # catalog_version also moves on sector/risk changes, which regroup the allocation
+            cache_key = (self.get_holdings_version(user_id), self.stock_service.catalog_version)
+            cached = self._analytics_cache.get(user_id)
+            if cached and cached[0] == cache_key:
+                return cached[1]
+            
+            # One fused pass: holdings as arrays joined to the catalog columns
+            snapshot = self.stock_service.get_catalog_snapshot()
+            rows = snapshot.lookup(h.symbol for h in portfolio.holdings)
+            known = rows >= 0
+            rows = rows[known]
+            shares = np.array([h.shares for h in portfolio.holdings])[known]
+            cost_basis = np.array([h.shares * h.avgCost for h in portfolio.holdings])[known]
+            
+            values = shares * snapshot.price[rows]
+            total_value = float(values.sum())
+            total_cost = float(cost_basis.sum())
+            total_return = total_value - total_cost
+            day_change = float((shares * snapshot.change[rows]).sum())
+            
+            sector_values = np.bincount(snapshot.sector_id[rows], weights=values, minlength=len(snapshot.sectors))
             sector_allocation = {}
-            for holding in portfolio.holdings:
-                stock = self.stock_service.get_stock(holding.symbol)
-                if stock:
-                    sector = stock.sector
-                    if sector not in sector_allocation:
-                        sector_allocation[sector] = 0
-                    sector_allocation[sector] += holding.totalValue
-            
-            # Convert to percentages
-            total_value = portfolio.total_value
+            dividend_yield = 0.0
             if total_value > 0:
                 sector_allocation = {
-                    sector: round((value / total_value) * 100, 1)
-                    for sector, value in sector_allocation.items()
+                    snapshot.sectors[i]: round(float(sector_values[i]) / total_value * 100, 1)
+                    for i in np.flatnonzero(sector_values)
                 }
+                dividend_yield = float(values @ snapshot.dividend_yield[rows]) / total_value
             
-            # Calculate day change
-            day_change = sum(
-                (stock.change * holding.shares) 
-                for holding in portfolio.holdings
-                if (stock := self.stock_service.get_stock(holding.symbol))
-            )
-            
-            # Calculate dividend yield
-            dividend_yield = 0
-            for holding in portfolio.holdings:
-                stock = self.stock_service.get_stock(holding.symbol)
-                if stock and stock.dividendYield:
-                    weight = holding.totalValue / total_value if total_value > 0 else 0
-                    dividend_yield += stock.dividendYield * weight
+            risk = self.risk_service.analyze_portfolio(portfolio)
             
-            return {
-                "totalValue": round(portfolio.total_value, 2),
+            analytics = {
+                "totalValue": round(total_value, 2),
                 "dayChange": round(day_change, 2),
-                "totalReturn": round(portfolio.total_gain_loss, 2),
-                "totalReturnPercent": round(portfolio.total_gain_loss_percent, 2),
+                "totalReturn": round(total_return, 2),
+                "totalReturnPercent": round(total_return / total_cost * 100, 2) if total_cost > 0 else 0.0,
                 "sectorAllocation": sector_allocation,
-                "riskScore": round(random.uniform(3, 7), 1),  # Mock risk score
+                "riskScore": risk["riskScore"],
+                "risk": risk,
                 "dividendYield": round(dividend_yield, 2),
                 "holdingsCount": len(portfolio.holdings)
             }
+            self._analytics_cache[user_id] = (cache_key, analytics)
+            return analytics
             
         except Exception as e:
             logger.error(f"Error getting portfolio analytics: {str(e)}")
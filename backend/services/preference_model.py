@@ -0,0 +1,145 @@
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from ..models import BehaviorData, SwipeAction, SwipeEvent, to_naive_utc
+from .catalog import RISK_INDEX, RISK_LEVELS
+
+# Swipe weights decay exponentially with this half-life, so recent taste dominates
+HALF_LIFE_DAYS = 30.0
+# Reads floor the elapsed time to this step: between swipes a user's decayed vector
+# only changes once an hour, which keeps derived views (e.g. ranked queues) stable
+READ_STEP_SECONDS = 3_600
+
+SWIPE_WEIGHTS = {
+    SwipeAction.SKIP: -1.0,
+    SwipeAction.WATCHLIST: 2.0,
+    SwipeAction.QUEUE: 3.0,
+}
+
+# Risk level scale used to average risk preferences (Low=1 .. High=3)
+RISK_SCALE = np.array([1.0, 2.0, 3.0])
+
+# Sectors kept in the stored ranking
+TOP_SECTORS = 3
+# Days of activity kept in the bitmap; streaks longer than this are capped
+ACTIVITY_DAYS = 365
+ACTIVITY_MASK = (1 << ACTIVITY_DAYS) - 1
+
+
+def decay_factor(elapsed_seconds: float) -> float:
+    return 0.5 ** (max(elapsed_seconds, 0.0) / (HALF_LIFE_DAYS * 86_400))
+
+
+def apply_swipes(behavior: BehaviorData, swipes: Iterable[SwipeEvent], now: datetime) -> None:
+    """Decay the stored vectors to `now`, then add each swipe's weight decayed by its own age.
+
+    Decay is multiplicative, so folding in a swipe late (offline batches, queued
+    ingestion) gives the same vector as folding it in when it happened.
+    """
+    sector_index = {sector: i for i, sector in enumerate(behavior.sector_ids)}
+    sector_weights: List[float] = list(behavior.sector_weights)
+    risk_weights = np.array(behavior.risk_weights, dtype=np.float64)
+
+    contributions: List[Tuple[int, int, float]] = []
+    for swipe in swipes:
+        if swipe.sector not in sector_index:
+            sector_index[swipe.sector] = len(behavior.sector_ids)
+            behavior.sector_ids.append(swipe.sector)
+            sector_weights.append(0.0)
+        age = (now - to_naive_utc(swipe.timestamp)).total_seconds() if swipe.timestamp else 0.0
+        weight = SWIPE_WEIGHTS.get(swipe.action, 0.0) * decay_factor(age)
+        contributions.append((sector_index[swipe.sector], RISK_INDEX[swipe.risk], weight))
+
+    factor = decay_factor((now - behavior.preferences_updated_at).total_seconds()) if behavior.preferences_updated_at else 1.0
+    sectors = np.array(sector_weights, dtype=np.float64) * factor
+    risk_weights *= factor
+    if contributions:
+        sector_rows, risk_rows, weights = (np.array(column) for column in zip(*contributions))
+        np.add.at(sectors, sector_rows, weights)
+        np.add.at(risk_weights, risk_rows, weights)
+
+    behavior.sector_weights = sectors.tolist()
+    behavior.risk_weights = risk_weights.tolist()
+    behavior.preferences_updated_at = now
+    rank_preferences(behavior, sectors, risk_weights)
+
+
+def rank_preferences(behavior: BehaviorData, sectors: np.ndarray, risks: np.ndarray) -> None:
+    """Store the top sectors and dominant risk level.
+
+    Decay multiplies every weight by the same factor, so the ranking only changes
+    when swipes are applied and reads can return the stored values as they are.
+    """
+    order = np.argsort(-sectors, kind="stable")[:TOP_SECTORS]
+    behavior.top_sector_ids = [behavior.sector_ids[i] for i in order]
+    behavior.dominant_risk = RISK_LEVELS[int(np.argmax(risks))] if risks.any() else None
+
+
+def decayed_vectors(behavior: BehaviorData, now: datetime) -> Tuple[np.ndarray, np.ndarray]:
+    """Sector and risk weight vectors as of `now`, decayed lazily at read time"""
+    sectors = np.array(behavior.sector_weights, dtype=np.float64)
+    risks = np.array(behavior.risk_weights, dtype=np.float64)
+    if behavior.preferences_updated_at is None:
+        return sectors, risks
+    elapsed = (now - behavior.preferences_updated_at).total_seconds()
+    factor = decay_factor(elapsed - elapsed % READ_STEP_SECONDS)
+    return sectors * factor, risks * factor
+
+
+def sector_preferences(behavior: BehaviorData, now: datetime) -> Dict[str, float]:
+    """Decayed sector weights keyed by sector name"""
+    sectors, _ = decayed_vectors(behavior, now)
+    return dict(zip(behavior.sector_ids, sectors.tolist()))
+
+
+def top_sectors(behavior: BehaviorData, k: int = TOP_SECTORS) -> List[str]:
+    """Sectors with the highest decayed weight"""
+    if k > TOP_SECTORS or len(behavior.top_sector_ids) < min(k, len(behavior.sector_ids)):
+        # Past the stored ranking, or a record from before rankings were stored
+        order = np.argsort(-np.array(behavior.sector_weights), kind="stable")[:k]
+        return [behavior.sector_ids[i] for i in order]
+    return behavior.top_sector_ids[:k]
+
+
+def risk_preference(behavior: BehaviorData) -> str:
+    """Risk level with the highest decayed weight (Medium before any swipes)"""
+    if behavior.dominant_risk is not None:
+        return behavior.dominant_risk.value
+    risks = np.array(behavior.risk_weights)
+    return RISK_LEVELS[int(np.argmax(risks))].value if risks.any() else "Medium"
+
+
+def average_risk(behavior: BehaviorData, now: datetime) -> float:
+    """Preference-weighted risk on the 1-3 scale, 2 when weights don't sum positive"""
+    _, risks = decayed_vectors(behavior, now)
+    total = risks.sum()
+    return float(risks @ RISK_SCALE / total) if total > 0 else 2.0
+
+
+def record_activity(behavior: BehaviorData, swipes: Sequence[SwipeEvent], today: date) -> None:
+    """Count the swipes and mark their days in the activity bitmap, then refresh the streak.
+
+    Late swipes (offline batches) mark past days and can close a gap; days ahead of
+    `today` (client clock skew) count as today.
+    """
+    behavior.swipe_count += len(swipes)
+    mask, anchor = behavior.activity_days, behavior.activity_day
+    for day in sorted({min(to_naive_utc(swipe.timestamp).date(), today) for swipe in swipes if swipe.timestamp}):
+        if anchor is None or day > anchor:
+            shift = (day - anchor).days if anchor else ACTIVITY_DAYS
+            mask = ((mask << shift) & ACTIVITY_MASK if shift < ACTIVITY_DAYS else 0) | 1
+            anchor = day
+        elif (anchor - day).days < ACTIVITY_DAYS:
+            mask |= 1 << (anchor - day).days
+    behavior.activity_days, behavior.activity_day = mask, anchor
+    # Trailing ones: consecutive active days ending on the anchor day
+    behavior.streak_days = (mask ^ (mask + 1)).bit_length() - 1
+
+
+def current_streak(behavior: BehaviorData, today: date) -> int:
+    """Consecutive active days ending today or yesterday; 0 once a full day is missed"""
+    if behavior.activity_day is None or (today - behavior.activity_day).days > 1:
+        return 0
+    return behavior.streak_days
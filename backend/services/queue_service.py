@@ -1,24 +1,153 @@
+import heapq
+import math
 import uuid
+from collections import Counter, OrderedDict, defaultdict
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Any, Callable, List, Dict, Optional, Set, Tuple
 import logging
 
-from ..models import QueuedStock, QueuedStockCreate
+import numpy as np
+
+from ..models import Confidence, QueuedStock, QueuedStockCreate, Stock
 from .stock_service import StockService
+from .state_backend import MAX_WRITE_ATTEMPTS, InMemoryStateBackend, StateBackend, StateConflictError, StateMap
 
 logger = logging.getLogger(__name__)
 
+CONFIDENCE_SCORE = {
+    Confidence.CONSERVATIVE: 1.0,
+    Confidence.BULLISH: 2.0,
+    Confidence.VERY_BULLISH: 3.0,
+}
+MOMENTUM_WEIGHT = 0.2      # per 1% day change
+PREFERENCE_WEIGHT = 1.0    # times tanh(sector preference / PREFERENCE_SCALE)
+PREFERENCE_SCALE = 10.0
+AGE_DECAY_PER_DAY = 0.1
+
+SectorPreferenceProvider = Callable[[str], Dict[str, float]]
+
+
+class _QueueStats:
+    """Per-user queue counters, updated on every queue mutation"""
+    
+    __slots__ = ("confidence", "sector", "risk", "symbols")
+    
+    def __init__(self):
+        self.confidence: Counter = Counter()
+        self.sector: Counter = Counter()
+        self.risk: Counter = Counter()
+        self.symbols: set = set()
+    
+    def add(self, item: QueuedStock, stock: Stock) -> None:
+        self.confidence[item.confidence.value] += 1
+        self.sector[stock.sector] += 1
+        self.risk[stock.risk.value] += 1
+        self.symbols.add(item.symbol)
+    
+    def remove(self, item: QueuedStock, stock: Optional[Stock]) -> None:
+        self._decrement(self.confidence, item.confidence.value)
+        if stock:
+            self._decrement(self.sector, stock.sector)
+            self._decrement(self.risk, stock.risk.value)
+        self.symbols.discard(item.symbol)
+    
+    def change_stock(self, old: Stock, new: Stock) -> None:
+        """Recount a queued stock whose sector or risk changed"""
+        self._decrement(self.sector, old.sector)
+        self._decrement(self.risk, old.risk.value)
+        self.sector[new.sector] += 1
+        self.risk[new.risk.value] += 1
+    
+    def change_confidence(self, old: Confidence, new: Confidence) -> None:
+        self._decrement(self.confidence, old.value)
+        self.confidence[new.value] += 1
+    
+    @staticmethod
+    def _decrement(counter: Counter, key: str) -> None:
+        counter[key] -= 1
+        if counter[key] <= 0:
+            del counter[key]
+
+class _RankedView:
+    """Max-heap of queued symbols by score, with lazy deletion of stale entries.
+
+    Age decays every item at the same linear rate, so it is folded into the key as
+    +AGE_DECAY_PER_DAY * addedAt (in days): relative order never changes with time
+    and keys only need updating when an item, its price or a preference changes.
+    """
+
+    __slots__ = ("heap", "keys", "preferences", "counter")
+
+    def __init__(self):
+        self.heap: List[Tuple[float, int, str]] = []
+        self.keys: Dict[str, Tuple[float, int]] = {}
+        self.preferences: Dict[str, float] = {}
+        self.counter = 0
+
+    def push(self, symbol: str, key: float) -> None:
+        self.counter += 1
+        self.keys[symbol] = (key, self.counter)
+        heapq.heappush(self.heap, (-key, self.counter, symbol))
+        if len(self.heap) > 2 * len(self.keys) + 32:
+            self.heap = [(-k, seq, sym) for sym, (k, seq) in self.keys.items()]
+            heapq.heapify(self.heap)
+
+    def discard(self, symbol: str) -> None:
+        self.keys.pop(symbol, None)
+
+    def top(self, limit: int) -> List[str]:
+        """Pop the best `limit` live entries and push them back: O(limit log n)"""
+        live = []
+        while self.heap and len(live) < limit:
+            entry = heapq.heappop(self.heap)
+            current = self.keys.get(entry[2])
+            if current and current[1] == entry[1]:
+                live.append(entry)
+        for entry in live:
+            heapq.heappush(self.heap, entry)
+        return [entry[2] for entry in live]
+
+
+class _EnrichedView:
+    """Cached enriched queue for one queue revision; price fields are patched in place"""
+
+    __slots__ = ("revision", "items", "by_symbol")
+
+    def __init__(self, revision: int):
+        self.revision = revision
+        self.items: List[Dict] = []
+        self.by_symbol: Dict[str, Dict] = {}
+
+
 class QueueService:
     """Service for managing user stock queues"""
     
-    def __init__(self):
-        # In production, this would be a database
-        self.queues: Dict[str, List[QueuedStock]] = {}
-        self.stock_service = StockService()
+    def __init__(self, stock_service: Optional[StockService] = None, state_backend: Optional[StateBackend] = None):
+        # Each queue is insertion-ordered and keyed by the canonical (uppercase) symbol.
+        # Stored as an item list: JSON objects would not keep move_to_end reorders
+        self.queues: StateMap = StateMap(
+            state_backend or InMemoryStateBackend(), "queues", List[QueuedStock],
+            to_state=lambda queue: list(queue.values()),
+            from_state=lambda items: OrderedDict((item.symbol, item) for item in items)
+        )
+        # Stats and ranked views are process-local, derived from the queue revision in _synced
+        self.stats: Dict[str, _QueueStats] = {}
+        self._synced: Dict[str, int] = {}
+        self.stock_service = stock_service or StockService()
+        # Score-ordered views, built on first request and maintained afterwards
+        self.ranked: Dict[str, _RankedView] = {}
+        self._ranked_holders: Dict[str, Set[str]] = defaultdict(set)
+        # Enriched projections, rebuilt when the queue revision moves
+        self.enriched: Dict[str, _EnrichedView] = {}
+        self._enriched_holders: Dict[str, Set[str]] = defaultdict(set)
+        self.sector_preferences: Optional[SectorPreferenceProvider] = None
+        self.stock_service.subscribe_prices(self._on_price_change)
+        self.stock_service.subscribe_fundamentals(self._on_fundamentals_change)
     
     def get_user_queue(self, user_id: str) -> List[QueuedStock]:
         """Get user's stock queue"""
-        return self.queues.get(user_id, [])
+        queue = self.queues.get(user_id)
+        return list(queue.values()) if queue else []
     
     def add_to_queue(self, user_id: str, queue_item: QueuedStockCreate) -> QueuedStock:
         """Add stock to user's queue"""
@@ -28,67 +157,286 @@ class QueueService:
             if not stock:
                 raise ValueError(f"Stock {queue_item.symbol} not found")
             
-            # Initialize queue if needed
-            if user_id not in self.queues:
-                self.queues[user_id] = []
-            
-            # Check if already in queue
-            existing = next((q for q in self.queues[user_id] if q.symbol == queue_item.symbol), None)
-            if existing:
-                # Update confidence level instead of adding duplicate
-                existing.confidence = queue_item.confidence
-                logger.info(f"Updated confidence for {queue_item.symbol} in queue for user {user_id}")
-                return existing
-            
-            # Create new queue item
-            queued_stock = QueuedStock(
-                id=str(uuid.uuid4()),
-                user_id=user_id,
-                addedAt=datetime.utcnow(),
-                **queue_item.dict()
-            )
-            
-            self.queues[user_id].append(queued_stock)
-            
-            logger.info(f"Added {queue_item.symbol} to queue for user {user_id}")
+            symbol = stock.symbol
+            
+            def add(queue: "OrderedDict[str, QueuedStock]") -> Tuple[QueuedStock, bool]:
+                # Check if already in queue
+                existing = queue.get(symbol)
+                if existing:
+                    # Update confidence level instead of adding duplicate
+                    self._stats(user_id).change_confidence(existing.confidence, queue_item.confidence)
+                    existing.confidence = queue_item.confidence
+                    return existing, False
+                
+                # Create new queue item
+                queued_stock = QueuedStock(
+                    id=str(uuid.uuid4()),
+                    user_id=user_id,
+                    addedAt=datetime.utcnow(),
+                    symbol=symbol,
+                    confidence=queue_item.confidence
+                )
+                queue[symbol] = queued_stock
+                self._stats(user_id).add(queued_stock, stock)
+                return queued_stock, True
+            
+            queue, (queued_stock, created) = self._update(user_id, add)
+            self._rescore(user_id, queue, symbol)
+            
+            if created:
+                logger.info(f"Added {queue_item.symbol} to queue for user {user_id}")
+            else:
+                logger.info(f"Updated confidence for {symbol} in queue for user {user_id}")
             return queued_stock
             
         except Exception as e:
             logger.error(f"Error adding to queue: {str(e)}")
             raise
     
+    def add_many(self, user_id: str, entries: List[Tuple[Stock, Confidence, datetime]]) -> List[Tuple[QueuedStock, bool]]:
+        """Add pre-validated (stock, confidence, added_at) entries in order; returns (item, created) per entry"""
+        def add(queue: "OrderedDict[str, QueuedStock]") -> List[Tuple[QueuedStock, bool]]:
+            stats = self._stats(user_id)
+            results = []
+            for stock, confidence, added_at in entries:
+                existing = queue.get(stock.symbol)
+                if existing:
+                    stats.change_confidence(existing.confidence, confidence)
+                    existing.confidence = confidence
+                    results.append((existing, False))
+                    continue
+
+                queued_stock = QueuedStock(
+                    id=str(uuid.uuid4()),
+                    user_id=user_id,
+                    addedAt=added_at,
+                    symbol=stock.symbol,
+                    confidence=confidence
+                )
+                queue[stock.symbol] = queued_stock
+                stats.add(queued_stock, stock)
+                results.append((queued_stock, True))
+            return results
+
+        queue, results = self._update(user_id, add)
+        for stock, _, _ in entries:
+            self._rescore(user_id, queue, stock.symbol)
+        logger.info(f"Applied {len(entries)} queue changes for user {user_id}")
+        return results
+
     def remove_from_queue(self, user_id: str, symbol: str) -> bool:
         """Remove stock from user's queue"""
         try:
-            if user_id not in self.queues:
+            def remove(queue: "OrderedDict[str, QueuedStock]") -> Optional[QueuedStock]:
+                item = queue.pop(symbol.upper(), None)
+                if item is not None:
+                    self._stats(user_id).remove(item, self.stock_service.get_stock(item.symbol))
+                return item
+            
+            _, item = self._update(user_id, remove)
+            if item is None:
                 return False
             
-            initial_length = len(self.queues[user_id])
-            self.queues[user_id] = [
-                q for q in self.queues[user_id] 
-                if q.symbol != symbol.upper()
-            ]
-            
-            removed = len(self.queues[user_id]) < initial_length
-            
-            if removed:
-                logger.info(f"Removed {symbol} from queue for user {user_id}")
-            
-            return removed
+            self._unrank(user_id, item.symbol)
+            logger.info(f"Removed {symbol} from queue for user {user_id}")
+            return True
             
         except Exception as e:
             logger.error(f"Error removing from queue: {str(e)}")
             return False
     
+    def update_confidence(self, user_id: str, symbol: str, confidence: Confidence) -> Optional[QueuedStock]:
+        """Update confidence of a queued stock"""
+        confidence = Confidence(confidence)
+        
+        def change(queue: "OrderedDict[str, QueuedStock]") -> Optional[QueuedStock]:
+            item = queue.get(symbol.upper())
+            if item:
+                self._stats(user_id).change_confidence(item.confidence, confidence)
+                item.confidence = confidence
+            return item
+        
+        queue, item = self._update(user_id, change)
+        if item:
+            self._rescore(user_id, queue, item.symbol)
+        return item
+    
+    def get_revision(self, user_id: str) -> int:
+        """Get counter that changes whenever the user's queue changes"""
+        return self.queues.revision(user_id)
+    
+    def _load(self, user_id: str) -> "OrderedDict[str, QueuedStock]":
+        """Read the user's queue, rebuilding derived state if it changed elsewhere (another worker)"""
+        return self._load_versioned(user_id)[0]
+    
+    def _load_versioned(self, user_id: str) -> Tuple["OrderedDict[str, QueuedStock]", int]:
+        queue, revision = self.queues.get_versioned(user_id)
+        if queue is None:
+            queue = OrderedDict()
+        if self._synced.get(user_id) != revision:
+            stats = self.stats[user_id] = _QueueStats()
+            for item in queue.values():
+                stock = self.stock_service.get_stock(item.symbol)
+                if stock:
+                    stats.add(item, stock)
+            self._drop_ranked(user_id)
+            self._synced[user_id] = revision
+        return queue, revision
+    
+    def _update(self, user_id: str, mutate: Callable[["OrderedDict[str, QueuedStock]"], Any]) -> Tuple["OrderedDict[str, QueuedStock]", Any]:
+        """Mutate the user's queue and save it, retrying if another worker saved first.
+
+        `mutate` changes the queue in place, keeps the stats in step and returns its
+        result; None means nothing changed and skips the write. Returns (queue, result).
+        """
+        with self.queues.backend.update_lock(self.queues.namespace, user_id):
+            for _ in range(MAX_WRITE_ATTEMPTS):
+                queue, revision = self._load_versioned(user_id)
+                try:
+                    result = mutate(queue)
+                    if result is None:
+                        return queue, None
+                    # Derived state was updated alongside the mutation, so it matches the new revision
+                    self._synced[user_id] = self.queues.put(user_id, queue, revision)
+                    return queue, result
+                except StateConflictError:
+                    # Stats now reflect a queue that was never stored; rebuild them on the next load
+                    self._synced.pop(user_id, None)
+                except BaseException:
+                    self._synced.pop(user_id, None)
+                    raise
+        raise StateConflictError(f"Queue for user {user_id} kept changing; gave up after {MAX_WRITE_ATTEMPTS} attempts")
+    
+    def _stats(self, user_id: str) -> _QueueStats:
+        stats = self.stats.get(user_id)
+        if stats is None:
+            stats = self.stats[user_id] = _QueueStats()
+        return stats
+    
+    def set_sector_preference_provider(self, provider: SectorPreferenceProvider) -> None:
+        """Set the callable returning a user's sector preference weights for ranking"""
+        self.sector_preferences = provider
+    
+    def get_ranked_queue(self, user_id: str, limit: Optional[int] = None) -> List[QueuedStock]:
+        """Get the top queued stocks by score without sorting the whole queue"""
+        queue = self._load(user_id)
+        if not queue:
+            return []
+        
+        view = self.ranked.get(user_id)
+        if view is None:
+            view = self.ranked[user_id] = _RankedView()
+            view.preferences = self._get_preferences(user_id)
+            for symbol in queue:
+                self._rescore(user_id, queue, symbol)
+        else:
+            self._refresh_preferences(user_id, queue, view)
+        
+        return [queue[symbol] for symbol in view.top(min(limit or len(queue), len(queue)))]
+    
+    def score(self, item: QueuedStock, stock: Stock, preferences: Dict[str, float]) -> float:
+        """Ranking key: confidence + momentum + sector preference, decayed linearly by age"""
+        preference = math.tanh(preferences.get(stock.sector, 0.0) / PREFERENCE_SCALE)
+        return (
+            CONFIDENCE_SCORE[item.confidence]
+            + MOMENTUM_WEIGHT * stock.changePercent
+            + PREFERENCE_WEIGHT * preference
+            + AGE_DECAY_PER_DAY * item.addedAt.timestamp() / 86_400
+        )
+    
+    def _rescore(self, user_id: str, queue: "OrderedDict[str, QueuedStock]", symbol: str) -> None:
+        view = self.ranked.get(user_id)
+        if view is None:
+            return
+        item = queue.get(symbol)
+        stock = self.stock_service.get_stock(symbol)
+        if not item or not stock:
+            self._unrank(user_id, symbol)
+            return
+        view.push(symbol, self.score(item, stock, view.preferences))
+        self._ranked_holders[symbol].add(user_id)
+    
+    def _unrank(self, user_id: str, symbol: str) -> None:
+        view = self.ranked.get(user_id)
+        if view is not None:
+            view.discard(symbol)
+            self._ranked_holders[symbol].discard(user_id)
+    
+    def _drop_ranked(self, user_id: str) -> None:
+        view = self.ranked.pop(user_id, None)
+        for symbol in (view.keys if view else ()):
+            self._ranked_holders[symbol].discard(user_id)
+    
+    def _on_price_change(self, stock: Stock, old_price: float) -> None:
+        # Only users whose ranked view holds the symbol need a new key
+        for user_id in list(self._ranked_holders.get(stock.symbol, ())):
+            self._rescore(user_id, self._load(user_id), stock.symbol)
+        
+        # Enriched projections only need their numeric fields patched
+        for user_id in self._enriched_holders.get(stock.symbol, ()):
+            view = self.enriched.get(user_id)
+            enriched_stock = view.by_symbol[stock.symbol]["stock"] if view and stock.symbol in view.by_symbol else None
+            if enriched_stock is not None:
+                enriched_stock["price"] = stock.price
+                enriched_stock["change"] = stock.change
+                enriched_stock["changePercent"] = stock.changePercent
+    
+    def _on_fundamentals_change(self, stock: Stock, old: Stock) -> None:
+        # Fundamentals updates are rare, so finding the queues that count the symbol
+        # by scanning the process-local stats is fine
+        if stock.sector != old.sector or stock.risk != old.risk:
+            for stats in self.stats.values():
+                if stock.symbol in stats.symbols:
+                    stats.change_stock(old, stock)
+        
+        # Sector feeds the ranking key through sector preferences
+        if stock.sector != old.sector:
+            for user_id in list(self._ranked_holders.get(stock.symbol, ())):
+                self._rescore(user_id, self._load(user_id), stock.symbol)
+        
+        for user_id in self._enriched_holders.get(stock.symbol, ()):
+            view = self.enriched.get(user_id)
+            enriched_stock = view.by_symbol[stock.symbol]["stock"] if view and stock.symbol in view.by_symbol else None
+            if enriched_stock is not None:
+                enriched_stock["sector"] = stock.sector
+                enriched_stock["marketCap"] = stock.marketCap
+                enriched_stock["risk"] = stock.risk.value
+    
+    def _get_preferences(self, user_id: str) -> Dict[str, float]:
+        preferences = self.sector_preferences(user_id) if self.sector_preferences else None
+        return dict(preferences or {})
+    
+    def _refresh_preferences(self, user_id: str, queue: "OrderedDict[str, QueuedStock]", view: _RankedView) -> None:
+        """Rescore only the items in sectors whose preference weight changed since the last read"""
+        preferences = self._get_preferences(user_id)
+        if preferences == view.preferences:
+            return
+        changed = {
+            sector for sector in preferences.keys() | view.preferences.keys()
+            if preferences.get(sector, 0.0) != view.preferences.get(sector, 0.0)
+        }
+        view.preferences = preferences
+        for symbol in list(view.keys):
+            stock = self.stock_service.get_stock(symbol)
+            if stock and stock.sector in changed:
+                self._rescore(user_id, queue, symbol)
+    
     def clear_queue(self, user_id: str) -> bool:
         """Clear user's entire queue"""
         try:
-            if user_id in self.queues:
-                queue_size = len(self.queues[user_id])
-                self.queues[user_id] = []
-                logger.info(f"Cleared queue for user {user_id} ({queue_size} items)")
-                return True
-            return False
+            if user_id not in self.queues:
+                return False
+            
+            def clear(queue: "OrderedDict[str, QueuedStock]") -> int:
+                queue_size = len(queue)
+                queue.clear()
+                self.stats[user_id] = _QueueStats()
+                return queue_size
+            
+            _, queue_size = self._update(user_id, clear)
+            self._drop_ranked(user_id)
+            logger.info(f"Cleared queue for user {user_id} ({queue_size} items)")
+            return True
             
         except Exception as e:
             logger.error(f"Error clearing queue: {str(e)}")
@@ -96,55 +444,38 @@ class QueueService:
     
     def is_in_queue(self, user_id: str, symbol: str) -> bool:
         """Check if stock is in user's queue"""
-        if user_id not in self.queues:
-            return False
-        
-        return any(q.symbol == symbol.upper() for q in self.queues[user_id])
+        queue = self.queues.get(user_id)
+        return bool(queue) and symbol.upper() in queue
     
     def get_queue_stats(self, user_id: str) -> Dict:
         """Get queue statistics for user"""
         try:
-            queue = self.get_user_queue(user_id)
+            self._load(user_id)
+            stats = self.stats.get(user_id)
             
-            if not queue:
+            if not stats or not stats.symbols:
                 return {
                     "totalStocks": 0,
                     "confidenceBreakdown": {},
                     "sectorBreakdown": {},
+                    "riskBreakdown": {},
                     "totalValue": 0,
                     "averagePrice": 0
                 }
             
-            # Confidence breakdown
-            confidence_counts = {}
-            for item in queue:
-                conf = item.confidence.value
-                confidence_counts[conf] = confidence_counts.get(conf, 0) + 1
-            
-            # Sector breakdown and value calculation
-            sector_counts = {}
-            total_value = 0
-            total_price = 0
-            
-            for item in queue:
-                stock = self.stock_service.get_stock(item.symbol)
-                if stock:
-                    # Sector breakdown
-                    sector = stock.sector
-                    sector_counts[sector] = sector_counts.get(sector, 0) + 1
-                    
-                    # Value calculation (assuming 1 share per item for stats)
-                    total_value += stock.price
-                    total_price += stock.price
-            
-            average_price = total_price / len(queue) if queue else 0
+            # One gather against the current price column (1 share per item for stats)
+            snapshot = self.stock_service.get_catalog_snapshot()
+            rows = snapshot.lookup(stats.symbols)
+            total_value = float(np.take(snapshot.price, rows[rows >= 0]).sum())
+            total_stocks = len(stats.symbols)
             
             return {
-                "totalStocks": len(queue),
-                "confidenceBreakdown": confidence_counts,
-                "sectorBreakdown": sector_counts,
+                "totalStocks": total_stocks,
+                "confidenceBreakdown": dict(stats.confidence),
+                "sectorBreakdown": dict(stats.sector),
+                "riskBreakdown": dict(stats.risk),
                 "totalValue": round(total_value, 2),
-                "averagePrice": round(average_price, 2)
+                "averagePrice": round(total_value / total_stocks, 2)
             }
             
         except Exception as e:
@@ -157,23 +488,16 @@ class QueueService:
             if user_id not in self.queues:
                 return False
             
-            current_queue = self.queues[user_id]
-            
-            # Create mapping of symbols to queue items
-            symbol_to_item = {item.symbol: item for item in current_queue}
-            
-            # Reorder based on new_order list
-            reordered_queue = []
-            for symbol in new_order:
-                if symbol in symbol_to_item:
-                    reordered_queue.append(symbol_to_item[symbol])
-            
-            # Add any items not in new_order to the end
-            for item in current_queue:
-                if item.symbol not in new_order:
-                    reordered_queue.append(item)
+            def reorder(queue: "OrderedDict[str, QueuedStock]") -> bool:
+                # Move the listed symbols to the front in O(k); unlisted items keep
+                # their relative order after them
+                for symbol in reversed(new_order):
+                    symbol = symbol.upper()
+                    if symbol in queue:
+                        queue.move_to_end(symbol, last=False)
+                return True
             
-            self.queues[user_id] = reordered_queue
+            self._update(user_id, reorder)
             
             logger.info(f"Reordered queue for user {user_id}")
             return True
@@ -183,12 +507,19 @@ class QueueService:
             return False
     
     def get_queue_with_stock_data(self, user_id: str) -> List[Dict]:
-        """Get queue with enriched stock data"""
+        """Get queue with enriched stock data (cached; treat the result as read-only)"""
         try:
-            queue = self.get_user_queue(user_id)
-            enriched_queue = []
+            queue, revision = self.queues.get_versioned(user_id)
+            view = self.enriched.get(user_id)
+            if view is not None and view.revision == revision:
+                return view.items
+            
+            for symbol in (view.by_symbol if view else ()):
+                self._enriched_holders[symbol].discard(user_id)
+            view = self.enriched[user_id] = _EnrichedView(revision)
+            enriched_queue = view.items
             
-            for queue_item in queue:
+            for queue_item in (queue.values() if queue else ()):
                 stock = self.stock_service.get_stock(queue_item.symbol)
                 if stock:
                     enriched_item = {
@@ -207,15 +538,18 @@ class QueueService:
                         }
                     }
                     enriched_queue.append(enriched_item)
+                    view.by_symbol[queue_item.symbol] = enriched_item
+                    self._enriched_holders[queue_item.symbol].add(user_id)
             
             return enriched_queue
             
         except Exception as e:
             logger.error(f"Error getting enriched queue: {str(e)}")
+            self.enriched.pop(user_id, None)
             return []
     
-    def export_queue(self, user_id: str, format: str = "json") -> Dict:
-        """Export user's queue in specified format"""
+    def export_queue(self, user_id: str) -> Dict:
+        """Export user's enriched queue and stats as one JSON document (file formats: ExportService)"""
         try:
             enriched_queue = self.get_queue_with_stock_data(user_id)
             stats = self.get_queue_stats(user_id)
@@ -227,7 +561,7 @@ class QueueService:
                 "queue_items": enriched_queue
             }
             
-            logger.info(f"Exported queue for user {user_id} in {format} format")
+            logger.info(f"Exported queue for user {user_id}")
             return export_data
             
         except Exception as e:
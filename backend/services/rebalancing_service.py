@@ -0,0 +1,283 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+from ..models import RiskTolerance
+from .catalog import CatalogSnapshot, RISK_LEVELS
+from .portfolio_service import PortfolioService
+from .ai_agent_service import AIAgentService
+from .onboarding_service import OnboardingService
+
+logger = logging.getLogger(__name__)
+
+# Sector weights may sit this far from target before a user counts as drifted
+DRIFT_BAND = 0.05
+MIN_TRADE_VALUE = 1.0
+DEFAULT_MAX_SECTOR_CONCENTRATION = 30.0
+
+
+class RebalancingService:
+    """Batch drift detection and minimal-turnover rebalancing across all portfolios"""
+
+    def __init__(
+        self,
+        portfolio_service: PortfolioService,
+        ai_agent_service: AIAgentService,
+        onboarding_service: Optional[OnboardingService] = None
+    ):
+        self.portfolio_service = portfolio_service
+        self.ai_agent_service = ai_agent_service
+        self.onboarding_service = onboarding_service
+        self.results: Dict[str, Dict] = {}
+        self.last_run: Optional[datetime] = None
+        # Bumped whenever stored results are replaced
+        self.results_version = 0
+
+    def get_drift(self, user_id: str) -> Optional[Dict]:
+        """Get the stored drift result for a user from the last batch run"""
+        return self.results.get(user_id)
+    
+    def get_drift_version(self, user_id: str) -> int:
+        """Get counter that changes whenever drift results are replaced"""
+        return self.results_version
+
+    def run(self) -> Dict:
+        """Evaluate drift for every portfolio in one vectorized pass and store the results"""
+        try:
+            started = datetime.utcnow()
+            snapshot = self.portfolio_service.stock_service.get_catalog_snapshot()
+            user_ids, sector_values, risk_values = self._current_exposures(snapshot)
+            if not user_ids:
+                self.results = {}
+                self.results_version += 1
+                self.last_run = started
+                return {"users": 0, "drifted": 0, "ranAt": started}
+
+            totals = sector_values.sum(axis=1)
+            safe_totals = np.where(totals > 0, totals, 1.0)
+            sector_weights = sector_values / safe_totals[:, None]
+            risk_weights = risk_values / safe_totals[:, None]
+
+            sector_targets, caps = self._sector_targets(user_ids, snapshot)
+            risk_targets = self._risk_targets(user_ids)
+
+            sector_gap = sector_weights - sector_targets
+            risk_gap = risk_weights - risk_targets
+            over_cap = (sector_weights > caps[:, None] + 1e-9).any(axis=1)
+            # Trades are sized per sector; risk-bucket drift is reported and steers
+            # which names get bought, but does not trigger a rebalance on its own
+            drifted = (totals > 0) & ((np.abs(sector_gap).max(axis=1) > DRIFT_BAND) | over_cap)
+
+            desired = self._minimal_turnover_weights(sector_weights, sector_targets, caps)
+            sector_trades = (desired - sector_weights) * totals[:, None]
+            turnover = 0.5 * np.abs(desired - sector_weights).sum(axis=1)
+
+            results = {}
+            for row in np.flatnonzero(drifted):
+                user_id = user_ids[row]
+                results[user_id] = {
+                    "drifted": True,
+                    "overConcentrated": bool(over_cap[row]),
+                    "maxSectorDrift": round(float(np.abs(sector_gap[row]).max()) * 100, 1),
+                    "maxRiskDrift": round(float(np.abs(risk_gap[row]).max()) * 100, 1),
+                    "turnoverPercent": round(float(turnover[row]) * 100, 1),
+                    "sectorWeights": self._weights_dict(snapshot.sectors, sector_weights[row]),
+                    "sectorTargets": self._weights_dict(snapshot.sectors, sector_targets[row]),
+                    "riskWeights": self._weights_dict([r.value for r in RISK_LEVELS], risk_weights[row]),
+                    "riskTargets": self._weights_dict([r.value for r in RISK_LEVELS], risk_targets[row]),
+                    "trades": self._trade_list(user_id, sector_trades[row], risk_gap[row], snapshot),
+                    "evaluatedAt": started
+                }
+
+            self.results = results
+            self.results_version += 1
+            self.last_run = started
+            logger.info(f"Rebalancing run: {len(user_ids)} portfolios, {len(results)} drifted")
+            return {"users": len(user_ids), "drifted": len(results), "ranAt": started}
+
+        except Exception as e:
+            logger.error(f"Error running rebalancing engine: {str(e)}")
+            raise
+
+    def _current_exposures(self, snapshot: CatalogSnapshot) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """Flatten all holdings and aggregate value per (user, sector) and (user, risk) with bincount"""
+        user_ids = []
+        user_rows, catalog_rows, shares = [], [], []
+        for user_id, portfolio in self.portfolio_service.portfolios.items():
+            if not portfolio.holdings:
+                continue
+            row = len(user_ids)
+            user_ids.append(user_id)
+            for holding in portfolio.holdings:
+                user_rows.append(row)
+                catalog_rows.append(snapshot.index.get(holding.symbol, -1))
+                shares.append(holding.shares)
+
+        n_users, n_sectors = len(user_ids), len(snapshot.sectors)
+        user_rows = np.array(user_rows, dtype=np.int64)
+        catalog_rows = np.array(catalog_rows, dtype=np.int64)
+        known = catalog_rows >= 0
+        user_rows, catalog_rows = user_rows[known], catalog_rows[known]
+        values = np.array(shares, dtype=np.float64)[known] * snapshot.price[catalog_rows]
+
+        sector_values = np.bincount(
+            user_rows * n_sectors + snapshot.sector_id[catalog_rows],
+            weights=values,
+            minlength=n_users * n_sectors
+        ).reshape(n_users, n_sectors)
+        risk_values = np.bincount(
+            user_rows * len(RISK_LEVELS) + snapshot.risk_id[catalog_rows],
+            weights=values,
+            minlength=n_users * len(RISK_LEVELS)
+        ).reshape(n_users, len(RISK_LEVELS))
+        return user_ids, sector_values, risk_values
+
+    def _sector_targets(self, user_ids: List[str], snapshot: CatalogSnapshot) -> Tuple[np.ndarray, np.ndarray]:
+        """Equal weight over preferred sectors, water-filled under maxSectorConcentration"""
+        n_sectors = len(snapshot.sectors)
+        preferred = np.zeros((len(user_ids), n_sectors), dtype=bool)
+        allowed = np.ones((len(user_ids), n_sectors), dtype=bool)
+        caps = np.full(len(user_ids), DEFAULT_MAX_SECTOR_CONCENTRATION / 100)
+
+        for row, user_id in enumerate(user_ids):
+            profile = self.ai_agent_service.get_profile(user_id)
+            interests = list(profile.preferredSectors) if profile else []
+            onboarding = self._onboarding(user_id)
+            if onboarding:
+                interests += onboarding["data"].get("sector_interests", [])
+            for i in self._match_sectors(interests, snapshot.sectors):
+                preferred[row, i] = True
+            if profile:
+                caps[row] = profile.maxSectorConcentration / 100
+                for i in self._match_sectors(profile.excludedSectors, snapshot.sectors):
+                    allowed[row, i] = False
+
+        preferred &= allowed
+        # Users without usable preferences target all allowed sectors
+        preferred = np.where(preferred.any(axis=1)[:, None], preferred, allowed)
+        targets = preferred / np.maximum(preferred.sum(axis=1, keepdims=True), 1)
+
+        for _ in range(n_sectors):
+            targets = np.minimum(targets, caps[:, None])
+            leftover = 1.0 - targets.sum(axis=1)
+            room = allowed & (targets < caps[:, None] - 1e-9)
+            if not ((leftover > 1e-9) & room.any(axis=1)).any():
+                break
+            targets = targets + room * (leftover / np.maximum(room.sum(axis=1), 1))[:, None]
+
+        # Infeasible caps (too few allowed sectors): keep the shape, drop the cap
+        targets = targets / np.where(targets.sum(axis=1) > 0, targets.sum(axis=1), 1.0)[:, None]
+        caps = np.maximum(caps, targets.max(axis=1))
+        return targets, caps
+
+    def _risk_targets(self, user_ids: List[str]) -> np.ndarray:
+        """Map each user's stocks/bonds/cash mix onto Low/Medium/High risk buckets"""
+        mixes = np.empty((len(user_ids), 3))
+        for row, user_id in enumerate(user_ids):
+            mixes[row] = self._asset_mix(user_id)
+
+        # Holdings are equities only: the defensive (bonds + cash) share targets
+        # low-risk names, and equity above 70% funds the high-risk bucket
+        stocks = mixes[:, 0] / mixes.sum(axis=1)
+        low = 1.0 - stocks
+        high = np.clip(stocks - 0.7, 0.0, None) * 2
+        medium = 1.0 - low - high
+        return np.stack([low, medium, high], axis=1)
+
+    def _asset_mix(self, user_id: str) -> Tuple[float, float, float]:
+        """Onboarding recommended_allocation when present, else the profile's risk allocation"""
+        onboarding = self._onboarding(user_id)
+        if onboarding:
+            allocation = onboarding["derived_insights"].get("recommended_allocation")
+            if allocation:
+                return allocation.get("stocks", 0), allocation.get("bonds", 0), allocation.get("cash", 0)
+
+        profile = self.ai_agent_service.get_profile(user_id)
+        tolerance = profile.riskTolerance if profile else RiskTolerance.MODERATE
+        allocation = PortfolioService._get_risk_allocation(tolerance)
+        return allocation["stocks"], allocation["bonds"], allocation["cash"]
+
+    def _onboarding(self, user_id: str) -> Optional[Dict]:
+        if not self.onboarding_service:
+            return None
+        return self.onboarding_service.onboarding_data.get(user_id)
+
+    def _match_sectors(self, names: List[str], sectors: List[str]) -> List[int]:
+        """Match free-form sector names (e.g. onboarding's 'financial') to catalog sectors"""
+        matches = []
+        for name in names:
+            name = name.lower()
+            for i, sector in enumerate(sectors):
+                if sector.lower().startswith(name) or name.startswith(sector.lower()):
+                    matches.append(i)
+        return matches
+
+    def _minimal_turnover_weights(self, weights: np.ndarray, targets: np.ndarray, caps: np.ndarray) -> np.ndarray:
+        """Move only out-of-band sectors to the band edge, then net the residual toward target"""
+        upper = np.minimum(targets + DRIFT_BAND, caps[:, None])
+        lower = np.maximum(targets - DRIFT_BAND, 0.0)
+        desired = np.clip(weights, lower, upper)
+        residual = 1.0 - desired.sum(axis=1)
+
+        # Residual buys go first to sectors still below target, sells to sectors above it
+        buy_room = np.clip(targets - desired, 0.0, None)
+        buy_room = np.where(buy_room.sum(axis=1, keepdims=True) >= residual[:, None], buy_room, upper - desired)
+        sell_room = np.clip(desired - targets, 0.0, None)
+        sell_room = np.where(sell_room.sum(axis=1, keepdims=True) >= -residual[:, None], sell_room, desired - lower)
+
+        room = np.where(residual[:, None] > 0, buy_room, sell_room)
+        room_total = room.sum(axis=1, keepdims=True)
+        share = np.divide(room, room_total, out=np.zeros_like(room), where=room_total > 0)
+        return desired + residual[:, None] * share
+
+    def _trade_list(self, user_id: str, sector_trades: np.ndarray, risk_gap: np.ndarray, snapshot: CatalogSnapshot) -> List[Dict]:
+        """Turn per-sector dollar trades into symbol-level orders"""
+        portfolio = self.portfolio_service.get_portfolio(user_id)
+        held = {}
+        for holding in portfolio.holdings:
+            row = snapshot.index.get(holding.symbol)
+            if row is not None:
+                held.setdefault(int(snapshot.sector_id[row]), []).append((holding, row))
+
+        trades = []
+        for sector_id in np.flatnonzero(np.abs(sector_trades) >= MIN_TRADE_VALUE):
+            amount = float(sector_trades[sector_id])
+            positions = held.get(int(sector_id), [])
+
+            if amount < 0:
+                # Sell pro rata across the sector's positions
+                sector_value = sum(h.shares * snapshot.price[row] for h, row in positions)
+                for holding, row in positions:
+                    price = float(snapshot.price[row])
+                    value = amount * (holding.shares * price / sector_value)
+                    trades.append(self._trade(holding.symbol, value, price))
+                continue
+
+            if positions:
+                # Top up the largest existing position
+                holding, row = max(positions, key=lambda p: p[0].shares * snapshot.price[p[1]])
+                trades.append(self._trade(holding.symbol, amount, float(snapshot.price[row])))
+                continue
+
+            # New sector: prefer the name in the most underweight risk bucket
+            candidates = np.flatnonzero(snapshot.sector_id == sector_id)
+            if not len(candidates):
+                continue
+            row = int(candidates[np.argmin(risk_gap[snapshot.risk_id[candidates]])])
+            trades.append(self._trade(snapshot.symbols[row], amount, float(snapshot.price[row])))
+
+        return trades
+
+    def _trade(self, symbol: str, value: float, price: float) -> Dict:
+        return {
+            "symbol": symbol,
+            "side": "buy" if value > 0 else "sell",
+            "amount": round(abs(value), 2),
+            "shares": round(abs(value) / price, 4),
+            "price": price
+        }
+
+    def _weights_dict(self, labels: List[str], weights: np.ndarray) -> Dict[str, float]:
+        return {label: round(float(w) * 100, 1) for label, w in zip(labels, weights) if w > 0}
@@ -0,0 +1,254 @@
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+import logging
+
+import numpy as np
+
+from ..models import BehaviorData
+from .ai_agent_service import AIAgentService
+from .preference_model import SWIPE_WEIGHTS
+from .queue_service import QueueService
+from .stock_service import StockService
+
+logger = logging.getLogger(__name__)
+
+# Implicit-feedback ALS (Hu, Koren & Volinsky): every swiped (user, symbol) pair gets
+# confidence 1 + ALPHA * |summed swipe weight| and preference 1 if the sum is positive,
+# else 0, so skips pull a symbol's score down with high confidence.
+FACTORS = 16
+REGULARIZATION = 0.1
+ALPHA = 5.0
+ITERATIONS = 10
+# Padded interactions solved per batch, bounding temporary memory
+CHUNK_NNZ = 65_536
+
+# Incremental runs re-solve only changed users against fixed item factors; fall back
+# to a full retrain when too many users changed or the last one is too old
+FULL_RETRAIN_FRACTION = 0.2
+FULL_RETRAIN_AGE = timedelta(hours=24)
+
+Interactions = Tuple[np.ndarray, np.ndarray, np.ndarray]  # (row, col, summed weight)
+Csr = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]  # (indptr, indices, confidence, preference)
+
+
+def build_interactions(histories: Sequence[BehaviorData], item_index: Dict[str, int]) -> Interactions:
+    """Sum swipe weights per (user row, item column); symbols outside item_index are dropped"""
+    rows, cols, weights = [], [], []
+    for row, behavior in enumerate(histories):
+        # Snapshot: the history deque can be appended to by a request thread meanwhile
+        for swipe in list(behavior.swipe_history):
+            col = item_index.get(swipe.symbol.upper())
+            if col is not None:
+                rows.append(row)
+                cols.append(col)
+                weights.append(SWIPE_WEIGHTS.get(swipe.action, 0.0))
+    if not rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    keys = np.array(rows, dtype=np.int64) * len(item_index) + np.array(cols, dtype=np.int64)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    summed = np.bincount(inverse, weights=np.array(weights, dtype=np.float64))
+    return unique // len(item_index), unique % len(item_index), summed
+
+
+def to_csr(rows: np.ndarray, cols: np.ndarray, weights: np.ndarray, n_rows: int, alpha: float = ALPHA) -> Csr:
+    """Row-major confidence/preference arrays"""
+    order = np.argsort(rows, kind="stable")
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=n_rows))])
+    weights = weights[order]
+    return indptr, cols[order], 1.0 + alpha * np.abs(weights), (weights > 0).astype(np.float64)
+
+
+def solve_factors(fixed: np.ndarray, csr: Csr, reg: float = REGULARIZATION) -> np.ndarray:
+    """One ALS half-step: x_u = (YtY + Yt(Cu - I)Y + reg I)^-1 Yt Cu p_u for every row.
+
+    Rows are processed in order of interaction count, in chunks padded to the chunk's
+    longest row, so each chunk is one batched matmul and one batched solve.
+    """
+    indptr, indices, confidence, preference = csr
+    n_rows, factors = len(indptr) - 1, fixed.shape[1]
+    gram = fixed.T @ fixed + reg * np.eye(factors)
+    solved = np.zeros((n_rows, factors))
+
+    counts = np.diff(indptr)
+    order = np.argsort(counts, kind="stable")
+    sorted_counts = counts[order]
+    # Rows without interactions keep zero factors
+    start = int(np.searchsorted(sorted_counts, 0, side="right"))
+    while start < n_rows:
+        # Padded size of [start, end) is (end - start) * longest row, nondecreasing in end
+        ends = np.arange(start + 1, n_rows + 1)
+        padded = (ends - start) * sorted_counts[ends - 1]
+        end = start + max(int(np.searchsorted(padded, CHUNK_NNZ, side="right")), 1)
+
+        rows = order[start:end]
+        width = np.arange(sorted_counts[end - 1])
+        valid = width[None, :] < counts[rows][:, None]
+        slots = np.where(valid, indptr[rows][:, None] + width[None, :], 0)
+        y = fixed[indices[slots]] * valid[:, :, None]
+        c = np.where(valid, confidence[slots], 1.0)
+        p = np.where(valid, preference[slots], 0.0)
+
+        a = gram + np.matmul((y * (c - 1.0)[:, :, None]).transpose(0, 2, 1), y)
+        b = (y * (c * p)[:, :, None]).sum(axis=1)
+        solved[rows] = np.linalg.solve(a, b[:, :, None])[:, :, 0]
+        start = end
+
+    return solved
+
+
+def train_als(
+    interactions: Interactions, n_users: int, n_items: int, factors: int = FACTORS,
+    iterations: int = ITERATIONS, reg: float = REGULARIZATION, alpha: float = ALPHA, seed: int = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Alternate user and item solves from random item factors"""
+    rows, cols, weights = interactions
+    by_user = to_csr(rows, cols, weights, n_users, alpha)
+    by_item = to_csr(cols, rows, weights, n_items, alpha)
+    item_factors = np.random.default_rng(seed).normal(scale=0.1, size=(n_items, factors))
+    user_factors = np.zeros((n_users, factors))
+    for _ in range(iterations):
+        user_factors = solve_factors(item_factors, by_user, reg)
+        item_factors = solve_factors(user_factors, by_item, reg)
+    return user_factors, item_factors
+
+
+def top_n(scores: np.ndarray, exclude: np.ndarray, n: int) -> np.ndarray:
+    """Indices of the n highest scores, best first, skipping excluded columns"""
+    scores = scores.copy()
+    scores[exclude] = -np.inf
+    n = min(n, int(np.isfinite(scores).sum()))
+    if n <= 0:
+        return np.zeros(0, dtype=np.int64)
+    best = np.argpartition(-scores, n - 1)[:n]
+    return best[np.argsort(-scores[best], kind="stable")]
+
+
+class _Model:
+    """Trained factors; replaced wholesale so readers never see a half-updated model"""
+
+    def __init__(self, symbols: List[str], item_factors: np.ndarray, popularity: np.ndarray):
+        self.symbols = symbols
+        self.item_index = {symbol: i for i, symbol in enumerate(symbols)}
+        self.item_factors = item_factors
+        self.popularity = popularity
+        self.user_index: Dict[str, int] = {}
+        self.user_factors = np.zeros((0, item_factors.shape[1]))
+        self.seen: Dict[str, np.ndarray] = {}
+        self.revisions: Dict[str, int] = {}
+        self.trained_at = datetime.utcnow()
+
+
+class RecommendationService:
+    """Collaborative-filtering stock recommendations learned from swipe histories"""
+
+    def __init__(self, ai_agent_service: AIAgentService, stock_service: StockService,
+                 queue_service: Optional[QueueService] = None):
+        self.ai_agent_service = ai_agent_service
+        self.stock_service = stock_service
+        self.queue_service = queue_service
+        self.model: Optional[_Model] = None
+        self.last_run: Optional[Dict] = None
+        self._train_lock = threading.Lock()
+
+    def recommend(self, user_id: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """Top (symbol, score) pairs the user hasn't swiped, queued or watchlisted, from precomputed factors"""
+        model = self.model
+        if model is None or not model.symbols:
+            return []
+        current = [model.item_index[symbol] for symbol in self._current_symbols(user_id) if symbol in model.item_index]
+        exclude = np.concatenate([model.seen.get(user_id, np.zeros(0, dtype=np.int64)), np.array(current, dtype=np.int64)])
+        row = model.user_index.get(user_id)
+        # Cold start: most-liked symbols across all users
+        scores = model.item_factors @ model.user_factors[row] if row is not None else model.popularity
+        return [(model.symbols[i], round(float(scores[i]), 4)) for i in top_n(scores, exclude, limit)]
+
+    def _current_symbols(self, user_id: str) -> Set[str]:
+        """Symbols the user has acted on since (or outside of) the last training run"""
+        behavior = self.ai_agent_service.behavior_data.get(user_id)
+        symbols = {swipe.symbol.upper() for swipe in list(behavior.swipe_history)} if behavior else set()
+        symbols.update(item.symbol.upper() for item in self.stock_service.get_watchlist(user_id))
+        if self.queue_service:
+            symbols.update(item.symbol for item in self.queue_service.get_user_queue(user_id))
+        return symbols
+
+    def train(self, full: bool = False) -> Dict:
+        """Retrain from swipe histories; only users whose behavior changed unless a full run is due"""
+        with self._train_lock:
+            try:
+                started = datetime.utcnow()
+                behavior_data = self.ai_agent_service.behavior_data
+                user_ids = list(behavior_data)
+                revisions = dict(zip(user_ids, behavior_data.revisions(user_ids)))
+                symbols = self.stock_service.get_catalog_snapshot().symbols
+
+                model = self.model
+                changed = [u for u in user_ids if model is None or model.revisions.get(u) != revisions[u]]
+                full = full or (
+                    model is None
+                    or model.symbols != symbols
+                    or len(changed) > FULL_RETRAIN_FRACTION * max(len(user_ids), 1)
+                    or started - model.trained_at > FULL_RETRAIN_AGE
+                )
+                if full:
+                    self.model = self._train_full(user_ids, revisions, symbols)
+                elif changed:
+                    self.model = self._train_users(model, changed, revisions)
+
+                self.last_run = {
+                    "mode": "full" if full else "incremental",
+                    "users": len(user_ids),
+                    "updatedUsers": len(user_ids) if full else len(changed),
+                    "items": len(symbols),
+                    "seconds": round((datetime.utcnow() - started).total_seconds(), 3),
+                    "ranAt": started,
+                }
+                logger.info(f"Recommender {self.last_run['mode']} training: {self.last_run['updatedUsers']} users")
+                return self.last_run
+
+            except Exception as e:
+                logger.error(f"Error training recommender: {str(e)}")
+                raise
+
+    def _train_full(self, user_ids: List[str], revisions: Dict[str, int], symbols: List[str]) -> _Model:
+        item_index = {symbol: i for i, symbol in enumerate(symbols)}
+        behaviors = self.ai_agent_service.behavior_data.get_many(user_ids)
+        kept = [(u, b) for u, b in zip(user_ids, behaviors) if b is not None]
+        interactions = build_interactions([b for _, b in kept], item_index)
+        user_factors, item_factors = train_als(interactions, len(kept), len(symbols))
+
+        rows, cols, weights = interactions
+        popularity = np.bincount(cols[weights > 0], minlength=len(symbols)).astype(np.float64)
+        model = _Model(symbols, item_factors, popularity)
+        model.user_index = {u: i for i, (u, _) in enumerate(kept)}
+        model.user_factors = user_factors
+        indptr, indices, _, _ = to_csr(rows, cols, weights, len(kept))
+        model.seen = {u: indices[indptr[i]:indptr[i + 1]] for i, (u, _) in enumerate(kept)}
+        model.revisions = {u: revisions[u] for u, _ in kept}
+        return model
+
+    def _train_users(self, model: _Model, user_ids: List[str], revisions: Dict[str, int]) -> _Model:
+        """Re-solve changed users against the current item factors (one exact ALS half-step)"""
+        behaviors = self.ai_agent_service.behavior_data.get_many(user_ids)
+        kept = [(u, b) for u, b in zip(user_ids, behaviors) if b is not None]
+        rows, cols, weights = build_interactions([b for _, b in kept], model.item_index)
+        csr = to_csr(rows, cols, weights, len(kept))
+        solved = solve_factors(model.item_factors, csr)
+
+        updated = _Model(model.symbols, model.item_factors, model.popularity)
+        updated.trained_at = model.trained_at
+        updated.user_index = dict(model.user_index)
+        updated.seen = dict(model.seen)
+        updated.revisions = dict(model.revisions)
+        new_users = [u for u, _ in kept if u not in updated.user_index]
+        for u in new_users:
+            updated.user_index[u] = len(updated.user_index)
+        updated.user_factors = np.vstack([model.user_factors, np.zeros((len(new_users), model.item_factors.shape[1]))])
+
+        indptr, indices = csr[0], csr[1]
+        for i, (u, _) in enumerate(kept):
+            updated.user_factors[updated.user_index[u]] = solved[i]
+            updated.seen[u] = indices[indptr[i]:indptr[i + 1]]
+            updated.revisions[u] = revisions[u]
+        return updated
@@ -0,0 +1,222 @@
+import math
+import threading
+import zlib
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+from ..models import Portfolio, RiskLevel, Stock
+from .stock_service import StockService
+
+logger = logging.getLogger(__name__)
+
+TRADING_DAYS = 252
+
+# Annualized volatility assumed for each catalog risk bucket until we have real return history
+RISK_LEVEL_VOLATILITY = {
+    RiskLevel.LOW: 0.15,
+    RiskLevel.MEDIUM: 0.25,
+    RiskLevel.HIGH: 0.45,
+}
+SAME_SECTOR_CORRELATION = 0.6
+CROSS_SECTOR_CORRELATION = 0.3
+MAX_ANNUAL_DRIFT = 0.30
+
+# Paths are simulated in fixed-size chunks, each with its own spawned seed, so the
+# result for a given seed is identical whether chunks run in-process or in a pool
+CHUNK_PATHS = 25_000
+PROCESS_POOL_MIN_PATHS = 500_000
+
+# 10-day 99% CVaR (as a loss fraction) mapped log-linearly onto the 1-10 risk score
+RISK_SCORE_CVAR_FLOOR = 0.04
+RISK_SCORE_CVAR_CEILING = 0.40
+
+
+def _simulate_chunk(
+    mu_p: float,
+    sigma_p: float,
+    horizon: int,
+    n_paths: int,
+    seed: np.random.SeedSequence
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Simulate one chunk of portfolio paths (module level so it can run in a worker process)"""
+    rng = np.random.default_rng(seed)
+    z = rng.standard_normal((n_paths, horizon), dtype=np.float32)
+    daily = z * np.float32(sigma_p) + np.float32(mu_p)
+
+    values = np.cumprod(1.0 + daily, axis=1)
+    running_max = np.maximum.accumulate(np.maximum(values, 1.0), axis=1)
+    max_drawdown = (1.0 - values / running_max).max(axis=1)
+
+    return daily[:, 0], values[:, -1] - 1.0, max_drawdown
+
+
+class RiskService:
+    """Monte Carlo risk engine for portfolio VaR/CVaR, drawdown and risk scoring"""
+
+    def __init__(self, stock_service: Optional[StockService] = None, max_workers: Optional[int] = None):
+        self.stock_service = stock_service or StockService()
+        self.max_workers = max_workers
+        self._executor: Optional[Executor] = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def executor(self) -> Executor:
+        # One long-lived pool shared by all requests, created lazily so importing the
+        # app never forks; simulate() runs in threadpool threads, hence the lock
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def shutdown(self) -> None:
+        """Stop the simulation worker pool"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def build_return_model(self, stocks: List[Stock]) -> Tuple[np.ndarray, np.ndarray]:
+        """Build daily expected returns and covariance for the given stocks"""
+        n = len(stocks)
+        annual_vol = np.array([RISK_LEVEL_VOLATILITY.get(s.risk, 0.25) for s in stocks])
+        annual_drift = np.array([
+            (s.returns.oneYear / 100) if s.returns else 0.0
+            for s in stocks
+        ]).clip(-MAX_ANNUAL_DRIFT, MAX_ANNUAL_DRIFT)
+
+        sectors = np.array([s.sector for s in stocks])
+        correlation = np.where(
+            sectors[:, None] == sectors[None, :],
+            SAME_SECTOR_CORRELATION,
+            CROSS_SECTOR_CORRELATION
+        )
+        np.fill_diagonal(correlation, 1.0)
+
+        daily_vol = annual_vol / math.sqrt(TRADING_DAYS)
+        mu = annual_drift / TRADING_DAYS
+        cov = correlation * np.outer(daily_vol, daily_vol) if n else np.zeros((0, 0))
+        return mu, cov
+
+    def simulate(
+        self,
+        weights: np.ndarray,
+        mu: np.ndarray,
+        cov: np.ndarray,
+        n_paths: int = 100_000,
+        horizon: int = 10,
+        seed: int = 0
+    ) -> Dict[str, np.ndarray]:
+        """Simulate correlated portfolio return paths and return per-path outcomes"""
+        # Correlated asset shocks are L @ z with L the Cholesky factor of the covariance.
+        # The portfolio return is linear in them, so w . (L @ z) = (L.T @ w) . z is exactly
+        # one Gaussian per path-day with sigma ||L.T @ w||; drawing that directly keeps
+        # 100k x 10-day paths independent of the number of holdings.
+        chol = np.linalg.cholesky(cov)
+        sigma_p = float(np.linalg.norm(chol.T @ weights))
+        mu_p = float(mu @ weights)
+
+        sizes = [CHUNK_PATHS] * (n_paths // CHUNK_PATHS)
+        if n_paths % CHUNK_PATHS:
+            sizes.append(n_paths % CHUNK_PATHS)
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        args = [(mu_p, sigma_p, horizon, size, s) for size, s in zip(sizes, seeds)]
+
+        if n_paths >= PROCESS_POOL_MIN_PATHS and (self.max_workers is None or self.max_workers > 1):
+            chunks = list(self.executor.map(_simulate_chunk, *zip(*args)))
+        else:
+            chunks = [_simulate_chunk(*a) for a in args]
+
+        return {
+            "one_day": np.concatenate([c[0] for c in chunks]),
+            "horizon": np.concatenate([c[1] for c in chunks]),
+            "max_drawdown": np.concatenate([c[2] for c in chunks]),
+        }
+
+    def analyze_portfolio(
+        self,
+        portfolio: Portfolio,
+        n_paths: int = 20_000,
+        horizon: int = 10,
+        seed: Optional[int] = None
+    ) -> Dict:
+        """Compute VaR/CVaR, drawdown distribution and risk score for a portfolio"""
+        try:
+            stocks, values = [], []
+            for holding in portfolio.holdings:
+                stock = self.stock_service.get_stock(holding.symbol)
+                if stock and holding.totalValue > 0:
+                    stocks.append(stock)
+                    values.append(holding.totalValue)
+
+            total_value = float(sum(values))
+            if total_value <= 0:
+                return self._empty_report(horizon)
+
+            if seed is None:
+                # Stable per-user seed so repeated requests report the same numbers
+                seed = zlib.crc32(portfolio.user_id.encode())
+
+            weights = np.array(values) / total_value
+            mu, cov = self.build_return_model(stocks)
+            outcomes = self.simulate(weights, mu, cov, n_paths=n_paths, horizon=horizon, seed=seed)
+
+            one_day = self._tail_metrics(outcomes["one_day"], total_value)
+            multi_day = self._tail_metrics(outcomes["horizon"], total_value)
+            drawdown = outcomes["max_drawdown"]
+
+            return {
+                "paths": n_paths,
+                "horizonDays": horizon,
+                "seed": seed,
+                "oneDay": one_day,
+                "horizon": multi_day,
+                "maxDrawdown": {
+                    "mean": round(float(drawdown.mean()) * 100, 2),
+                    "p50": round(float(np.percentile(drawdown, 50)) * 100, 2),
+                    "p95": round(float(np.percentile(drawdown, 95)) * 100, 2),
+                    "p99": round(float(np.percentile(drawdown, 99)) * 100, 2),
+                },
+                # Calibration anchors are 10-day figures; rescale other horizons by sqrt(time)
+                "riskScore": self._risk_score(multi_day["cvar99Percent"] / 100 * math.sqrt(10 / horizon))
+            }
+
+        except Exception as e:
+            logger.error(f"Error analyzing portfolio risk: {str(e)}")
+            raise
+
+    def _tail_metrics(self, returns: np.ndarray, total_value: float) -> Dict:
+        """VaR/CVaR at 95% and 99% as positive loss percentages and dollar amounts"""
+        metrics = {}
+        for level in (95, 99):
+            cutoff = np.percentile(returns, 100 - level)
+            var = max(-float(cutoff), 0.0)
+            cvar = max(-float(returns[returns <= cutoff].mean()), 0.0)
+            metrics[f"var{level}Percent"] = round(var * 100, 2)
+            metrics[f"cvar{level}Percent"] = round(cvar * 100, 2)
+            metrics[f"var{level}"] = round(var * total_value, 2)
+            metrics[f"cvar{level}"] = round(cvar * total_value, 2)
+        return metrics
+
+    def _risk_score(self, cvar: float) -> float:
+        """Map a 10-day 99% CVaR loss fraction onto a calibrated 1-10 score"""
+        if cvar <= RISK_SCORE_CVAR_FLOOR:
+            return 1.0
+        scale = math.log(cvar / RISK_SCORE_CVAR_FLOOR) / math.log(RISK_SCORE_CVAR_CEILING / RISK_SCORE_CVAR_FLOOR)
+        return round(1 + 9 * min(scale, 1.0), 1)
+
+    def _empty_report(self, horizon: int) -> Dict:
+        """Risk report for a portfolio with no priced holdings"""
+        empty = {f"{m}{level}{suffix}": 0 for m in ("var", "cvar") for level in (95, 99) for suffix in ("", "Percent")}
+        return {
+            "paths": 0,
+            "horizonDays": horizon,
+            "seed": None,
+            "oneDay": dict(empty),
+            "horizon": dict(empty),
+            "maxDrawdown": {"mean": 0, "p50": 0, "p95": 0, "p99": 0},
+            # No holdings means no loss: the bottom of the 1-10 scale
+            "riskScore": self._risk_score(0.0)
+        }
@@ -0,0 +1,153 @@
+import math
+import re
+import threading
+from typing import List, Optional, Tuple
+import logging
+
+import numpy as np
+
+from ..models import Stock
+from .catalog import RISK_INDEX
+from .stock_service import StockService
+
+logger = logging.getLogger(__name__)
+
+MARKET_CAP_UNITS = {"": 1.0, "K": 1e3, "M": 1e6, "B": 1e9, "T": 1e12}
+MARKET_CAP_PATTERN = re.compile(r"^\s*\$?([\d.]+)\s*([KMBT]?)\s*$", re.IGNORECASE)
+
+# Numeric features, standardized with the build-time mean/std and clipped so one
+# extreme P/E can't dominate the cosine
+NUMERIC_FEATURES = ("risk", "pe", "dividendYield", "oneMonth", "sixMonth", "oneYear", "logMarketCap")
+Z_CLIP = 3.0
+# Relative weights after standardization; sector one-hot columns get SECTOR_WEIGHT
+FEATURE_WEIGHTS = np.array([1.0, 0.75, 0.75, 0.5, 0.5, 0.75, 1.0])
+SECTOR_WEIGHT = 2.0
+# In-place updates keep the build-time scaling; rebuild once this many have accumulated
+REBUILD_AFTER_UPDATES = 1_000
+
+
+def parse_market_cap(market_cap: str) -> Optional[float]:
+    """'2.85T' -> 2.85e12; None when unparseable"""
+    match = MARKET_CAP_PATTERN.match(market_cap or "")
+    if not match:
+        return None
+    return float(match.group(1)) * MARKET_CAP_UNITS[match.group(2).upper()]
+
+
+def raw_features(stock: Stock) -> np.ndarray:
+    """Unscaled numeric features; NaN where the catalog has no value"""
+    market_cap = parse_market_cap(stock.marketCap)
+    returns = stock.returns
+    return np.array([
+        RISK_INDEX[stock.risk],
+        stock.pe if stock.pe is not None else math.nan,
+        stock.dividendYield if stock.dividendYield is not None else 0.0,
+        returns.oneMonth if returns else math.nan,
+        returns.sixMonth if returns else math.nan,
+        returns.oneYear if returns else math.nan,
+        math.log10(market_cap) if market_cap else math.nan,
+    ], dtype=np.float64)
+
+
+class _Index:
+    """Row-normalized feature matrix; cosine similarity is one matrix-vector product.
+
+    The matrix is never written in place once published: updates swap in a copy,
+    so a query holding a reference always sees one consistent matrix.
+    """
+
+    def __init__(self, stocks: List[Stock], version: int):
+        # StockService.fundamentals_version the rows reflect
+        self.version = version
+        self.symbols = [s.symbol for s in stocks]
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.sectors = sorted({s.sector for s in stocks})
+        self.sector_index = {sector: i for i, sector in enumerate(self.sectors)}
+        self.updates = 0
+
+        raw = np.array([raw_features(s) for s in stocks]).reshape(len(stocks), len(NUMERIC_FEATURES))
+        self.mean = np.nanmean(raw, axis=0) if len(stocks) else np.zeros(len(NUMERIC_FEATURES))
+        self.mean = np.nan_to_num(self.mean)
+        std = np.nanstd(raw, axis=0) if len(stocks) else np.ones(len(NUMERIC_FEATURES))
+        self.std = np.where(np.nan_to_num(std) > 0, np.nan_to_num(std), 1.0)
+
+        matrix = np.zeros((len(stocks), len(NUMERIC_FEATURES) + len(self.sectors)))
+        matrix[:, :len(NUMERIC_FEATURES)] = self._scale(raw)
+        sector_ids = np.array([self.sector_index[s.sector] for s in stocks], dtype=np.int64)
+        matrix[np.arange(len(stocks)), len(NUMERIC_FEATURES) + sector_ids] = SECTOR_WEIGHT
+        self.matrix = self._normalize(matrix)
+
+    def _scale(self, raw: np.ndarray) -> np.ndarray:
+        # Missing values sit at the mean (z = 0)
+        z = np.nan_to_num((raw - self.mean) / self.std)
+        return np.clip(z, -Z_CLIP, Z_CLIP) * FEATURE_WEIGHTS
+
+    @staticmethod
+    def _normalize(rows: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(rows, axis=-1, keepdims=True)
+        return rows / np.where(norms > 0, norms, 1.0)
+
+    def update(self, stock: Stock, version: int) -> bool:
+        """Replace one row using the build-time scaling; False if a rebuild is needed.
+
+        Callers serialize updates; the new row is built off to the side and published
+        with a single reference swap.
+        """
+        row = self.index.get(stock.symbol)
+        if row is None or stock.sector not in self.sector_index or self.updates >= REBUILD_AFTER_UPDATES:
+            return False
+        features = np.zeros(self.matrix.shape[1])
+        features[:len(NUMERIC_FEATURES)] = self._scale(raw_features(stock))
+        features[len(NUMERIC_FEATURES) + self.sector_index[stock.sector]] = SECTOR_WEIGHT
+        matrix = self.matrix.copy()
+        matrix[row] = self._normalize(features)
+        self.matrix = matrix
+        self.version = max(self.version, version)
+        self.updates += 1
+        return True
+
+
+class SimilarityService:
+    """Nearest-neighbor index of catalog stocks by fundamentals, for comparable-company lookups"""
+
+    def __init__(self, stock_service: StockService):
+        self.stock_service = stock_service
+        self._index: Optional[_Index] = None
+        self._lock = threading.Lock()
+        self.stock_service.subscribe_fundamentals(self._on_fundamentals_change)
+
+    def similar(self, symbol: str, limit: int = 5) -> List[Tuple[str, float]]:
+        """The `limit` stocks most similar to `symbol` as (symbol, cosine similarity), best first"""
+        index = self._get_index()
+        row = index.index.get(symbol.upper())
+        if row is None:
+            raise ValueError(f"Stock {symbol} not found")
+
+        matrix = index.matrix
+        scores = matrix @ matrix[row]
+        scores[row] = -np.inf
+        limit = min(limit, len(scores) - 1)
+        if limit <= 0:
+            return []
+        best = np.argpartition(-scores, limit - 1)[:limit]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(index.symbols[i], round(float(scores[i]), 4)) for i in best]
+
+    def _get_index(self) -> _Index:
+        # Features ignore price, so only fundamentals changes (not every tick) make the index stale
+        index = self._index
+        if index is None or index.version != self.stock_service.fundamentals_version:
+            with self._lock:
+                index = self._index
+                version = self.stock_service.fundamentals_version
+                if index is None or index.version != version:
+                    index = self._index = _Index(self.stock_service.get_all_stocks(), version)
+                    logger.info(f"Built similarity index over {len(index.symbols)} stocks")
+        return index
+
+    def _on_fundamentals_change(self, stock: Stock, old: Stock) -> None:
+        # Only the changed row is recomputed; scaling stays at the last full build
+        with self._lock:
+            index = self._index
+            if index is not None and not index.update(stock, self.stock_service.fundamentals_version):
+                self._index = None
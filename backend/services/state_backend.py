@@ -0,0 +1,396 @@
+import threading
+from abc import ABC, abstractmethod
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import logging
+
+from pydantic import TypeAdapter
+
+try:
+    import redis
+except ImportError:  # Only needed for the Redis backend
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+READ_BATCH = 500
+# Read-modify-write attempts before giving up on a heavily contended key
+MAX_WRITE_ATTEMPTS = 10
+UPDATE_LOCK_STRIPES = 64
+
+Record = Tuple[int, Any]  # (revision, stored value)
+
+
+class StateConflictError(Exception):
+    """Raised when a conditional write finds the key was written since it was read"""
+
+
+class StateBackend(ABC):
+    """Namespaced key/value store for service state.
+
+    Every write and delete bumps the key's revision. Revisions survive deletes, so
+    a (key, revision) pair always identifies one stored value, per-process caches
+    derived from it can be validated with a revision read, and put_if can make a
+    read-modify-write conditional on nothing having changed in between.
+    """
+
+    # Whether values must be encoded to strings before storing
+    serializes = True
+
+    def __init__(self):
+        self._update_locks = [threading.RLock() for _ in range(UPDATE_LOCK_STRIPES)]
+
+    def update_lock(self, namespace: str, key: str) -> threading.RLock:
+        """Process-local lock held across one key's read-modify-write.
+
+        Threads in one process share decoded (or live) values and mutate them in
+        place, so they take turns; put_if only has to catch other processes.
+        """
+        return self._update_locks[hash((namespace, key)) % UPDATE_LOCK_STRIPES]
+
+    @abstractmethod
+    def get_many(self, namespace: str, keys: List[str]) -> List[Optional[Record]]:
+        """(revision, value) per key, or None for keys that are not stored"""
+
+    @abstractmethod
+    def get_revisions(self, namespace: str, keys: List[str]) -> List[int]:
+        """Current revision per key; 0 for keys never written"""
+
+    @abstractmethod
+    def put_many(self, namespace: str, items: Dict[str, Any]) -> Dict[str, int]:
+        """Write unconditionally; the new revision per key"""
+
+    @abstractmethod
+    def put_if(self, namespace: str, key: str, value: Any, revision: int) -> Optional[int]:
+        """Write only if the key is still at `revision`; the new revision, or None on conflict"""
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str) -> bool:
+        """Remove a key, bumping its revision; False if it was not stored"""
+
+    @abstractmethod
+    def contains(self, namespace: str, key: str) -> bool:
+        """Whether the key is stored"""
+
+    @abstractmethod
+    def keys(self, namespace: str) -> List[str]:
+        """All stored keys in the namespace"""
+
+    @abstractmethod
+    def count(self, namespace: str) -> int:
+        """Number of stored keys in the namespace"""
+
+
+class InMemoryStateBackend(StateBackend):
+    """Process-local backend (single worker, development)"""
+
+    serializes = False
+
+    def __init__(self):
+        super().__init__()
+        self.values: Dict[str, Dict[str, Any]] = {}
+        self.revisions: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, namespace: str, keys: List[str]) -> List[Optional[Record]]:
+        values = self.values.get(namespace, {})
+        revisions = self.revisions.get(namespace, {})
+        return [(revisions[key], values[key]) if key in values else None for key in keys]
+
+    def get_revisions(self, namespace: str, keys: List[str]) -> List[int]:
+        revisions = self.revisions.get(namespace, {})
+        return [revisions.get(key, 0) for key in keys]
+
+    def put_many(self, namespace: str, items: Dict[str, Any]) -> Dict[str, int]:
+        with self._lock:
+            values = self.values.setdefault(namespace, {})
+            revisions = self.revisions.setdefault(namespace, {})
+            for key, value in items.items():
+                values[key] = value
+                revisions[key] = revisions.get(key, 0) + 1
+            return {key: revisions[key] for key in items}
+
+    def put_if(self, namespace: str, key: str, value: Any, revision: int) -> Optional[int]:
+        with self._lock:
+            revisions = self.revisions.setdefault(namespace, {})
+            if revisions.get(key, 0) != revision:
+                return None
+            self.values.setdefault(namespace, {})[key] = value
+            revisions[key] = revision + 1
+            return revisions[key]
+
+    def delete(self, namespace: str, key: str) -> bool:
+        with self._lock:
+            if self.values.get(namespace, {}).pop(key, None) is None:
+                return False
+            self.revisions[namespace][key] += 1
+            return True
+
+    def contains(self, namespace: str, key: str) -> bool:
+        return key in self.values.get(namespace, {})
+
+    def keys(self, namespace: str) -> List[str]:
+        return list(self.values.get(namespace, {}))
+
+    def count(self, namespace: str) -> int:
+        return len(self.values.get(namespace, {}))
+
+
+class RedisStateBackend(StateBackend):
+    """Shared backend for multi-worker deployments.
+
+    Each namespace is two hashes: `{prefix}:{namespace}` holds the JSON values and
+    `{prefix}:{namespace}:rev` the revisions. Multi-key reads are HMGETs in batches
+    of READ_BATCH, pipelined; writes update value and revision in one MULTI/EXEC.
+    Conditional writes and deletes are Lua scripts, atomic per key.
+    """
+
+    # KEYS: values hash, revisions hash; ARGV: key, expected revision, value
+    PUT_IF_SCRIPT = """
+    if tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0') ~= tonumber(ARGV[2]) then
+        return false
+    end
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[3])
+    return redis.call('HINCRBY', KEYS[2], ARGV[1], 1)
+    """
+    # KEYS: values hash, revisions hash; ARGV: key
+    DELETE_SCRIPT = """
+    if redis.call('HDEL', KEYS[1], ARGV[1]) == 0 then
+        return 0
+    end
+    redis.call('HINCRBY', KEYS[2], ARGV[1], 1)
+    return 1
+    """
+
+    def __init__(self, client, prefix: str = "swipr"):
+        super().__init__()
+        self.client = client
+        self.prefix = prefix
+        self._put_if = client.register_script(self.PUT_IF_SCRIPT)
+        self._delete = client.register_script(self.DELETE_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url: str, prefix: str = "swipr") -> "RedisStateBackend":
+        if redis is None:
+            raise RuntimeError("Redis state backend requires the redis package")
+        return cls(redis.Redis.from_url(url, decode_responses=True), prefix)
+
+    def _values_key(self, namespace: str) -> str:
+        return f"{self.prefix}:{namespace}"
+
+    def _revisions_key(self, namespace: str) -> str:
+        return f"{self.prefix}:{namespace}:rev"
+
+    def get_many(self, namespace: str, keys: List[str]) -> List[Optional[Record]]:
+        if not keys:
+            return []
+        pipe = self.client.pipeline(transaction=False)
+        for start in range(0, len(keys), READ_BATCH):
+            batch = keys[start:start + READ_BATCH]
+            pipe.hmget(self._revisions_key(namespace), batch)
+            pipe.hmget(self._values_key(namespace), batch)
+        replies = pipe.execute()
+
+        records: List[Optional[Record]] = []
+        for revisions, values in zip(replies[::2], replies[1::2]):
+            records.extend(
+                (int(revision or 0), value) if value is not None else None
+                for revision, value in zip(revisions, values)
+            )
+        return records
+
+    def get_revisions(self, namespace: str, keys: List[str]) -> List[int]:
+        if not keys:
+            return []
+        pipe = self.client.pipeline(transaction=False)
+        for start in range(0, len(keys), READ_BATCH):
+            pipe.hmget(self._revisions_key(namespace), keys[start:start + READ_BATCH])
+        return [int(revision or 0) for batch in pipe.execute() for revision in batch]
+
+    def put_many(self, namespace: str, items: Dict[str, Any]) -> Dict[str, int]:
+        if not items:
+            return {}
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hset(self._values_key(namespace), mapping=items)
+        for key in items:
+            pipe.hincrby(self._revisions_key(namespace), key, 1)
+        replies = pipe.execute()
+        return dict(zip(items, replies[1:]))
+
+    def put_if(self, namespace: str, key: str, value: Any, revision: int) -> Optional[int]:
+        keys = [self._values_key(namespace), self._revisions_key(namespace)]
+        new_revision = self._put_if(keys=keys, args=[key, revision, value])
+        return int(new_revision) if new_revision is not None else None
+
+    def delete(self, namespace: str, key: str) -> bool:
+        # Bump rather than drop the revision so a re-created key never reuses an old one
+        keys = [self._values_key(namespace), self._revisions_key(namespace)]
+        return bool(self._delete(keys=keys, args=[key]))
+
+    def contains(self, namespace: str, key: str) -> bool:
+        return bool(self.client.hexists(self._values_key(namespace), key))
+
+    def keys(self, namespace: str) -> List[str]:
+        return list(self.client.hkeys(self._values_key(namespace)))
+
+    def count(self, namespace: str) -> int:
+        return int(self.client.hlen(self._values_key(namespace)))
+
+
+def create_state_backend(kind: Optional[str] = None, redis_url: Optional[str] = None) -> StateBackend:
+    """Build the backend selected by STATE_BACKEND (memory or redis)"""
+    if (kind or "memory") == "memory":
+        return InMemoryStateBackend()
+    if kind == "redis":
+        logger.info(f"Using Redis state backend at {redis_url}")
+        return RedisStateBackend.from_url(redis_url or "redis://localhost:6379/0")
+    raise ValueError(f"Unknown state backend {kind}; expected memory or redis")
+
+
+class StateMap(MutableMapping):
+    """Dict-like view of one namespace.
+
+    With a serializing backend, decoded values are cached locally and re-decoded
+    only when the stored revision changes. Values are not live: after mutating a
+    value in place, write it back. Read-modify-write goes through update() (or
+    put with the revision from get_versioned) so concurrent writers from other
+    workers are detected and retried instead of silently overwritten.
+    """
+
+    def __init__(self, backend: StateBackend, namespace: str, value_type: Any,
+                 to_state: Optional[Callable[[Any], Any]] = None, from_state: Optional[Callable[[Any], Any]] = None):
+        # value_type describes the stored form; to_state/from_state convert from/to the in-process form
+        self.backend = backend
+        self.namespace = namespace
+        self._adapter = TypeAdapter(value_type)
+        self._to_state = to_state
+        self._from_state = from_state
+        self._cache: Dict[str, Record] = {}
+
+    def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """Batched read; None for missing keys"""
+        return [value for value, _ in self._read(keys)]
+
+    def get_versioned(self, key: str) -> Tuple[Optional[Any], int]:
+        """Read one value together with the revision it was read at"""
+        return self._read([key])[0]
+
+    def _read(self, keys: List[str]) -> List[Tuple[Optional[Any], int]]:
+        if not self.backend.serializes:
+            revisions = self.backend.get_revisions(self.namespace, keys)
+            records = self.backend.get_many(self.namespace, keys)
+            return [(record[1], record[0]) if record else (None, revision) for record, revision in zip(records, revisions)]
+
+        # Only transfer and decode values whose revision moved since we last saw them
+        revisions = self.backend.get_revisions(self.namespace, keys)
+        stale = [key for key, revision in zip(keys, revisions) if self._cache.get(key, (None,))[0] != revision]
+        for key, record in zip(stale, self.backend.get_many(self.namespace, stale)):
+            if record is None:
+                self._cache.pop(key, None)
+                continue
+            value = self._adapter.validate_json(record[1])
+            self._cache[key] = (record[0], self._from_state(value) if self._from_state else value)
+
+        return [
+            (self._cache[key][1], self._cache[key][0]) if key in self._cache else (None, revision)
+            for key, revision in zip(keys, revisions)
+        ]
+
+    def put(self, key: str, value: Any, revision: Optional[int] = None) -> int:
+        """Write one value, returning its new revision.
+
+        With `revision` (as returned by get_versioned) the write only happens if the
+        key is still at that revision; otherwise StateConflictError is raised.
+        """
+        if revision is None:
+            return self.put_many({key: value})[key]
+        new_revision = self.backend.put_if(
+            self.namespace, key, self._encode(value) if self.backend.serializes else value, revision
+        )
+        if new_revision is None:
+            # The cached object may have been mutated in place by the losing writer
+            self._cache.pop(key, None)
+            raise StateConflictError(f"{self.namespace}/{key} changed since revision {revision}")
+        if self.backend.serializes:
+            self._cache[key] = (new_revision, value)
+        return new_revision
+
+    def update(self, key: str, mutate: Callable[[Optional[Any]], Any]) -> Any:
+        """Read-modify-write one value, retrying when another writer got there first.
+
+        `mutate` gets the current value (None if missing) and returns the value to
+        store, or None to leave it as is. It may run more than once, so it must not
+        have other side effects. Returns what `mutate` returned.
+        """
+        with self.backend.update_lock(self.namespace, key):
+            for _ in range(MAX_WRITE_ATTEMPTS):
+                value, revision = self.get_versioned(key)
+                try:
+                    value = mutate(value)
+                except BaseException:
+                    self._cache.pop(key, None)
+                    raise
+                if value is None:
+                    return None
+                try:
+                    self.put(key, value, revision)
+                    return value
+                except StateConflictError:
+                    continue
+        raise StateConflictError(f"{self.namespace}/{key} kept changing; gave up after {MAX_WRITE_ATTEMPTS} attempts")
+
+    def put_many(self, items: Dict[str, Any]) -> Dict[str, int]:
+        """Write several values in one round trip"""
+        if not self.backend.serializes:
+            return self.backend.put_many(self.namespace, items)
+        revisions = self.backend.put_many(
+            self.namespace, {key: self._encode(value) for key, value in items.items()}
+        )
+        for key, value in items.items():
+            self._cache[key] = (revisions[key], value)
+        return revisions
+
+    def _encode(self, value: Any) -> str:
+        return self._adapter.dump_json(self._to_state(value) if self._to_state else value).decode()
+
+    def revision(self, key: str) -> int:
+        """Current stored revision of a key (0 if never written)"""
+        return self.backend.get_revisions(self.namespace, [key])[0]
+
+    def revisions(self, keys: List[str]) -> List[int]:
+        """Batched revision read"""
+        return self.backend.get_revisions(self.namespace, keys)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self.get_many([key])[0]
+        return default if value is None else value
+
+    def items(self) -> List[Tuple[str, Any]]:
+        keys = list(self)
+        return [(key, value) for key, value in zip(keys, self.get_many(keys)) if value is not None]
+
+    def values(self) -> List[Any]:
+        return [value for _, value in self.items()]
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get_many([key])[0]
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.put(key, value)
+
+    def __delitem__(self, key: str) -> None:
+        self._cache.pop(key, None)
+        if not self.backend.delete(self.namespace, key):
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        return self.backend.contains(self.namespace, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.backend.keys(self.namespace))
+
+    def __len__(self) -> int:
+        return self.backend.count(self.namespace)
@@ -1,22 +1,35 @@
 import json
 import uuid
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Tuple
 import logging
 
 from ..models import (
     Stock, NewsItem, Returns, StockFilters, WatchlistItem, 
     WatchlistItemCreate, RiskLevel
 )
+from .catalog import CatalogSnapshot
+from .state_backend import InMemoryStateBackend, StateBackend, StateMap
 
 logger = logging.getLogger(__name__)
 
+FUNDAMENTAL_FIELDS = {"sector", "risk", "pe", "dividendYield", "marketCap", "returns", "earningsDate"}
+
 class StockService:
     """Service for managing stock data and operations"""
     
-    def __init__(self):
+    def __init__(self, state_backend: Optional[StateBackend] = None):
         # In production, this would connect to real market data APIs
-        self.watchlists: Dict[str, List[WatchlistItem]] = {}
+        self.watchlists: StateMap = StateMap(state_backend or InMemoryStateBackend(), "watchlists", List[WatchlistItem])
+        # Bumped on every catalog change so derived results can be cached against it
+        self.catalog_version = 0
+        # Bumped only on price moves, for caches that don't depend on fundamentals
+        self.price_version = 0
+        # Bumped only on fundamentals changes (sector, valuation, returns...)
+        self.fundamentals_version = 0
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._price_listeners: List[Callable[[Stock, float], None]] = []
+        self._fundamentals_listeners: List[Callable[[Stock, Stock], None]] = []
         self._initialize_stock_data()
     
     def _initialize_stock_data(self):
@@ -201,6 +214,68 @@ class StockService:
         """Get all available stocks"""
         return list(self.stocks.values())
     
+    def get_catalog_snapshot(self) -> CatalogSnapshot:
+        """Get columnar catalog snapshot, rebuilt only when the catalog changed"""
+        if self._snapshot is None or self._snapshot.version != self.catalog_version:
+            self._snapshot = CatalogSnapshot(self.get_all_stocks(), self.catalog_version)
+        return self._snapshot
+    
+    def subscribe_prices(self, listener: Callable[[Stock, float], None]) -> None:
+        """Register listener(stock, old_price) to be called after every price update"""
+        self._price_listeners.append(listener)
+    
+    def update_price(self, symbol: str, price: float) -> Stock:
+        """Apply a new market price, keeping the day change relative to previous close"""
+        stock = self.get_stock(symbol)
+        if not stock:
+            raise ValueError(f"Stock {symbol} not found")
+        
+        previous_close = stock.price - stock.change
+        old_price = stock.price
+        stock.price = price
+        stock.change = round(price - previous_close, 2)
+        stock.changePercent = round((stock.change / previous_close) * 100, 2) if previous_close else 0.0
+        stock.isGainer = stock.change > 0
+        self.catalog_version += 1
+        self.price_version += 1
+        
+        for listener in self._price_listeners:
+            try:
+                listener(stock, old_price)
+            except Exception as e:
+                logger.error(f"Price listener error for {stock.symbol}: {str(e)}")
+        
+        return stock
+    
+    def subscribe_fundamentals(self, listener: Callable[[Stock, Stock], None]) -> None:
+        """Register listener(stock, old) to be called after every fundamentals update"""
+        self._fundamentals_listeners.append(listener)
+    
+    def update_fundamentals(self, symbol: str, updates: Dict) -> Stock:
+        """Apply fundamentals from a market data feed (sector, risk, P/E, dividend, market cap, returns)"""
+        stock = self.get_stock(symbol)
+        if not stock:
+            raise ValueError(f"Stock {symbol} not found")
+        unknown = set(updates) - FUNDAMENTAL_FIELDS
+        if unknown:
+            raise ValueError(f"Not fundamentals fields: {', '.join(sorted(unknown))}")
+        
+        updated = Stock.model_validate({**stock.model_dump(), **updates})
+        # Listeners that keep per-sector/per-risk aggregates need the values they counted
+        old = stock.model_copy()
+        for field in updates:
+            setattr(stock, field, getattr(updated, field))
+        self.catalog_version += 1
+        self.fundamentals_version += 1
+        
+        for listener in self._fundamentals_listeners:
+            try:
+                listener(stock, old)
+            except Exception as e:
+                logger.error(f"Fundamentals listener error for {stock.symbol}: {str(e)}")
+        
+        return stock
+    
     def get_filtered_stocks(self, filters: StockFilters, user_id: str) -> List[Stock]:
         """Get stocks filtered by criteria"""
         try:
@@ -304,14 +379,6 @@ class StockService:
             if not stock:
                 raise ValueError(f"Stock {item.symbol} not found")
             
-            # Check if already in watchlist
-            if user_id not in self.watchlists:
-                self.watchlists[user_id] = []
-            
-            existing = next((w for w in self.watchlists[user_id] if w.symbol == item.symbol), None)
-            if existing:
-                raise ValueError(f"Stock {item.symbol} already in watchlist")
-            
             # Create watchlist item
             watchlist_item = WatchlistItem(
                 id=str(uuid.uuid4()),
@@ -320,7 +387,14 @@ class StockService:
                 **item.dict()
             )
             
-            self.watchlists[user_id].append(watchlist_item)
+            def add(watchlist: Optional[List[WatchlistItem]]) -> List[WatchlistItem]:
+                # Check if already in watchlist
+                watchlist = list(watchlist or [])
+                if any(w.symbol == item.symbol for w in watchlist):
+                    raise ValueError(f"Stock {item.symbol} already in watchlist")
+                return watchlist + [watchlist_item]
+            
+            self.watchlists.update(user_id, add)
             
             logger.info(f"Added {item.symbol} to watchlist for user {user_id}")
             return watchlist_item
@@ -329,20 +403,41 @@ class StockService:
             logger.error(f"Error adding to watchlist: {str(e)}")
             raise
     
+    def add_many_to_watchlist(self, user_id: str, entries: List[Tuple[WatchlistItemCreate, datetime]]) -> List[Optional[WatchlistItem]]:
+        """Add pre-validated watchlist entries in order; None marks a symbol already on the watchlist"""
+        results: List[Optional[WatchlistItem]] = []
+
+        def add(watchlist: Optional[List[WatchlistItem]]) -> List[WatchlistItem]:
+            watchlist = list(watchlist or [])
+            present = {w.symbol.upper() for w in watchlist}
+            results.clear()
+            for item, added_at in entries:
+                if item.symbol in present:
+                    results.append(None)
+                    continue
+                watchlist_item = WatchlistItem(
+                    id=str(uuid.uuid4()),
+                    user_id=user_id,
+                    added_at=added_at,
+                    **item.model_dump()
+                )
+                watchlist.append(watchlist_item)
+                present.add(item.symbol)
+                results.append(watchlist_item)
+            return watchlist
+
+        self.watchlists.update(user_id, add)
+        logger.info(f"Applied {len(entries)} watchlist changes for user {user_id}")
+        return results
+
     def remove_from_watchlist(self, user_id: str, symbol: str) -> bool:
         """Remove stock from user's watchlist"""
         try:
-            if user_id not in self.watchlists:
-                return False
-            
-            initial_length = len(self.watchlists[user_id])
-            self.watchlists[user_id] = [
-                w for w in self.watchlists[user_id] 
-                if w.symbol != symbol.upper()
-            ]
-            
-            removed = len(self.watchlists[user_id]) < initial_length
+            def remove(watchlist: Optional[List[WatchlistItem]]) -> Optional[List[WatchlistItem]]:
+                remaining = [w for w in watchlist or [] if w.symbol != symbol.upper()]
+                return remaining if len(remaining) < len(watchlist or []) else None
             
+            removed = self.watchlists.update(user_id, remove) is not None
             if removed:
                 logger.info(f"Removed {symbol} from watchlist for user {user_id}")
             
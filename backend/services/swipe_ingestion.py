@@ -0,0 +1,132 @@
+import asyncio
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from ..models import SwipeEvent
+from .ai_agent_service import AIAgentService
+
+logger = logging.getLogger(__name__)
+
+QUEUE_CAPACITY = 10_000
+MAX_BATCH = 256
+
+QueuedSwipe = Tuple[str, SwipeEvent, float]  # (user_id, swipe, monotonic enqueue time)
+
+
+class IngestionQueueFullError(Exception):
+    """Raised when the swipe queue is at capacity"""
+
+
+class SwipeIngestionService:
+    """Bounded queue of swipes applied to the AI agent by one background consumer.
+
+    The request path only enqueues. The consumer drains whatever has accumulated
+    (up to MAX_BATCH) into one micro-batch and applies it with one track_swipes call
+    per user, so batches grow with load instead of per-swipe work piling up.
+    Batches are applied in a worker thread, since track_swipes may block on the
+    state backend (Redis round trips) and must not stall the event loop.
+    """
+
+    def __init__(self, ai_agent_service: AIAgentService, capacity: int = QUEUE_CAPACITY, max_batch: int = MAX_BATCH):
+        self.ai_agent_service = ai_agent_service
+        self.capacity = capacity
+        self.max_batch = max_batch
+        self.queue: Optional[asyncio.Queue] = None
+        self._consumer: Optional[asyncio.Task] = None
+
+        self.enqueued = 0
+        self.applied = 0
+        self.rejected = 0
+        self.failed = 0
+        self.batches = 0
+        self.max_depth = 0
+        self.last_batch_size = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def start(self) -> None:
+        """Start the consumer on the running event loop"""
+        self.queue = asyncio.Queue(maxsize=self.capacity)
+        self._consumer = asyncio.create_task(self._consume())
+        logger.info(f"Swipe ingestion started (capacity {self.capacity}, batch {self.max_batch})")
+
+    async def stop(self) -> None:
+        """Apply everything already queued, then stop the consumer"""
+        if self._consumer is None:
+            return
+        await self.queue.join()
+        self._consumer.cancel()
+        self._consumer = None
+
+    def submit(self, user_id: str, swipe: SwipeEvent) -> None:
+        """Enqueue a swipe; raises IngestionQueueFullError when the queue is saturated"""
+        # Stamp at request time so queueing delay doesn't skew behavior timestamps
+        if not swipe.timestamp:
+            swipe.timestamp = datetime.utcnow()
+
+        if self._consumer is None:
+            # No consumer (scripts, or an app without startup events): apply inline
+            self._apply([(user_id, swipe, time.monotonic())])
+            return
+
+        try:
+            self.queue.put_nowait((user_id, swipe, time.monotonic()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise IngestionQueueFullError(f"Swipe ingestion queue is full ({self.capacity} pending)")
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    async def _consume(self) -> None:
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                # One batch at a time, so the counters are still only touched by one thread
+                await asyncio.to_thread(self._apply, batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _apply(self, batch: List[QueuedSwipe]) -> None:
+        by_user: Dict[str, List[SwipeEvent]] = defaultdict(list)
+        for user_id, swipe, _ in batch:
+            by_user[user_id].append(swipe)
+
+        for user_id, swipes in by_user.items():
+            try:
+                self.ai_agent_service.track_swipes(user_id, swipes)
+                self.applied += len(swipes)
+            except Exception as e:
+                self.failed += len(swipes)
+                logger.error(f"Error applying {len(swipes)} swipes for user {user_id}: {str(e)}")
+
+        # The first item waited longest
+        self.last_lag = time.monotonic() - batch[0][2]
+        self.max_lag = max(self.max_lag, self.last_lag)
+        self.last_batch_size = len(batch)
+        self.batches += 1
+
+    def get_metrics(self) -> Dict:
+        """Queue depth, throughput and backpressure counters"""
+        depth = self.queue.qsize() if self.queue else 0
+        return {
+            "running": self._consumer is not None,
+            "depth": depth,
+            "capacity": self.capacity,
+            "utilization": round(depth / self.capacity, 4),
+            "maxDepth": self.max_depth,
+            "enqueued": self.enqueued,
+            "applied": self.applied,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "batches": self.batches,
+            "lastBatchSize": self.last_batch_size,
+            "avgBatchSize": round((self.applied + self.failed) / self.batches, 2) if self.batches else 0,
+            "lastLagMs": round(self.last_lag * 1000, 2),
+            "maxLagMs": round(self.max_lag * 1000, 2),
+        }
@@ -0,0 +1,86 @@
+from datetime import datetime
+from typing import List
+import logging
+
+from ..models import (
+    SwipeAction, SwipeBatchItem, SwipeBatchResponse, SwipeBatchResult, SwipeEvent, WatchlistItemCreate
+)
+from .ai_agent_service import AIAgentService
+from .queue_service import QueueService
+from .stock_service import StockService
+
+logger = logging.getLogger(__name__)
+
+
+class SwipeService:
+    """Applies batches of offline swipes to queues, watchlists and the AI agent"""
+
+    def __init__(self, stock_service: StockService, queue_service: QueueService, ai_agent_service: AIAgentService):
+        self.stock_service = stock_service
+        self.queue_service = queue_service
+        self.ai_agent_service = ai_agent_service
+
+    def apply_batch(self, user_id: str, swipes: List[SwipeBatchItem]) -> SwipeBatchResponse:
+        """Validate against one catalog snapshot, then apply queue/watchlist changes in bulk"""
+        try:
+            snapshot = self.stock_service.get_catalog_snapshot()
+            rows = snapshot.lookup(swipe.symbol for swipe in swipes)
+            now = datetime.utcnow()
+
+            results: List[SwipeBatchResult] = []
+            queue_entries, queue_slots = [], []
+            watchlist_entries, watchlist_slots = [], []
+            events: List[SwipeEvent] = []
+
+            for i, swipe in enumerate(swipes):
+                result = SwipeBatchResult(index=i, symbol=swipe.symbol.upper(), action=swipe.action, status="recorded")
+                results.append(result)
+
+                if rows[i] < 0:
+                    result.status, result.error = "rejected", f"Stock {swipe.symbol} not found"
+                    continue
+                if swipe.action == SwipeAction.QUEUE and swipe.confidence is None:
+                    result.status, result.error = "rejected", "Confidence is required for queue swipes"
+                    continue
+
+                stock = snapshot.stocks[snapshot.symbols[rows[i]]]
+                swiped_at = swipe.timestamp or now
+                if swipe.action == SwipeAction.QUEUE:
+                    queue_entries.append((stock, swipe.confidence, swiped_at))
+                    queue_slots.append(result)
+                elif swipe.action == SwipeAction.WATCHLIST:
+                    item = WatchlistItemCreate(symbol=stock.symbol, note=swipe.note, priority=swipe.priority)
+                    watchlist_entries.append((item, swiped_at))
+                    watchlist_slots.append(result)
+
+                events.append(SwipeEvent(
+                    symbol=stock.symbol,
+                    action=swipe.action,
+                    confidence=swipe.confidence,
+                    sector=stock.sector,
+                    risk=stock.risk,
+                    timestamp=swiped_at
+                ))
+
+            if queue_entries:
+                for result, (_, created) in zip(queue_slots, self.queue_service.add_many(user_id, queue_entries)):
+                    result.status = "added" if created else "updated"
+            if watchlist_entries:
+                added = self.stock_service.add_many_to_watchlist(user_id, watchlist_entries)
+                for result, item in zip(watchlist_slots, added):
+                    result.status = "added" if item else "duplicate"
+
+            # Queue and watchlist changes are stored at this point; a learning failure must not
+            # turn the batch into an error the client would retry in full
+            try:
+                self.ai_agent_service.track_swipes(user_id, events)
+            except Exception as e:
+                logger.error(f"Swipe batch for user {user_id} applied but not tracked: {str(e)}")
+
+            rejected = sum(1 for result in results if result.status == "rejected")
+            logger.info(f"Applied swipe batch for user {user_id}: {len(swipes) - rejected} ok, {rejected} rejected")
+            return SwipeBatchResponse(applied=len(swipes) - rejected, rejected=rejected, results=results)
+
+        except Exception as e:
+            logger.error(f"Error applying swipe batch: {str(e)}")
+            raise
@@ -0,0 +1,118 @@
+"""ChatService admission control: per-user limits, the bounded wait for a slot, and
+slot release however a stream ends. ChatLimitError maps to 429 and ChatBusyError
+to 503 in the API.
+"""
+import asyncio
+
+import pytest
+
+from ..services.chat_service import ChatBusyError, ChatLimitError, ChatProvider, ChatService, FakeChatProvider
+
+MESSAGE = "one two three four"
+CHUNK_DELAY = 0.01
+
+
+class FailingChatProvider(ChatProvider):
+    """Yields one chunk, then fails like an upstream error mid-response"""
+
+    async def stream(self, user_id, message):
+        yield "partial"
+        raise RuntimeError("upstream failed")
+
+
+def make_service(provider=None, **limits) -> ChatService:
+    limits.setdefault("max_concurrent", 1)
+    limits.setdefault("queue_timeout", 0.5)
+    return ChatService(provider or FakeChatProvider(chunk_delay=CHUNK_DELAY), **limits)
+
+
+async def collect(service: ChatService, user_id: str) -> str:
+    return "".join([chunk async for chunk in service.stream(user_id, MESSAGE)])
+
+
+def assert_idle(service: ChatService) -> None:
+    metrics = service.get_metrics()
+    assert metrics["generating"] == 0 and metrics["waiting"] == 0 and metrics["usersInFlight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_user_over_limit_is_rejected():
+    service = make_service(max_concurrent=4, max_per_user=1)
+    running = service.stream("u", MESSAGE)
+    await running.__anext__()
+
+    with pytest.raises(ChatLimitError):
+        await collect(service, "u")
+    assert await collect(service, "other") == "You said: " + MESSAGE
+    assert service.get_metrics()["rejectedPerUser"] == 1
+    await running.aclose()
+
+
+@pytest.mark.asyncio
+async def test_full_wait_queue_is_rejected():
+    service = make_service(max_waiting=1)
+    running = service.stream("a", MESSAGE)
+    await running.__anext__()
+    waiting = asyncio.create_task(collect(service, "b"))
+    await asyncio.sleep(0)  # Let b start waiting for the slot
+
+    with pytest.raises(ChatBusyError):
+        await collect(service, "c")
+    assert service.get_metrics()["rejectedBusy"] == 1
+
+    await running.aclose()
+    assert await waiting == "You said: " + MESSAGE
+    assert_idle(service)
+
+
+@pytest.mark.asyncio
+async def test_wait_for_slot_times_out():
+    service = make_service(queue_timeout=0.05)
+    running = service.stream("a", MESSAGE)
+    await running.__anext__()
+
+    with pytest.raises(ChatBusyError):
+        await collect(service, "b")
+    assert service.get_metrics()["timedOut"] == 1
+    await running.aclose()
+    assert_idle(service)
+
+
+@pytest.mark.asyncio
+async def test_slot_released_after_provider_error():
+    service = make_service(FailingChatProvider())
+
+    with pytest.raises(RuntimeError):
+        await collect(service, "u")
+    assert service.get_metrics()["failed"] == 1
+    assert_idle(service)
+
+    service.provider = FakeChatProvider()
+    assert await collect(service, "u") == "You said: " + MESSAGE
+
+
+@pytest.mark.asyncio
+async def test_slot_released_on_aclose():
+    service = make_service()
+    stream = service.stream("u", MESSAGE)
+    assert await stream.__anext__() == "You"
+
+    await stream.aclose()
+    assert service.get_metrics()["cancelled"] == 1
+    assert_idle(service)
+    assert await collect(service, "u") == "You said: " + MESSAGE
+
+
+@pytest.mark.asyncio
+async def test_slot_released_on_cancellation():
+    service = make_service()
+    consumer = asyncio.create_task(collect(service, "u"))
+    await asyncio.sleep(CHUNK_DELAY * 2)  # Mid-stream
+    assert service.get_metrics()["generating"] == 1
+
+    consumer.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await consumer
+    assert service.get_metrics()["cancelled"] == 1
+    assert_idle(service)
+    assert await collect(service, "u") == "You said: " + MESSAGE
@@ -0,0 +1,193 @@
+"""StateMap and the services on top of it, in-process and against fakeredis.
+
+Each test gets two "workers": for Redis, two clients (each with its own decoded
+cache) on one fake server; in-memory, the same backend twice.
+"""
+import threading
+from datetime import datetime
+
+import fakeredis
+import pytest
+
+from ..models import (
+    AIIntervention, Confidence, InterventionType, QueuedStockCreate, RegisterRequest, SwipeAction, SwipeEvent,
+    WatchlistItemCreate
+)
+from ..services.ai_agent_service import AIAgentService
+from ..services.auth_service import AuthService
+from ..services.portfolio_service import PortfolioService
+from ..services.queue_service import QueueService
+from ..services.state_backend import InMemoryStateBackend, RedisStateBackend, StateConflictError, StateMap
+from ..services.stock_service import StockService
+
+SYMBOLS = ["AAPL", "GOOGL", "TSLA", "AMZN", "NVDA", "JPM", "JNJ"]
+THREADS = 8
+ROUNDS = 10
+
+
+@pytest.fixture(params=["memory", "redis"])
+def backends(request):
+    if request.param == "memory":
+        backend = InMemoryStateBackend()
+        return backend, backend
+    server = fakeredis.FakeServer()
+    return tuple(RedisStateBackend(fakeredis.FakeRedis(server=server, decode_responses=True)) for _ in range(2))
+
+
+def run_threads(target) -> None:
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_put_and_read_back(backends):
+    first, second = (StateMap(backend, "counters", int) for backend in backends)
+
+    revision = first.put("a", 1)
+    assert second.get_versioned("a") == (1, revision)
+    assert first.get_many(["a", "missing"]) == [1, None]
+    assert first.revision("missing") == 0
+
+
+def test_stale_revision_is_rejected(backends):
+    first, second = (StateMap(backend, "counters", int) for backend in backends)
+    first.put("a", 1)
+    _, revision = first.get_versioned("a")
+
+    second.put("a", 2)
+    with pytest.raises(StateConflictError):
+        first.put("a", 10, revision)
+    assert first.get("a") == 2
+
+
+def test_delete_bumps_revision(backends):
+    first, second = (StateMap(backend, "counters", int) for backend in backends)
+    first.put("a", 1)
+    _, revision = first.get_versioned("a")
+
+    del second["a"]
+    assert second.revision("a") > revision
+    with pytest.raises(StateConflictError):
+        first.put("a", 1, revision)
+    assert "a" not in first
+
+
+def test_update_retries_after_conflict(backends):
+    if backends[0] is backends[1]:
+        pytest.skip("a single in-process backend serializes updates instead of conflicting")
+    first, second = (StateMap(backend, "counters", int) for backend in backends)
+    first.put("a", 0)
+    calls = []
+
+    def increment(value):
+        if not calls:
+            second.put("a", value + 100)  # Another worker writes between our read and write
+        calls.append(value)
+        return value + 1
+
+    assert first.update("a", increment) == 101
+    assert calls == [0, 100]
+    assert second.get("a") == 101
+
+
+def test_update_skips_write_when_mutate_returns_none(backends):
+    counters = StateMap(backends[0], "counters", int)
+    counters.put("a", 1)
+    revision = counters.revision("a")
+
+    assert counters.update("a", lambda value: None) is None
+    assert counters.revision("a") == revision
+
+
+def test_concurrent_queue_adds_and_stats(backends):
+    stocks = [StockService(state_backend=backend) for backend in backends]
+    queues = [QueueService(stock_service, backend) for stock_service, backend in zip(stocks, backends)]
+
+    def work(i):
+        for n in range(ROUNDS):
+            symbol = SYMBOLS[(i + n) % len(SYMBOLS)]
+            queues[i % 2].add_to_queue("u", QueuedStockCreate(symbol=symbol, confidence=Confidence.BULLISH))
+
+    run_threads(work)
+    assert sorted(item.symbol for item in queues[0].get_user_queue("u")) == sorted(SYMBOLS)
+    for queue_service in queues:
+        stats = queue_service.get_queue_stats("u")
+        assert stats["totalStocks"] == len(SYMBOLS)
+        assert stats["confidenceBreakdown"] == {Confidence.BULLISH.value: len(SYMBOLS)}
+
+    assert queues[1].remove_from_queue("u", "AAPL")
+    assert queues[0].get_queue_stats("u")["totalStocks"] == len(SYMBOLS) - 1
+
+
+def test_concurrent_swipes_are_all_counted(backends):
+    agents = [AIAgentService(backend) for backend in backends]
+
+    def work(i):
+        for _ in range(ROUNDS):
+            agents[i % 2].track_swipe("u", SwipeEvent(
+                symbol="AAPL", action=SwipeAction.QUEUE, sector="Technology", risk="Medium",
+                timestamp=datetime.utcnow()
+            ))
+
+    run_threads(work)
+    assert agents[1].behavior_data.get("u").swipe_count == THREADS * ROUNDS
+
+
+def test_concurrent_trades_keep_every_share(backends):
+    portfolios = [PortfolioService(StockService(state_backend=backend), state_backend=backend) for backend in backends]
+
+    def work(i):
+        for _ in range(ROUNDS):
+            portfolios[i % 2].add_holding("u", "AAPL", 1, 100.0)
+
+    run_threads(work)
+    holdings = portfolios[0].get_portfolio("u").holdings
+    assert [(holding.symbol, holding.shares) for holding in holdings] == [("AAPL", THREADS * ROUNDS)]
+
+
+def test_concurrent_watchlist_adds(backends):
+    stocks = [StockService(state_backend=backend) for backend in backends]
+
+    def work(i):
+        try:
+            stocks[i % 2].add_to_watchlist("u", WatchlistItemCreate(symbol=SYMBOLS[i % len(SYMBOLS)]))
+        except ValueError:
+            pass  # Two threads share a symbol; only one may add it
+
+    run_threads(work)
+    assert sorted(item.symbol for item in stocks[0].get_watchlist("u")) == sorted(SYMBOLS)
+
+
+def test_only_one_registration_per_email(backends):
+    auths = [AuthService(state_backend=backend) for backend in backends]
+    registered, rejected = [], []
+
+    def work(i):
+        try:
+            registered.append(auths[i % 2].register(RegisterRequest(
+                email="new@swipr.ai", password="secret123", first_name="New", last_name="User"
+            )))
+        except ValueError:
+            rejected.append(i)
+
+    run_threads(work)
+    assert len(registered) == 1 and len(rejected) == THREADS - 1
+    assert auths[1].users.get("new@swipr.ai")["id"] == registered[0].user["id"]
+
+
+def test_taken_interventions_are_not_redelivered(backends):
+    agents = [AIAgentService(backend) for backend in backends]
+    agents[0].intervention_inbox.put("u", [])
+    agents[0].intervention_inbox.update("u", lambda inbox: inbox + [_intervention("one")])
+
+    assert [i.id for i in agents[1].take_pushed_interventions("u")] == ["one"]
+    assert agents[0].take_pushed_interventions("u") == []
+
+
+def _intervention(intervention_id: str) -> AIIntervention:
+    return AIIntervention(
+        id=intervention_id, type=InterventionType.MARKET_UPDATE, title="t", message="m",
+        priority="low", triggerReason="test", createdAt=datetime.utcnow()
+    )